@@ -1,31 +1,38 @@
 import os
+import sys
 from imutils import paths
-import face_recognition
 import pickle
-import cv2
-
-print("[INFO] start processing faces...")
-imagePaths = list(paths.list_images("dataset"))
-knownEncodings = []
-knownNames = []
-
-for (i, imagePath) in enumerate(imagePaths):
-    print(f"[INFO] processing image {i + 1}/{len(imagePaths)}")
-    name = imagePath.split(os.path.sep)[-2]
-    
-    image = cv2.imread(imagePath)
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
-    boxes = face_recognition.face_locations(rgb, model="hog")
-    encodings = face_recognition.face_encodings(rgb, boxes)
-    
-    for encoding in encodings:
-        knownEncodings.append(encoding)
-        knownNames.append(name)
-
-print("[INFO] serializing encodings...")
-data = {"encodings": knownEncodings, "names": knownNames}
-with open("encodings.pickle", "wb") as f:
-    f.write(pickle.dumps(data))
-
-print("[INFO] Training complete. Encodings saved to 'encodings.pickle'")
\ No newline at end of file
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_enroll import encode_in_pool
+
+
+def main():
+    print("[INFO] start processing faces...")
+    imagePaths = list(paths.list_images("dataset"))
+    knownEncodings = []
+    knownNames = []
+
+    # Encode in a process pool (one worker per core); results stream back as they finish
+    jobs = [(imagePath, imagePath) for imagePath in imagePaths]
+    for (i, (imagePath, encodings, error, _)) in enumerate(encode_in_pool(jobs, num_jitters=1, all_faces=True)):
+        print(f"[INFO] processed image {i + 1}/{len(imagePaths)}")
+        if error is not None:
+            print(f"[WARN] {imagePath}: {error}")
+            continue
+        name = imagePath.split(os.path.sep)[-2]
+
+        for encoding in encodings:
+            knownEncodings.append(encoding)
+            knownNames.append(name)
+
+    print("[INFO] serializing encodings...")
+    data = {"encodings": knownEncodings, "names": knownNames}
+    with open("encodings.pickle", "wb") as f:
+        f.write(pickle.dumps(data))
+
+    print("[INFO] Training complete. Encodings saved to 'encodings.pickle'")
+
+
+if __name__ == "__main__":
+    main()
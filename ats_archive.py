@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar attendance archive for the ATS kiosk.
+
+Closed days are rolled into one Parquet file per month, <root>/<YYYY-MM>.parquet,
+holding the typed frame of ats_schema: dates as date32, clock times as int32
+seconds since midnight, flags as booleans, hours/minutes as float32 and the
+repetitive text columns dictionary-encoded (categoricals in pandas).
+
+manifest.json records, per month, the last day its file covers. load_range()
+reads covered days from the files, with the column projection and filters
+pushed down to pyarrow, and every other day from the fallback loader (the
+attendance store or daily CSVs) converted to the same typed frame. The
+archive is a copy: invalidate(day) pulls a month's coverage back when an
+archived day is rewritten, and the next compact() re-archives it. A month
+invalidated while compact() is reading it is not published by that run.
+
+pyarrow is optional; without it nothing is archived and load_range() reads
+everything through the fallback.
+
+Usage (from the repo root), to archive closed days now:
+    python ats_archive.py --base-dir /home/pi/.../ATS_PROJECT
+"""
+
+import os
+import json
+import argparse
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ats_schema import (DAILY_COLUMNS, TIME_COLUMNS, BOOL_COLUMNS, FLOAT_COLUMNS, NS_COLUMNS,
+                        CATEGORY_COLUMNS, typed_frame, empty_typed)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _filter_frame(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """Apply pyarrow-style [(column, op, value), ...] filters (AND) to a typed frame."""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, val in filters:
+        s = df[col]
+        if col == "attendance_date":
+            val = [pd.Timestamp(v) for v in val] if op in ("in", "not in") else pd.Timestamp(val)
+        if op in ("==", "="):
+            m = s == val
+        elif op == "!=":
+            m = s != val
+        elif op == "<":
+            m = s < val
+        elif op == "<=":
+            m = s <= val
+        elif op == ">":
+            m = s > val
+        elif op == ">=":
+            m = s >= val
+        elif op == "in":
+            m = s.isin(list(val))
+        elif op == "not in":
+            m = ~s.isin(list(val))
+        else:
+            raise ValueError(f"unsupported filter op {op!r}")
+        mask &= np.asarray(m.fillna(False), dtype=bool)   # an empty flag matches nothing, as in pyarrow
+    return df[mask]
+
+
+def _arrow_schema(pa):
+    def dict_str():
+        return pa.dictionary(pa.int32(), pa.string())
+    types = {"attendance_date": pa.date32()}
+    types.update({c: pa.int32() for c in TIME_COLUMNS})
+    types.update({c: pa.bool_() for c in BOOL_COLUMNS})
+    types.update({c: pa.float32() for c in FLOAT_COLUMNS})
+    types.update({c: pa.int64() for c in NS_COLUMNS})
+    types.update({c: dict_str() for c in CATEGORY_COLUMNS})
+    return pa.schema([(c, types.get(c, pa.string())) for c in DAILY_COLUMNS])
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+# -------------------- Archive --------------------
+class ColumnarArchive:
+    """
+    Monthly Parquet files under root. fallback(start, end) returns the rows
+    for start <= attendance_date < end as a daily-CSV style string frame; it
+    is used for every day the archive does not cover (and to build it).
+    """
+
+    def __init__(self, root, fallback, compression="zstd"):
+        self.root = root
+        self.fallback = fallback
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._covered = None     # "YYYY-MM" -> last archived date, loaded on first use
+        self._generation = {}    # "YYYY-MM" -> invalidate() calls, to catch one during compact()
+
+    def path(self, month: date) -> str:
+        return os.path.join(self.root, f"{month:%Y-%m}.parquet")
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    def _coverage(self) -> dict:
+        if self._covered is None:
+            try:
+                with open(self._manifest_path(), encoding="utf-8") as f:
+                    raw = json.load(f)
+                self._covered = {k: date.fromisoformat(v) for k, v in raw.items()}
+            except FileNotFoundError:
+                self._covered = {}
+            except (ValueError, TypeError) as e:
+                print(f"[ARCHIVE] Ignoring unreadable manifest ({e}); months will be re-archived")
+                self._covered = {}
+        return self._covered
+
+    def _save_coverage(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: v.isoformat() for k, v in sorted(self._covered.items())}, f, indent=1)
+        os.replace(tmp, self._manifest_path())
+
+    def covered_through(self, month: date):
+        """Last archived day of month's file, or None."""
+        with self._lock:
+            return self._coverage().get(f"{month:%Y-%m}")
+
+    def invalidate(self, day: date):
+        """day was rewritten at the source: stop serving it (and later days of its month) from the file."""
+        with self._lock:
+            cov = self._coverage()
+            key = f"{day:%Y-%m}"
+            self._generation[key] = self._generation.get(key, 0) + 1
+            if key not in cov or cov[key] < day:
+                return
+            if day.day == 1:
+                del cov[key]
+            else:
+                cov[key] = day - timedelta(days=1)
+            self._save_coverage()
+
+    # ---- writing
+    def compact(self, first_day: date, through: date) -> int:
+        """
+        Archive every day from first_day's month up to and including through
+        that is not covered yet, one month file at a time (a month that gains
+        days is rewritten whole). Returns the number of files written.
+
+        The fallback is read outside the lock; the file and its coverage are
+        published under it, and only if the month was not invalidated since
+        the read started (otherwise the rows read may predate the rewrite).
+        """
+        pa = _pyarrow()
+        if pa is None:
+            print("[WARN] pyarrow not installed. Skipping attendance archive.")
+            return 0
+        written = 0
+        month = _month_start(first_day)
+        while month <= through:
+            last = min(_next_month(month) - timedelta(days=1), through)
+            key = f"{month:%Y-%m}"
+            with self._lock:
+                cov = self._coverage().get(key)
+                gen = self._generation.get(key, 0)
+            if cov is None or cov < last:
+                typed = typed_frame(self.fallback(month, last + timedelta(days=1)))
+                typed = typed.sort_values("attendance_date", kind="stable", ignore_index=True)
+                tmp = self._write(pa, month, typed)
+                with self._lock:
+                    if self._generation.get(key, 0) == gen:
+                        os.replace(tmp, self.path(month))
+                        self._coverage()[key] = last
+                        self._save_coverage()
+                        tmp = None
+                if tmp is None:
+                    written += 1
+                    print(f"[ARCHIVE] {key}: {len(typed)} rows through {last}")
+                else:
+                    os.remove(tmp)
+                    print(f"[ARCHIVE] {key} was rewritten while archiving; left for the next run")
+            month = _next_month(month)
+        return written
+
+    def _write(self, pa, month: date, typed: pd.DataFrame) -> str:
+        """Write month's file next to its final path; returns the temp path to publish."""
+        os.makedirs(self.root, exist_ok=True)
+        table = pa.Table.from_pandas(typed.astype({"attendance_date": "datetime64[ms]"}),
+                                     schema=_arrow_schema(pa), preserve_index=False, safe=False)
+        path = self.path(month)
+        tmp = path + ".tmp"
+        pa.parquet.write_table(table, tmp, compression=self.compression)
+        return tmp
+
+    # ---- reading
+    def load_range(self, start: date, end: date, columns=None, filters=None) -> pd.DataFrame:
+        """
+        Typed rows for start <= attendance_date < end. columns limits the
+        columns read; filters is a list of (column, op, value) tuples, all
+        of which must hold (ops: == != < <= > >= in "not in"; dates as
+        datetime.date, clock times as seconds). Both are pushed down to
+        the Parquet reader for archived days.
+        """
+        pa = _pyarrow()
+        cols = list(columns) if columns else list(DAILY_COLUMNS)
+        pieces, gaps = [], []
+
+        def gap(a, b):
+            if gaps and gaps[-1][1] == a:
+                gaps[-1] = (gaps[-1][0], b)
+            else:
+                gaps.append((a, b))
+
+        cur = start
+        while cur < end:
+            stop = min(end, _next_month(_month_start(cur)))
+            cov = self.covered_through(cur) if pa is not None else None
+            if cov is not None and cov >= cur:
+                upto = min(stop, cov + timedelta(days=1))
+                pieces.append(self._read(pa, _month_start(cur), cur, upto, cols, filters))
+                if upto < stop:
+                    gap(upto, stop)
+            else:
+                gap(cur, stop)
+            cur = stop
+        for a, b in gaps:
+            pieces.append(_filter_frame(typed_frame(self.fallback(a, b)), filters)[cols])
+        if not pieces:
+            return empty_typed()[cols]
+        out = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0].reset_index(drop=True)
+        for c in CATEGORY_COLUMNS:
+            if c in out.columns and out[c].dtype != "category":
+                out[c] = out[c].astype("category")
+        if "attendance_date" in out.columns and len(pieces) > 1:
+            out = out.sort_values("attendance_date", kind="stable", ignore_index=True)
+        return out
+
+    def _read(self, pa, month: date, a: date, b: date, cols, filters) -> pd.DataFrame:
+        path = self.path(month)
+        if not os.path.exists(path):
+            print(f"[ARCHIVE] {path} missing; reading {month:%Y-%m} from the source")
+            return _filter_frame(typed_frame(self.fallback(a, b)), filters)[cols]
+        table = pa.parquet.read_table(path, columns=cols,
+                                      filters=[("attendance_date", ">=", a), ("attendance_date", "<", b)]
+                                      + list(filters or []))
+        df = table.to_pandas(date_as_object=False)
+        if "attendance_date" in df.columns:
+            df["attendance_date"] = df["attendance_date"].astype("datetime64[ns]")
+        for c in BOOL_COLUMNS:
+            if c in df.columns:
+                df[c] = df[c].astype("boolean")
+        return df
+
+
+def main():
+    ap = argparse.ArgumentParser(description="roll closed attendance days into the monthly Parquet archive")
+    ap.add_argument("--base-dir", required=True, help="ATS_BASE_DIR")
+    args = ap.parse_args()
+    os.environ["ATS_BASE_DIR"] = args.base_dir
+    import ats_attendance as ats
+    ats.archive_closed_days()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,27 +6,53 @@ import pickle
 import threading
 from datetime import datetime, timedelta, timezone, date, time as dtime
 
-import RPi.GPIO as GPIO
 import numpy as np
 import pandas as pd
 import cv2
+import dlib
 import face_recognition
 from PIL import Image, ImageFile
-from picamera2 import Picamera2
-from RPLCD.i2c import CharLCD
 from apscheduler.schedulers.background import BackgroundScheduler
 from threading import Lock
 
+from ats_gallery import Gallery, GalleryIndex, save_gallery, load_gallery, consolidate_gallery
+from ats_hardware import open_hardware
+from ats_pipeline import RecognitionPipeline, StageStats, EncodingCache
+from ats_vision import MotionGate, FaceTracker, face_quality
+from ats_decision import ACCEPT, StreakDecision, SequentialDecision, DecisionStats
+from ats_enroll import sync_enrollment, lower_priority
+from ats_journal import DayJournal, DayLedger, Compactor
+from ats_store import AttendanceStore, import_csv_history
+from ats_archive import ColumnarArchive
+from ats_schema import (DAILY_COLUMNS, TIME_FMT_12, TIME_FMT_24, NO_TIME, clock_seconds,
+                        hours_strings, duration_strings, legacy_frame)
+
 # -------------------- Global Locks/State --------------------
 lcd_lock = Lock()
 encoding_ready = threading.Event()
+_day_lock = threading.RLock()    # read-modify-write of a day's attendance (punches, compaction, autoclose, repair)
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 # -------------------- Base Paths --------------------
-BASE_DIR = "/home/pi/Desktop/PROJECT/EMSAT_EMPLOYEE/ATS_PROJECT"
+# ATS_BASE_DIR lets benchmarks/tools point the kiosk at a scratch tree off-device
+BASE_DIR = os.environ.get("ATS_BASE_DIR", "/home/pi/Desktop/PROJECT/EMSAT_EMPLOYEE/ATS_PROJECT")
 
 EMP_DIR = os.path.join(BASE_DIR, "employees")                 # employees/<First_Last>/photo_files
-ENCODINGS_FILE = os.path.join(EMP_DIR, "encodings.pickle")    # cache of encodings
+ENCODINGS_FILE = os.path.join(EMP_DIR, "encodings.pickle")    # legacy cache of encodings (migrated on load)
+GALLERY_FILE = os.path.join(EMP_DIR, "gallery.bin")           # float32 gallery, memory-mapped on load
+MANIFEST_FILE = os.path.join(EMP_DIR, "manifest.pickle")      # per-photo (size, mtime, sha1) -> encoding
+CHIP_CACHE_DIR = os.path.join(BASE_DIR, "cache", "chips")     # downscaled copy + 150x150 face chip per photo sha1
+ENROLL_NUM_JITTERS = 2         # re-encoding with a new value starts from the cached chips
+ENROLL_PROCESSES = None        # encoder worker processes for the sync; None = all available cores
+CONSOLIDATE_TEMPLATES = True   # summarize each employee's photos into a few templates
+CONSOLIDATE_MAX_TEMPLATES = 4  # per employee: mean + medoids or k-means centroids (picked per employee)
+# Matcher behind the gallery: "exact" scan, or "ivf" (k-means inverted lists) for
+# large shared galleries; IVF_NLIST None = sqrt(rows)
+MATCH_BACKEND = "exact"
+IVF_NLIST = None
+IVF_NPROBE = 16
+REFRESH_NICE = 10              # scheduled refresh runs this much nicer (thread + encoder workers)
+REFRESH_IONICE_CLASS = 2       # ionice class for the refresh (2 = best-effort at level 7, 3 = idle, None = off)
 ATTEND_DIR = os.path.join(BASE_DIR, "attendance")             # daily CSVs
 REPORTS_DIR = os.path.join(BASE_DIR, "reports")               # weekly/monthly CSV/PDF
 
@@ -35,10 +61,33 @@ os.makedirs(ATTEND_DIR, exist_ok=True)
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
 # -------------------- Recognition Config --------------------
+# dlib models the kiosk uses (the patched face_recognition.api in
+# face_recognition-1.3.0/ loads models on first use; these are warmed in the
+# background at startup, the CNN/68-point never load. The stock PyPI 1.3.0
+# loads all of them at import and has no load_models.)
+KIOSK_MODELS = ("face_detector", "pose_predictor_5_point", "face_encoder")
 cv_scaler = 2
-known_face_encodings = []
-known_face_names = []          # full_name (spaces)
-known_face_ids = []            # employee_id (folder name)
+CAPTURE_SIZE = (640, 480)      # legacy full-size capture
+DETECT_SIZE = (CAPTURE_SIZE[0] // cv_scaler, CAPTURE_SIZE[1] // cv_scaler)
+# "direct": the ISP scales to DETECT_SIZE and hands back RGB, so frames go to
+# dlib without resize/cvtColor copies. "legacy": 640x480 XRGB + resize + cvtColor.
+CAMERA_FRAME_PATH = "direct"
+# Motion/ROI gate in front of HOG detection (ats_vision.MotionGate)
+MOTION_GATE_ENABLED = True
+MOTION_DOWNSCALE = 4           # frame differencing on a 1/4-size grayscale copy
+MOTION_PIXEL_DELTA = 25        # per-pixel change (0-255) that counts as motion
+MOTION_MIN_FRACTION = 0.01     # share of changed pixels that wakes the detector
+ROI_PADDING = 0.5              # search box = last face grown by this much per side
+MOTION_FULL_DETECT_EVERY = 5   # force a full-frame detect after this many frames
+# Follow a confirmed face between detections (ats_vision.FaceTracker)
+FACE_TRACKING_ENABLED = True
+TRACKER_BACKEND = "template"   # "template", or "kcf"/"mosse" from opencv-contrib
+TRACK_MIN_CONFIDENCE = 0.6     # normalized correlation below this -> re-detect
+TRACK_REDETECT_EVERY = 1       # tracked frames between detections; keep below MATCH_STREAK
+                               # (motion outside the face also forces a detect, see FaceTracker)
+# Current enrolled gallery (ats_gallery.Gallery). Immutable: a refresh builds a
+# new snapshot and rebinds this name, so readers take `g = gallery` once and use g.
+gallery = Gallery.empty()
 
 # Tuned for stricter but still responsive recognition
 TOLERANCE = 0.41               # lower => stricter (0.350.45 typical)
@@ -47,10 +96,82 @@ MATCH_STREAK = 2               # frames needed to lock the same person
 MAX_FRAMES = 20                # cap per recognition attempt
 SINGLE_FACE_ONLY = True        # require exactly one face in frame
 
+# Decision rule: "streak" = MATCH_STREAK votes within TOLERANCE (fixed cost);
+# "sprt" = sequential test that stops as soon as the evidence is decisive.
+# SPRT frames beyond TOLERANCE never count as evidence for an ID. "sprt" is
+# scaffolding for now: the SPRT_* Gaussians below are illustrative, not
+# measured. Keep "streak" until they are fitted to best-match distances
+# recorded on this kiosk (genuine attempts vs unenrolled people), then
+# confirm the switch with bench_recognition.py.
+DECISION_MODE = "streak"
+SPRT_GENUINE_MEAN = 0.32       # typical distance to the right employee
+SPRT_GENUINE_STD = 0.06
+SPRT_IMPOSTOR_MEAN = 0.62      # typical distance to the nearest wrong employee
+SPRT_IMPOSTOR_STD = 0.08
+SPRT_ALPHA = 0.001             # target false-accept rate
+SPRT_BETA = 0.01               # target false-reject rate
+SPRT_MIN_REJECT_FRAMES = 2     # never call "unknown" on a single frame
+decision_stats = DecisionStats()  # frames-to-decision per outcome; see .summary()
+
+# Face-quality gate in front of the ResNet encoder (ats_vision.face_quality).
+# Off until calibrated on this kiosk's camera: the score is a product of four
+# factors, so a slightly soft or small genuine face can fall under the cut and
+# come back "unknown". To tune: record a few dozen genuine attempts (the
+# bench_recognition.py sequence layout), run
+#     python benchmarks/eval_quality_gate.py --sequences recs/
+# copy its suggested QUALITY_BLUR_REF / QUALITY_SIZE_REF / QUALITY_MIN_SCORE,
+# then enable the gate and confirm with bench_recognition.py that the
+# false-reject rate did not move.
+QUALITY_GATE_ENABLED = False
+QUALITY_MIN_SCORE = 0.35       # below this the frame skips face_encodings entirely
+QUALITY_FULL_VOTE = 0.6        # score at which one frame counts as a full vote
+QUALITY_BLUR_REF = 120.0       # Laplacian variance treated as fully sharp
+QUALITY_SIZE_REF = 80          # face side (px, detector scale) treated as full size
+QUALITY_MAX_YAW = 0.35         # nose offset / eye distance at which yaw scores 0
+
+# Capture, HOG detection and encoding on separate threads (dlib releases the GIL)
+PIPELINED_RECOGNITION = True
+PIPELINE_QUEUE_SIZE = 2        # drop-oldest buffer depth between stages
+recognition_stats = StageStats()  # rolling per-stage latencies; see .summary()
+quality_stats = {"scored": 0, "skipped": 0}  # encoder calls avoided per attempt
+
+# Optional warm pre-roll: a low-rate detector runs on the live stream while idle
+# and caches recent encodings so a button press starts with votes in hand.
+PREROLL_ENABLED = False
+PREROLL_INTERVAL_SEC = 0.5     # idle detector period
+PREROLL_WINDOW_SEC = 3.0       # cached frames older than this are stale
+PREROLL_REQUIRE_LIVE_CONFIRM = True  # cached votes stop one short of MATCH_STREAK
+preroll_cache = EncodingCache()
+_preroll_idle = threading.Event()   # set => background pre-roll may use the camera
+_preroll_busy = Lock()              # held while a pre-roll frame is in flight
+
+motion_gate = MotionGate(downscale=MOTION_DOWNSCALE, pixel_delta=MOTION_PIXEL_DELTA,
+                         min_fraction=MOTION_MIN_FRACTION, roi_padding=ROI_PADDING,
+                         full_every=MOTION_FULL_DETECT_EVERY)
+face_tracker = FaceTracker(backend=TRACKER_BACKEND, min_confidence=TRACK_MIN_CONFIDENCE,
+                           search_padding=ROI_PADDING, redetect_every=TRACK_REDETECT_EVERY,
+                           downscale=MOTION_DOWNSCALE, pixel_delta=MOTION_PIXEL_DELTA,
+                           min_fraction=MOTION_MIN_FRACTION)
+
 # ---------- Output Policy ----------
-WRITE_CSV = True               # MUST stay True; duplicates/open-check rely on CSV state
-WRITE_DAILY_PDF = True         # auto-generate daily PDF after each log
+WRITE_CSV = True               # daily CSV exports; MUST stay True on the "csv" backend (journal is dropped once the CSV holds its rows)
+WRITE_DAILY_PDF = True         # auto-generate daily PDF whenever the daily CSV is rewritten
 DAILY_PDF_DIR = REPORTS_DIR    # where to store daily PDFs
+# Punches append to a per-day journal (ats_journal) instead of rewriting the CSV;
+# the CSV/PDF are rebuilt from it once the day has gone quiet (or on demand).
+JOURNAL_DIR = os.path.join(ATTEND_DIR, "journal")   # <date>.jsonl, one record per punch
+JOURNAL_FSYNC = True           # punch is on disk before it is acknowledged
+COMPACT_DELAY_SEC = 60         # fold the journal into CSV/PDF after this long without punches
+# System of record: "sqlite" keeps every row in one WAL-mode database (ats_store)
+# and the daily CSVs become exports; "csv" keeps the CSVs + journal as before.
+# Each sqlite start imports attendance/*.csv files changed outside the store
+# (all of them the first time; later, days written on the csv backend).
+ATTENDANCE_BACKEND = "sqlite"  # "sqlite" | "csv"
+ATTENDANCE_DB = os.path.join(ATTEND_DIR, "attendance.db")
+# Closed days are rolled nightly into typed monthly Parquet files (ats_archive,
+# needs pyarrow); range reports read them through load_range().
+ARCHIVE_DIR = os.path.join(ATTEND_DIR, "archive")   # <YYYY-MM>.parquet + manifest.json
+ARCHIVE_GRACE_DAYS = 7         # newer days may still be autoclosed/repaired; never archived
 
 # Columns to show in the daily PDF (keep CSV complete)
 DAILY_PDF_COLUMNS = [
@@ -80,19 +201,45 @@ CHECK_IN_PIN = 22
 CHECK_OUT_PIN = 23
 GREEN_LED_PIN = 27
 RED_LED_PIN = 17
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(CHECK_IN_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(CHECK_OUT_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(GREEN_LED_PIN, GPIO.OUT)
-GPIO.setup(RED_LED_PIN, GPIO.OUT)
-GPIO.output(GREEN_LED_PIN, GPIO.LOW)
-GPIO.output(RED_LED_PIN, GPIO.LOW)
-
 # NOTE: keep address explicit; if your LCD uses 0x3F, change it below.
-lcd = CharLCD('PCF8574', 0x27)
-picam2 = Picamera2()
-picam2.configure(picam2.create_preview_configuration(main={"format": 'XRGB8888', "size": (640, 480)}))
-picam2.start()
+LCD_EXPANDER = 'PCF8574'
+LCD_ADDRESS = 0x27
+
+# "pi" = RPi.GPIO/RPLCD/Picamera2, "fake" = in-memory GPIO/LCD and a replay camera
+HARDWARE_BACKEND = os.environ.get("ATS_HARDWARE", "pi")
+REPLAY_FRAMES = os.environ.get("ATS_REPLAY_FRAMES")   # .npz or JPEG dir for the fake camera
+
+# Set by init_hardware() at startup, not at import
+GPIO = None
+lcd = None
+picam2 = None
+hardware = None
+
+def _camera_config(cam):
+    if CAMERA_FRAME_PATH == "direct":
+        # Picamera2's BGR888 is [R, G, B] per pixel in memory: dlib-ready as captured.
+        return cam.create_preview_configuration(main={"format": "BGR888", "size": DETECT_SIZE})
+    return cam.create_preview_configuration(main={"format": 'XRGB8888', "size": CAPTURE_SIZE})
+
+def init_hardware(backend=None, frames=None, **kwargs):
+    """Open the GPIO/LCD/camera backend, set up the pins and start the camera."""
+    global GPIO, lcd, picam2, hardware
+    hardware = open_hardware(backend or HARDWARE_BACKEND, lcd_expander=LCD_EXPANDER,
+                             lcd_address=LCD_ADDRESS, frames=frames or REPLAY_FRAMES, **kwargs)
+    GPIO, lcd, picam2 = hardware.gpio, hardware.lcd, hardware.camera
+
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(CHECK_IN_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    GPIO.setup(CHECK_OUT_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    GPIO.setup(GREEN_LED_PIN, GPIO.OUT)
+    GPIO.setup(RED_LED_PIN, GPIO.OUT)
+    GPIO.output(GREEN_LED_PIN, GPIO.LOW)
+    GPIO.output(RED_LED_PIN, GPIO.LOW)
+
+    picam2.configure(_camera_config(picam2))
+    picam2.start()
+    print(f"[HW] {hardware.name} backend ready")
+    return hardware
 
 # -------------------- Utilities --------------------
 def transition_to(state):
@@ -107,10 +254,7 @@ def _now() -> datetime:
 def _attendance_path(d: date) -> str:
     return os.path.join(ATTEND_DIR, f"{d.isoformat()}.csv")
 
-# 12-hour display format with AM/PM
-TIME_FMT_12 = "%I:%M:%S %p"
-# legacy support: old rows may be HH:MM:SS 24h
-TIME_FMT_24 = "%H:%M:%S"
+# Clock strings: TIME_FMT_12 ("08:30:00 AM"); legacy rows may be TIME_FMT_24 (ats_schema)
 
 def _format_time_12(dt: datetime) -> str:
     return dt.strftime(TIME_FMT_12)
@@ -140,12 +284,7 @@ def _current_boot_id() -> str:
         return ""
 
 # Include repair metadata at the end to preserve CSV compatibility order
-DAILY_HEADERS = [
-    "id", "employee_id", "full_name", "attendance_date",
-    "clock_in", "clock_out", "total_hours", "total_minutes", "duration",
-    "is_late", "is_absent", "method", "created_at", "updated_at",
-    "time_quality", "mono_in_ns", "mono_out_ns", "boot_id", "time_corrected"
-]
+DAILY_HEADERS = list(DAILY_COLUMNS)   # daily CSV layout; typed form in ats_schema
 
 def _ensure_daily_file(d: date):
     p = _attendance_path(d)
@@ -154,6 +293,27 @@ def _ensure_daily_file(d: date):
             f.write(",".join(DAILY_HEADERS) + "\n")
 
 def _read_daily(d: date) -> pd.DataFrame:
+    """
+    The day's rows: the store (or daily CSV) overlaid with any punches still
+    in the journal (same row id -> journaled version wins, new ids appended).
+    """
+    df = _load_day(d)
+    pending = journal.replay(d)
+    if not pending:
+        return df
+    pos = {rid: i for i, rid in enumerate(df["id"].tolist())}
+    new_rows = []
+    for rid, row in pending.items():
+        if rid in pos:
+            df.iloc[pos[rid]] = [row.get(c, "") for c in DAILY_HEADERS]
+        else:
+            new_rows.append(row)
+    if new_rows:
+        df = pd.concat([df, pd.DataFrame(new_rows).reindex(columns=DAILY_HEADERS, fill_value="")],
+                       ignore_index=True)
+    return df
+
+def _read_daily_csv(d: date) -> pd.DataFrame:
     """
     Safely read a daily CSV.  Re-initializes headers if the file is empty,
     unreadable, or missing columns.
@@ -208,10 +368,8 @@ def _sorted_daily(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     if list(df.columns) != DAILY_HEADERS:
         df = df.reindex(columns=DAILY_HEADERS, fill_value="")
-    def _time_key(x):
-        t = _parse_clock_time(x)
-        return t if t is not None else dtime.max
-    df["__cin__"] = df["clock_in"].apply(_time_key)
+    cin = clock_seconds(df["clock_in"])
+    df["__cin__"] = cin.where(cin != NO_TIME, 24 * 3600)   # no check-in sorts last
     df = df.sort_values(by=["attendance_date", "full_name", "__cin__"], ascending=[True, True, True])
     df = df.drop(columns=["__cin__"])
     return df
@@ -282,12 +440,164 @@ def _write_daily_pdf(d: date, df: pd.DataFrame):
     os.replace(tmp_path, final_path)
     print(f"[EXPORT] Daily PDF -> {final_path}")
 
-def _write_daily(d: date, df: pd.DataFrame):
+def _write_csv_atomic(df: pd.DataFrame, path: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline='', encoding="utf-8") as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _export_daily_csv(d: date, view: pd.DataFrame):
+    """Write d's CSV; on the sqlite backend it is an export, recorded so it is never imported back."""
+    p = _attendance_path(d)
+    _write_csv_atomic(view, p)
+    if ATTENDANCE_BACKEND == "sqlite":
+        _store().mark_csv(p)
+
+def _write_daily(d: date, df: pd.DataFrame, pdf: bool = True) -> pd.DataFrame:
+    """
+    Replace the day in the store and rewrite its CSV (temp file + os.replace)
+    from df, which must hold the whole day as read by _read_daily; the
+    journal is dropped since the record now has every journaled row.
+    Returns the sorted view written.
+    """
+    global _ledger
     view = _sorted_daily(df)
-    if WRITE_CSV:
-        view.to_csv(_attendance_path(d), index=False)
+    if ATTENDANCE_BACKEND == "sqlite" or WRITE_CSV:
+        with _day_lock:
+            if ATTENDANCE_BACKEND == "sqlite":
+                _store().replace_day(d, view.to_dict("records"))
+            if WRITE_CSV:
+                _export_daily_csv(d, view)
+            journal.discard(d)
+            archive.invalidate(d)
+            if _ledger is not None and _ledger.day == d:
+                _ledger = DayLedger(d, view.to_dict("records"))
+    if pdf and WRITE_DAILY_PDF:
+        _write_daily_pdf(d, view)
+    return view
+
+# -------------------- Attendance journal --------------------
+journal = DayJournal(JOURNAL_DIR, fsync=JOURNAL_FSYNC)
+
+def compact_day(d: date, refresh_week: bool = True) -> bool:
+    """
+    Fold d's journal into the record (or, on the sqlite backend, export d
+    from the store), then rebuild the daily CSV/PDF and (cooldown permitting)
+    the weekly report. Runs from the compactor or on demand; returns False
+    when nothing was pending.
+    """
+    with _day_lock:
+        if journal.has(d):
+            view = _write_daily(d, _read_daily(d), pdf=False)
+        elif ATTENDANCE_BACKEND == "sqlite":
+            view = _sorted_daily(_load_day(d))
+            if WRITE_CSV:
+                _export_daily_csv(d, view)
+        else:
+            return False
+    print(f"[JOURNAL] Compacted {d} ({len(view)} rows)")
     if WRITE_DAILY_PDF:
         _write_daily_pdf(d, view)
+    if refresh_week:
+        _maybe_refresh_current_week(_GLOBAL_MGR or LocalAttendanceManager())
+    return True
+
+def _compact_pending_journals(refresh_week: bool = False):
+    """Compact every day that still has a journal (startup, before CSV-level repairs)."""
+    for d in journal.days():
+        try:
+            compact_day(d, refresh_week=refresh_week)
+        except Exception as e:
+            print(f"[JOURNAL] Compaction of {d} failed: {e}")
+
+compactor = Compactor(compact_day, delay=COMPACT_DELAY_SEC, name="ats-journal-compactor")
+
+# -------------------- Attendance store --------------------
+_attendance_store = None
+
+def _store() -> AttendanceStore:
+    """The SQLite store, opened on first use; opening imports daily CSVs changed outside it."""
+    global _attendance_store
+    if _attendance_store is None:
+        with _day_lock:
+            if _attendance_store is None:
+                store = AttendanceStore(ATTENDANCE_DB, DAILY_HEADERS)
+                import_csv_history(store, ATTEND_DIR)
+                _attendance_store = store
+    return _attendance_store
+
+def _load_day(d: date) -> pd.DataFrame:
+    """The day's rows in the system of record, without the journal."""
+    if ATTENDANCE_BACKEND == "sqlite":
+        return pd.DataFrame(_store().day_rows(d), columns=DAILY_HEADERS)
+    return _read_daily_csv(d)
+
+def _load_range(start: date, end: date) -> pd.DataFrame:
+    """Rows for start <= attendance_date < end: one indexed query, or one CSV per day."""
+    if ATTENDANCE_BACKEND != "sqlite":
+        frames = [_read_daily(start + timedelta(days=i)) for i in range((end - start).days)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DAILY_HEADERS)
+    df = pd.DataFrame(_store().range_rows(start, end), columns=DAILY_HEADERS)
+    journaled = [d for d in journal.days() if start <= d < end]
+    if journaled:   # left over from the csv backend, until compacted
+        df = df[~df["attendance_date"].isin([d.isoformat() for d in journaled])]
+        df = pd.concat([df] + [_read_daily(d) for d in journaled], ignore_index=True)
+        df = df.sort_values("attendance_date", kind="stable", ignore_index=True)
+    return df
+
+def _first_attendance_date():
+    """Earliest day with attendance rows, or None."""
+    if ATTENDANCE_BACKEND == "sqlite":
+        return _store().first_date()
+    days = []
+    for fname in os.listdir(ATTEND_DIR):
+        if not fname.endswith(".csv"):
+            continue
+        try:
+            days.append(date.fromisoformat(fname[:-4]))
+        except ValueError:
+            continue
+    return min(days, default=None)
+
+def _record_punch(d: date, row: dict):
+    """Make one punch durable: a store upsert, or a journal append on the csv backend."""
+    if ATTENDANCE_BACKEND == "sqlite":
+        _store().upsert([row])
+    else:
+        journal.append(d, row)
+
+# -------------------- Attendance archive --------------------
+archive = ColumnarArchive(ARCHIVE_DIR, _load_range)
+
+def load_range(start: date, end: date, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Typed attendance rows for start <= attendance_date < end: archived months
+    from Parquet (projection/filters pushed down), the rest from the record.
+    See ats_archive.ColumnarArchive.load_range for columns/filters.
+    """
+    return archive.load_range(start, end, columns=columns, filters=filters)
+
+def archive_closed_days() -> int:
+    """Roll every day older than ARCHIVE_GRACE_DAYS into the monthly archive."""
+    first = _first_attendance_date()
+    if first is None:
+        return 0
+    return archive.compact(first, _today() - timedelta(days=ARCHIVE_GRACE_DAYS))
+
+_ledger = None   # DayLedger of the day punches last went to
+
+def _day_ledger(d: date) -> DayLedger:
+    """
+    Resident state of day d for the punch path (caller holds _day_lock):
+    read from the record + journal on the first punch of the day, then updated in
+    place by each punch and replaced whenever _write_daily rewrites the day.
+    """
+    global _ledger
+    if _ledger is None or _ledger.day != d:
+        _ledger = DayLedger(d, _read_daily(d).to_dict("records"))
+    return _ledger
 
 def _to_bool_str(x: bool) -> str:
     return "TRUE" if x else "FALSE"
@@ -326,7 +636,76 @@ def _recalc_is_late(clock_in_dt: datetime) -> str:
 def _autocorrect_bad_times():
     if not _clock_sane():
         return
+    # Works on the record directly: fold journaled punches in first
+    global _ledger
+    days = set()
+    with _day_lock:
+        _compact_pending_journals()
+        if ATTENDANCE_BACKEND == "sqlite":
+            days = _autocorrect_store_times()
+        else:
+            _autocorrect_csv_times()
+        _ledger = None   # rows may have moved between days; reload on the next punch
+    for d in sorted(days):
+        archive.invalidate(d)
+        compact_day(d, refresh_week=False)   # re-export the CSV/PDF of every day touched
 
+def _repaired_times(row, boot_id: str):
+    """
+    Field updates that re-derive an UNSANE row's times from its monotonic
+    stamps, or None when the row is sane, from another boot, or unmappable.
+    """
+    if row.get("time_quality", "") != "UNSANE":
+        return None
+    if row.get("boot_id", "") != boot_id:
+        return None
+
+    cin_wall = _monotonic_to_wall(row.get("mono_in_ns", ""))
+    cout_wall = _monotonic_to_wall(row.get("mono_out_ns", ""))
+    if cin_wall is None:
+        return None
+
+    upd = {"clock_in": _format_time_12(cin_wall)}
+    if cout_wall is not None:
+        upd["clock_out"] = _format_time_12(cout_wall)
+        total_seconds = max((cout_wall - cin_wall).total_seconds(), 0.0)
+        upd["total_hours"] = f"{(total_seconds/3600.0):.2f}"
+        upd["total_minutes"] = f"{(total_seconds/60.0):.2f}"
+        upd["duration"] = _fmt_hms(total_seconds)
+
+    upd["attendance_date"] = cin_wall.date().isoformat()
+    upd["created_at"] = cin_wall.isoformat()
+    upd["updated_at"] = (_now()).isoformat()
+    upd["is_late"] = _recalc_is_late(cin_wall)
+    upd["time_quality"] = "SANE"
+    upd["time_corrected"] = "TRUE"
+    return upd
+
+def _autocorrect_store_times() -> set:
+    """Repair this boot's UNSANE rows in the store; returns the dates whose rows changed."""
+    fixed, days = [], set()
+    boot_id = _current_boot_id()
+    for row in _store().unsane_rows(boot_id):
+        upd = _repaired_times(row, boot_id)
+        if upd is None:
+            continue
+        days.add(row["attendance_date"])
+        row.update(upd)
+        days.add(row["attendance_date"])
+        fixed.append(row)
+    if not fixed:
+        return set()
+    _store().upsert(fixed)
+    print(f"[REPAIR] Corrected {len(fixed)} rows using monotonic mapping in {ATTENDANCE_DB}")
+    out = set()
+    for s in days:
+        try:
+            out.add(date.fromisoformat(s))
+        except ValueError:
+            continue
+    return out
+
+def _autocorrect_csv_times():
     boot_id = _current_boot_id()
     for fname in os.listdir(ATTEND_DIR):
         if not fname.endswith(".csv"):
@@ -343,30 +722,11 @@ def _autocorrect_bad_times():
 
         changed_rows = []
         for idx, row in df.iterrows():
-            if row.get("time_quality", "") != "UNSANE":
-                continue
-            if row.get("boot_id", "") != boot_id:
-                continue
-
-            cin_wall = _monotonic_to_wall(row.get("mono_in_ns", ""))
-            cout_wall = _monotonic_to_wall(row.get("mono_out_ns", ""))
-            if cin_wall is None:
+            upd = _repaired_times(row, boot_id)
+            if upd is None:
                 continue
-
-            df.at[idx, "clock_in"] = _format_time_12(cin_wall)
-            if cout_wall is not None:
-                df.at[idx, "clock_out"] = _format_time_12(cout_wall)
-                total_seconds = max((cout_wall - cin_wall).total_seconds(), 0.0)
-                df.at[idx, "total_hours"] = f"{(total_seconds/3600.0):.2f}"
-                df.at[idx, "total_minutes"] = f"{(total_seconds/60.0):.2f}"
-                df.at[idx, "duration"] = _fmt_hms(total_seconds)
-
-            df.at[idx, "attendance_date"] = cin_wall.date().isoformat()
-            df.at[idx, "created_at"] = cin_wall.isoformat()
-            df.at[idx, "updated_at"] = (_now()).isoformat()
-            df.at[idx, "is_late"] = _recalc_is_late(cin_wall)
-            df.at[idx, "time_quality"] = "SANE"
-            df.at[idx, "time_corrected"] = "TRUE"
+            for col, val in upd.items():
+                df.at[idx, col] = val
             changed_rows.append(idx)
 
         if not changed_rows:
@@ -421,21 +781,22 @@ def _week_bounds(any_day: date):
     return monday.isocalendar(), days
 
 def _build_weekly_frames(any_day: date) -> pd.DataFrame:
+    """The week's rows as a typed frame (ats_schema)."""
     _, days = _week_bounds(any_day)
-    frames = [_read_daily(d) for d in days]
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DAILY_HEADERS)
+    return load_range(days[0], days[-1] + timedelta(days=1))
 
-def _weekly_summary(df: pd.DataFrame) -> pd.DataFrame:
+def _hours_by_name(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Sum of total_hours per full_name from a typed frame (ats_schema)."""
     if df.empty:
-        return pd.DataFrame(columns=["full_name", "week_total_hours"])
-    tmp = df.copy()
-    tmp["full_name"] = tmp["full_name"].fillna("").astype(str)
-    tmp["total_hours"] = pd.to_numeric(tmp["total_hours"], errors="coerce").fillna(0.0)
-    summary = tmp.groupby("full_name", as_index=False)["total_hours"].sum()
-    summary = summary.rename(columns={"total_hours": "week_total_hours"})
-    summary["week_total_hours"] = summary["week_total_hours"].round(2)
+        return pd.DataFrame(columns=["full_name", column])
+    hours = df["total_hours"].astype(np.float64).fillna(0.0)
+    summary = hours.groupby(df["full_name"].astype(str)).sum().round(2)
+    summary = summary.rename(column).rename_axis("full_name").reset_index()
     return summary.sort_values("full_name").reset_index(drop=True)
 
+def _weekly_summary(df: pd.DataFrame) -> pd.DataFrame:
+    return _hours_by_name(df, "week_total_hours")
+
 def _write_weekly_pdf(path: str, logs_df: pd.DataFrame, summary_df: pd.DataFrame, title: str):
     try:
         from reportlab.lib.pagesizes import A4, landscape
@@ -575,15 +936,7 @@ def _write_pdf(path: str, df: pd.DataFrame, title: str):
 
 # -------------------- MONTHLY SUMMARY (NEW) --------------------
 def _monthly_summary(df: pd.DataFrame) -> pd.DataFrame:
-    if df.empty:
-        return pd.DataFrame(columns=["full_name", "month_total_hours"])
-    tmp = df.copy()
-    tmp["full_name"] = tmp["full_name"].fillna("").astype(str)
-    tmp["total_hours"] = pd.to_numeric(tmp["total_hours"], errors="coerce").fillna(0.0)
-    summary = tmp.groupby("full_name", as_index=False)["total_hours"].sum()
-    summary = summary.rename(columns={"total_hours": "month_total_hours"})
-    summary["month_total_hours"] = summary["month_total_hours"].round(2)
-    return summary.sort_values("full_name").reset_index(drop=True)
+    return _hours_by_name(df, "month_total_hours")
 
 def _write_monthly_summary_pdf(path: str, summary_df: pd.DataFrame, title: str):
     try:
@@ -637,151 +990,344 @@ def _write_monthly_summary_pdf(path: str, summary_df: pd.DataFrame, title: str):
     print(f"[EXPORT] Monthly Summary PDF -> {path}")
 
 # -------------------- Employees & Encodings --------------------
-id_to_encoding = {}   # str(employee_id) -> np.ndarray
-eid_to_name = {}      # str(employee_id) -> "First Last"
 EMPLOYEES_ROOT = os.path.join(BASE_DIR, "employees")
 
-def build_or_load_encodings_from_folders():
-    global known_face_encodings, known_face_names, known_face_ids, id_to_encoding, eid_to_name
+def _search_opts():
+    if MATCH_BACKEND == "ivf":
+        return {"backend": "ivf", "nlist": IVF_NLIST, "nprobe": IVF_NPROBE}
+    return {"backend": MATCH_BACKEND}
+
+def _install_gallery(new_gallery):
+    """Publish a fully built Gallery snapshot (one reference swap)."""
+    global gallery
+    gallery = new_gallery
 
+def build_or_load_encodings_from_folders(nice=None):
     if not os.path.isdir(EMPLOYEES_ROOT):
         os.makedirs(EMPLOYEES_ROOT, exist_ok=True)
         print(f"[SYNC] Created employees root: {EMPLOYEES_ROOT} (add folders like Shehu_Yusuf/)")
 
-    encodings, names, ids = [], [], []
-
-    for folder in os.listdir(EMPLOYEES_ROOT):
-        folder_path = os.path.join(EMPLOYEES_ROOT, folder)
-        if not os.path.isdir(folder_path):
-            continue
-
-        full_name = folder.replace("_", " ").strip()
-        employee_id = folder
-
-        for file in os.listdir(folder_path):
-            if not file.lower().endswith((".jpg", ".jpeg", ".png")):
-                continue
-            img_path = os.path.join(folder_path, file)
-            try:
-                image = face_recognition.load_image_file(img_path)
-                locs = face_recognition.face_locations(image)
-                encs = face_recognition.face_encodings(image, locs, num_jitters=2)
-                if encs:
-                    enc = encs[0]
-                    encodings.append(enc)
-                    names.append(full_name)
-                    ids.append(employee_id)
-                    id_to_encoding[employee_id] = enc
-                    eid_to_name[employee_id] = full_name
-                    print(f"[OK] Encoded {full_name} from {file}")
-            except Exception as e:
-                print(f"[ERROR] Failed on {img_path}: {e}")
-
-    known_face_encodings = encodings
-    known_face_names = names
-    known_face_ids = ids
-
-    with open(ENCODINGS_FILE, "wb") as f:
-        pickle.dump({"ids": ids, "names": names, "encodings": encodings}, f)
-
-    print(f"[SYNC] Saved {len(ids)} encodings -> {ENCODINGS_FILE}")
+    t0 = time.perf_counter()
+    result = sync_enrollment(EMPLOYEES_ROOT, MANIFEST_FILE, processes=ENROLL_PROCESSES,
+                             num_jitters=ENROLL_NUM_JITTERS, nice=nice, chip_dir=CHIP_CACHE_DIR)
+    previous = gallery
+    encodings, ids = result.encodings, result.ids
+    if CONSOLIDATE_TEMPLATES:
+        # the manifest keeps every photo's encoding; only the gallery is consolidated
+        encodings, ids, _ = consolidate_gallery(encodings, ids, max_templates=CONSOLIDATE_MAX_TEMPLATES)
+    new_gallery = Gallery(GalleryIndex(encodings, ids), dict(zip(result.ids, result.names)), **_search_opts())
+    _install_gallery(new_gallery)
+
+    if not os.path.exists(GALLERY_FILE) or not new_gallery.same_content(previous):
+        save_gallery(GALLERY_FILE, new_gallery)
+        print(f"[SYNC] Saved {len(new_gallery)} encodings -> {GALLERY_FILE}")
+
+    s = result.stats
+    print(f"[SYNC] {s['photos']} photos: {s['encoded']} encoded, {s['no_face']} no face, "
+          f"{s['reused'] + s['rehashed']} reused, {s['removed']} removed, {s['failed']} failed "
+          f"in {(time.perf_counter() - t0) * 1e3:.0f} ms")
     encoding_ready.set()
 
 def build_or_load_encodings():
     return build_or_load_encodings_from_folders()
 
+def _migrate_legacy_pickle():
+    """Convert encodings.pickle to GALLERY_FILE; True if a usable pickle was found."""
+    with open(ENCODINGS_FILE, "rb") as f:
+        data = pickle.load(f)
+    if not all(k in data for k in ("ids", "names", "encodings")):
+        return False
+    ids = [str(i) for i in data["ids"]]
+    save_gallery(GALLERY_FILE, Gallery(GalleryIndex(data["encodings"], ids), dict(zip(ids, data["names"]))))
+    print(f"[SYNC] Migrated {len(ids)} encodings {ENCODINGS_FILE} -> {GALLERY_FILE}")
+    return True
+
 def load_encodings_from_cache_or_build():
-    if os.path.exists(ENCODINGS_FILE):
+    try:
+        if not os.path.exists(GALLERY_FILE) and os.path.exists(ENCODINGS_FILE):
+            _migrate_legacy_pickle()
+        if os.path.exists(GALLERY_FILE):
+            _install_gallery(load_gallery(GALLERY_FILE, **_search_opts()))
+            print(f"[SYNC] Loaded {len(gallery)} encodings from cache.")
+            encoding_ready.set()
+            return
+    except Exception as e:
+        print(f"[WARN] Failed to read encodings cache: {e}")
+    build_or_load_encodings()
+
+_refresh_lock = Lock()
+
+def refresh_gallery_async():
+    """
+    Scheduled re-sync on its own thread at lowered CPU/I/O priority, so the
+    kiosk keeps recognizing against the current snapshot meanwhile. Skipped
+    if a refresh is still running.
+    """
+    if not _refresh_lock.acquire(blocking=False):
+        print("[SYNC] Refresh already running; skipped.")
+        return None
+
+    def _run():
         try:
-            with open(ENCODINGS_FILE, "rb") as f:
-                data = pickle.load(f)
-                if all(k in data for k in ("ids", "names", "encodings")):
-                    global known_face_ids, known_face_names, known_face_encodings
-                    known_face_ids = data["ids"]
-                    known_face_names = data["names"]
-                    known_face_encodings = data["encodings"]
-                    for i, eid in enumerate(known_face_ids):
-                        eid_to_name[str(eid)] = known_face_names[i]
-                    print(f"[SYNC] Loaded {len(known_face_ids)} encodings from cache.")
-                    encoding_ready.set()
-                    return
+            lower_priority(REFRESH_NICE, ionice_class=REFRESH_IONICE_CLASS)
+            build_or_load_encodings_from_folders(nice=REFRESH_NICE)
         except Exception as e:
-            print(f"[WARN] Failed to read encodings cache: {e}")
-    build_or_load_encodings()
+            print(f"[SYNC] Refresh failed: {e}")
+        finally:
+            _refresh_lock.release()
+
+    t = threading.Thread(target=_run, name="ats-gallery-refresh", daemon=True)
+    t.start()
+    return t
 
 # -------------------- Face Recognition + LCD UX --------------------
-def recognize_face(timeout=10, headless=True):
+def _capture_frame():
+    """
+    Grab one camera frame at detector resolution; returns (preview_bgr, rgb).
+    On the direct path preview_bgr is None and rgb is the captured array itself.
     """
-    Returns (employee_id, full_name, confidence_percent)
-    after requiring a small streak of consistent matches across frames.
+    t0 = time.perf_counter()
+    frame = picam2.capture_array()
+    t1 = time.perf_counter()
+    if CAMERA_FRAME_PATH == "direct":
+        # only copies if the driver handed back a row-padded view
+        rgb = frame if frame.flags.c_contiguous else np.ascontiguousarray(frame)
+        recognition_stats.record("capture", t1 - t0)
+        recognition_stats.record("resize", time.perf_counter() - t1)
+        return None, rgb
+    resized = cv2.resize(frame, (0, 0), fx=1 / cv_scaler, fy=1 / cv_scaler)
+    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    recognition_stats.record("capture", t1 - t0)
+    recognition_stats.record("resize", time.perf_counter() - t1)
+    return resized, rgb
+
+def _hog_detect(img):
+    return face_recognition.face_locations(img, number_of_times_to_upsample=1, model='hog')
+
+def _gated_detect(img):
+    if MOTION_GATE_ENABLED:
+        return motion_gate.locate(img, _hog_detect)
+    return _hog_detect(img)
+
+def _detect_faces(rgb):
+    with recognition_stats.timed("detect"):
+        if FACE_TRACKING_ENABLED:
+            # Tracked frames skip the gate; keep its reference frame current anyway
+            on_tracked = motion_gate.observe if MOTION_GATE_ENABLED else None
+            return face_tracker.locate(rgb, _gated_detect, on_tracked=on_tracked)
+        return _gated_detect(rgb)
+
+def _encode_faces(rgb, locs):
     """
+    Returns [(encoding, vote_weight), ...] for the faces worth encoding.
+    With the quality gate on, the 5-point landmarks are computed once, used
+    for the quality score and then reused by the encoder.
+    """
+    if SINGLE_FACE_ONLY and len(locs) != 1:
+        return []
+    if not QUALITY_GATE_ENABLED:
+        with recognition_stats.timed("encode"):
+            return [(enc, 1.0) for enc in face_recognition.face_encodings(rgb, locs)]
+
+    with recognition_stats.timed("landmarks"):
+        shapes = face_recognition.api._raw_face_landmarks(rgb, locs, model="small")
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+    kept, weights = [], []
+    for loc, shape in zip(locs, shapes):
+        q = face_quality(gray, loc, [(p.x, p.y) for p in shape.parts()],
+                         blur_ref=QUALITY_BLUR_REF, size_ref=QUALITY_SIZE_REF, max_yaw=QUALITY_MAX_YAW)
+        quality_stats["scored"] += 1
+        if q["score"] < QUALITY_MIN_SCORE:
+            quality_stats["skipped"] += 1
+            continue
+        kept.append(shape)
+        weights.append(min(1.0, q["score"] / QUALITY_FULL_VOTE))
+    if not kept:
+        return []
+    # Every kept face of the frame in one encoder call
+    with recognition_stats.timed("encode"):
+        encs = face_recognition.api.face_encoder.compute_face_descriptor(
+            rgb, dlib.full_object_detections(kept), 1)
+    return [(np.array(enc), w) for enc, w in zip(encs, weights)]
+
+def _show_preview(resized, rgb, locs):
+    # Direct path: convert for display only when a preview is actually wanted
+    view = resized if resized is not None else cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    for (t, r, b, l) in locs:
+        cv2.rectangle(view, (l, t), (r, b), (0, 255, 0), 2)
+    cv2.imshow("Camera Preview", view)
+    cv2.waitKey(1)
+
+def _new_decision():
+    if DECISION_MODE == "sprt":
+        return SequentialDecision(
+            genuine_mean=SPRT_GENUINE_MEAN, genuine_std=SPRT_GENUINE_STD,
+            impostor_mean=SPRT_IMPOSTOR_MEAN, impostor_std=SPRT_IMPOSTOR_STD,
+            alpha=SPRT_ALPHA, beta=SPRT_BETA, margin=SECOND_BEST_MARGIN,
+            min_reject_frames=SPRT_MIN_REJECT_FRAMES, tolerance=TOLERANCE,
+        )
+    return StreakDecision(tolerance=TOLERANCE, margin=SECOND_BEST_MARGIN, streak=MATCH_STREAK)
+
+def _vote(encs, decision):
+    """
+    Feed one frame's (encoding, weight) pairs into the decision rule; weights
+    come from face quality, so a blurry or turned face counts for less.
+    Returns ACCEPT, REJECT or None (keep looking).
+    """
+    g = gallery   # one snapshot for the whole frame
+    if not encs or len(g) == 0:
+        return None
+
+    for enc, weight in encs:
+        # Per-ID minimum distance and runner-up (other person), vectorized
+        with recognition_stats.timed("match"):
+            best_eid, best, second = g.match(enc)
+
+        outcome = decision.observe(best_eid, best, second, weight)
+        if outcome:
+            return outcome
+    return None
+
+def _accepted(decision):
+    eid = decision.winner
+    name = gallery.name(eid)
+    return eid, name, round(decision.confidence * 100.0, 2)
+
+def _recognize_face_serial(timeout, headless, decision):
     start = time.time()
-    votes = {}
-    best_conf = {}
 
     frames_seen = 0
     while time.time() - start < timeout and frames_seen < MAX_FRAMES:
-        frame = picam2.capture_array()
-        resized = cv2.resize(frame, (0, 0), fx=1 / cv_scaler, fy=1 / cv_scaler)
-        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-        locs = face_recognition.face_locations(rgb, number_of_times_to_upsample=1, model='hog')
-
-        if SINGLE_FACE_ONLY and len(locs) != 1:
-            frames_seen += 1
-            if not headless:
-                for (t, r, b, l) in locs:
-                    cv2.rectangle(resized, (l, t), (r, b), (0, 255, 0), 2)
-                cv2.imshow("Camera Preview", resized)
-                cv2.waitKey(1)
-            continue
-
-        encs = face_recognition.face_encodings(rgb, locs)
+        resized, rgb = _capture_frame()
+        locs = _detect_faces(rgb)
+        encs = _encode_faces(rgb, locs)
         if not headless:
-            for (t, r, b, l) in locs:
-                cv2.rectangle(resized, (l, t), (r, b), (0, 255, 0), 2)
-            cv2.imshow("Camera Preview", resized)
-            cv2.waitKey(1)
+            _show_preview(resized, rgb, locs)
 
         frames_seen += 1
-        if not encs or len(known_face_encodings) == 0:
-            continue
+        outcome = _vote(encs, decision)
+        if outcome:
+            return outcome, frames_seen
+    return None, frames_seen
+
+def _recognize_face_pipelined(timeout, headless, decision):
+    start = time.time()
 
-        for enc in encs:
-            dists = face_recognition.face_distance(known_face_encodings, enc)
-            if dists is None or len(dists) == 0:
+    pipeline = RecognitionPipeline(
+        capture=_capture_frame,
+        detect=lambda f: _detect_faces(f[1]),
+        encode=lambda f, locs: _encode_faces(f[1], locs),
+        stats=recognition_stats,
+        buffer_size=PIPELINE_QUEUE_SIZE,
+    )
+    frames_seen = 0
+    with pipeline:
+        while frames_seen < MAX_FRAMES:
+            remaining = timeout - (time.time() - start)
+            if remaining <= 0:
+                break
+            item = pipeline.get_result(timeout=min(remaining, 0.5))
+            if item is None:
                 continue
+            (resized, rgb), locs, encs = item
+            if not headless:
+                _show_preview(resized, rgb, locs)
 
-            # Per-ID minimum distance
-            per_id_min = {}
-            for idx, dist in enumerate(dists):
-                eid_k = known_face_ids[idx]
-                cur = per_id_min.get(eid_k, 1e9)
-                if dist < cur:
-                    per_id_min[eid_k] = float(dist)
+            frames_seen += 1
+            outcome = _vote(encs, decision)
+            if outcome:
+                return outcome, frames_seen
+    return None, frames_seen
 
-            best_eid, best = min(per_id_min.items(), key=lambda kv: kv[1])
-            others = [v for k, v in per_id_min.items() if k != best_eid]
-            second = min(others) if others else None
+def _preroll_worker():
+    """Idle-time detector: keeps preroll_cache filled with recent single-face encodings."""
+    while True:
+        if not _preroll_idle.wait(timeout=1.0):
+            continue
+        t0 = time.time()
+        with _preroll_busy:
+            if _preroll_idle.is_set():
+                try:
+                    _, rgb = _capture_frame()
+                    encs = _encode_faces(rgb, _detect_faces(rgb))
+                    if encs:
+                        preroll_cache.add(encs)
+                except Exception as e:
+                    print(f"[PREROLL] frame failed: {e}")
+        time.sleep(max(0.0, PREROLL_INTERVAL_SEC - (time.time() - t0)))
 
-            if best > TOLERANCE:
-                continue
-            if second is not None and (second - best) < SECOND_BEST_MARGIN:
-                continue
+def _pause_preroll():
+    _preroll_idle.clear()
+    with _preroll_busy:   # let an in-flight pre-roll frame land in the cache
+        pass
 
-            votes[best_eid] = votes.get(best_eid, 0) + 1
-            conf = 1.0 - best
-            if best_eid not in best_conf or conf > best_conf[best_eid]:
-                best_conf[best_eid] = conf
+def _resume_preroll():
+    preroll_cache.clear()  # never let one attempt's frames vote in the next
+    if PREROLL_ENABLED:
+        _preroll_idle.set()
 
-            if votes[best_eid] >= MATCH_STREAK:
-                name = eid_to_name.get(str(best_eid), str(best_eid).replace("_", " "))
-                if not headless:
-                    cv2.destroyAllWindows()
-                return best_eid, name, round(best_conf[best_eid] * 100.0, 2)
+def _vote_from_preroll(decision):
+    """
+    Seed the decision from cached pre-roll frames. Returns ACCEPT when cached
+    frames alone may decide, else None (live capture continues). A cached
+    REJECT is never final: whoever stood there may not be who pressed.
+    """
+    frames = preroll_cache.recent(PREROLL_WINDOW_SEC)
+    if not frames:
+        return None
+    for encs in frames:
+        outcome = _vote(encs, decision)
+        if outcome == ACCEPT and not PREROLL_REQUIRE_LIVE_CONFIRM:
+            print(f"[PREROLL] locked from {len(frames)} cached frame(s)")
+            return ACCEPT
+        if outcome:
+            break
+    decision.hold_open()
+    return None
 
-    if not headless:
-        cv2.destroyAllWindows()
-    return None, None, None
+def recognize_face(timeout=10, headless=True):
+    """
+    Returns (employee_id, full_name, confidence_percent), or (None, None, None)
+    when the face is rejected as unknown or the frame/time budget runs out.
+    DECISION_MODE picks the fixed streak rule or the sequential test.
+    With PREROLL_ENABLED, fresh cached frames count toward the decision.
+    Per-stage latencies accumulate in recognition_stats, frames-to-decision
+    in decision_stats.
+    """
+    decision = _new_decision()
+    _pause_preroll()
+    motion_gate.reset()
+    face_tracker.reset()
+    quality_stats.update(scored=0, skipped=0)
+    try:
+        outcome, frames = None, 0
+        if PREROLL_ENABLED:
+            outcome = _vote_from_preroll(decision)
+        if outcome is None:
+            if PIPELINED_RECOGNITION:
+                outcome, frames = _recognize_face_pipelined(timeout, headless, decision)
+            else:
+                outcome, frames = _recognize_face_serial(timeout, headless, decision)
+        decision_stats.record(outcome or "undecided", frames)
+        if outcome == ACCEPT:
+            return _accepted(decision)
+        return None, None, None
+    finally:
+        if not headless:
+            cv2.destroyAllWindows()
+        if MOTION_GATE_ENABLED:
+            g = motion_gate.stats
+            print(f"[GATE] {g['frames']} frames: {g['full_calls']} full + {g['roi_calls']} ROI "
+                  f"detects, {g['saved']} skipped")
+        if FACE_TRACKING_ENABLED:
+            t = face_tracker.stats
+            print(f"[TRACK] {t['frames']} frames: {t['tracked']} tracked, "
+                  f"{t['detections']} detector passes, {t['lost']} lost, {t['intrusions']} intrusions")
+        if QUALITY_GATE_ENABLED:
+            print(f"[QUALITY] {quality_stats['scored']} faces scored, "
+                  f"{quality_stats['skipped']} encoder calls skipped")
+        _resume_preroll()
 
 def display(lines, delay=0.3):
     with lcd_lock:
@@ -821,7 +1367,7 @@ def hourly_greeting_updater():
 # -------------------- Scheduler job registration --------------------
 def _register_scheduler_jobs(scheduler, mgr):
     # periodic encodings refresh
-    scheduler.add_job(build_or_load_encodings, 'interval', minutes=120)
+    scheduler.add_job(refresh_gallery_async, 'interval', minutes=120)
 
     # on-time schedules (Friday 22:00)
     scheduler.add_job(lambda: mgr.export_weekly(to_csv=True, to_pdf=True),
@@ -846,6 +1392,9 @@ def _register_scheduler_jobs(scheduler, mgr):
     # daily artifact ensure
     scheduler.add_job(lambda: _ensure_daily_artifacts(_today()), 'cron', hour=0, minute=1)
 
+    # nightly columnar archive of closed days
+    scheduler.add_job(archive_closed_days, 'cron', hour=0, minute=30)
+
     # TIME-AGNOSTIC AUTOCLOSE: runs whenever device is ON (idempotent)
     scheduler.add_job(lambda: mgr.autoclose_previous_day(cutoff=AUTOCLOSE_CUTOFF),
                       'interval', minutes=300)
@@ -868,7 +1417,7 @@ def _maybe_refresh_current_week(mgr):
 # -------------------- Local Attendance Repository --------------------
 class LocalAttendanceManager:
     """
-    CSV/PDF adapter mirroring DB semantics:
+    Attendance repository (SQLite store or CSV, see ATTENDANCE_BACKEND) mirroring DB semantics:
     - Single open check-in per employee per day
     - Duplicate protection
     - Late flag on check-in after 09:00
@@ -884,85 +1433,85 @@ class LocalAttendanceManager:
         today = _today()
         now = _now()
         _ensure_daily_file(today)
-        df = _read_daily(today)
-
-        emp_rows = df[df["employee_id"] == str(employee_id)]
-
-        # -------- HARD DAILY LOCK: one row per employee per day --------
-        if log_type == "Check-In":
-            if not emp_rows.empty:
-                print(f"[LOCK] {full_name} already has a record for {today}. Blocking new Check-In.")
-                return "locked"
-
-            rid = f"{employee_id}-{today.isoformat()}-{len(df)+1}"
-            is_late = _to_bool_str(now.time() > LATE_CUTOFF)
-
-            quality = "SANE" if _clock_sane() else "UNSANE"
-            mono_now = str(time.monotonic_ns())
-
-            new_row = {
-                "id": rid,
-                "employee_id": str(employee_id),
-                "full_name": full_name,
-                "attendance_date": today.isoformat(),
-                "clock_in": _format_time_12(now),  # 12-hour time
-                "clock_out": "",
-                "total_hours": "0.00",
-                "total_minutes": "0.00",
-                "duration": "",
-                "is_late": is_late,
-                "is_absent": "FALSE",
-                "method": METHOD_USED,
-                "created_at": now.isoformat(),
-                "updated_at": now.isoformat(),
-                "time_quality": quality,
-                "mono_in_ns": mono_now,
-                "mono_out_ns": "",
-                "boot_id": _current_boot_id(),
-                "time_corrected": "FALSE",
-            }
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-
-        elif log_type == "Check-Out":
-            if emp_rows.empty:
-                print(f"[WARN] {full_name} has no record to close for {today}.")
-                return "duplicate"
-
-            open_rows = emp_rows[(emp_rows["clock_in"] != "") & (emp_rows["clock_out"] == "")]
-            if open_rows.empty:
-                print(f"[LOCK] {full_name} already checked out (or no open check-in). Blocking.")
-                return "locked"
-
-            idx = open_rows.index[-1]
-            t_in = _parse_clock_time(df.at[idx, "clock_in"])
-            if t_in is None:
-                print(f"[ERROR] Cannot parse clock_in '{df.at[idx, 'clock_in']}' for {full_name}.")
+        with _day_lock:
+            ledger = _day_ledger(today)
+
+            # -------- HARD DAILY LOCK: one row per employee per day --------
+            if log_type == "Check-In":
+                if ledger.has(employee_id):
+                    print(f"[LOCK] {full_name} already has a record for {today}. Blocking new Check-In.")
+                    return "locked"
+
+                rid = f"{employee_id}-{today.isoformat()}-{len(ledger)+1}"
+                is_late = _to_bool_str(now.time() > LATE_CUTOFF)
+
+                quality = "SANE" if _clock_sane() else "UNSANE"
+                mono_now = str(time.monotonic_ns())
+
+                row = {
+                    "id": rid,
+                    "employee_id": str(employee_id),
+                    "full_name": full_name,
+                    "attendance_date": today.isoformat(),
+                    "clock_in": _format_time_12(now),  # 12-hour time
+                    "clock_out": "",
+                    "total_hours": "0.00",
+                    "total_minutes": "0.00",
+                    "duration": "",
+                    "is_late": is_late,
+                    "is_absent": "FALSE",
+                    "method": METHOD_USED,
+                    "created_at": now.isoformat(),
+                    "updated_at": now.isoformat(),
+                    "time_quality": quality,
+                    "mono_in_ns": mono_now,
+                    "mono_out_ns": "",
+                    "boot_id": _current_boot_id(),
+                    "time_corrected": "FALSE",
+                }
+
+            elif log_type == "Check-Out":
+                if not ledger.has(employee_id):
+                    print(f"[WARN] {full_name} has no record to close for {today}.")
+                    return "duplicate"
+
+                open_row = ledger.open_row(employee_id)
+                if open_row is None:
+                    print(f"[LOCK] {full_name} already checked out (or no open check-in). Blocking.")
+                    return "locked"
+
+                t_in = _parse_clock_time(open_row["clock_in"])
+                if t_in is None:
+                    print(f"[ERROR] Cannot parse clock_in '{open_row['clock_in']}' for {full_name}.")
+                    return False
+
+                cin = datetime.combine(today, t_in, TZ)
+                cout = now
+
+                total_seconds = max((cout - cin).total_seconds(), 0.0)
+                hours = round(total_seconds / 3600.0, 2)
+                minutes = round(total_seconds / 60.0, 2)
+                dur = _fmt_hms(total_seconds)
+
+                row = dict(open_row)
+                row["clock_out"] = _format_time_12(cout)  # 12-hour time
+                row["total_hours"] = f"{hours:.2f}"
+                row["total_minutes"] = f"{minutes:.2f}"
+                row["duration"] = dur
+                row["updated_at"] = now.isoformat()
+
+                # capture monotonic and propagate quality
+                row["mono_out_ns"] = str(time.monotonic_ns())
+                prev_q = open_row.get("time_quality", "SANE")
+                row["time_quality"] = "SANE" if (prev_q == "SANE" and _clock_sane()) else "UNSANE"
+            else:
+                print("[ERROR] Unknown log type.")
                 return False
 
-            cin = datetime.combine(today, t_in, TZ)
-            cout = now
-
-            total_seconds = max((cout - cin).total_seconds(), 0.0)
-            hours = round(total_seconds / 3600.0, 2)
-            minutes = round(total_seconds / 60.0, 2)
-            dur = _fmt_hms(total_seconds)
-
-            df.at[idx, "clock_out"] = _format_time_12(cout)  # 12-hour time
-            df.at[idx, "total_hours"] = f"{hours:.2f}"
-            df.at[idx, "total_minutes"] = f"{minutes:.2f}"
-            df.at[idx, "duration"] = dur
-            df.at[idx, "updated_at"] = now.isoformat()
-
-            # capture monotonic and propagate quality
-            df.at[idx, "mono_out_ns"] = str(time.monotonic_ns())
-            prev_q = df.at[idx, "time_quality"] if "time_quality" in df.columns else "SANE"
-            df.at[idx, "time_quality"] = "SANE" if (prev_q == "SANE" and _clock_sane()) else "UNSANE"
-        else:
-            print("[ERROR] Unknown log type.")
-            return False
-
-        _write_daily(today, df)
-        _maybe_refresh_current_week(self)
+            # One durable write; the CSV/PDF catch up when the day is compacted
+            _record_punch(today, row)
+            ledger.put(row)
+        compactor.schedule(today)
         print(f"[LOGGED] {log_type} for {full_name} ({employee_id})")
         return True
 
@@ -974,49 +1523,52 @@ class LocalAttendanceManager:
         and regenerate that day's CSV + PDF. Returns number of rows updated.
         """
         _ensure_daily_file(target_date)
-        df = _read_daily(target_date)
-        if df.empty:
-            return 0
-
-        updates = 0
-        now_iso = _now().isoformat()
-
-        for idx, row in df.iterrows():
-            # Skip absences and rows without an open check-in
-            if row.get("is_absent", "").upper() == "TRUE":
-                continue
-            cin_str = row.get("clock_in", "")
-            cout_str = row.get("clock_out", "")
-            if not cin_str or cout_str:
-                continue
-
-            tin = _parse_clock_time(cin_str)
-            if tin is None:
-                continue
-
-            cin_dt = datetime.combine(target_date, tin, TZ)
-            cutoff_dt = datetime.combine(target_date, cutoff_time, TZ)
-            cout_dt = cutoff_dt if cutoff_dt >= cin_dt else cin_dt  # never negative duration
-
-            total_seconds = max((cout_dt - cin_dt).total_seconds(), 0.0)
-            hours = round(total_seconds / 3600.0, 2)
-            minutes = round(total_seconds / 60.0, 2)
-            dur = _fmt_hms(total_seconds)
-
-            df.at[idx, "clock_out"] = _format_time_12(cout_dt)  # e.g., "06:00:00 PM"
-            df.at[idx, "total_hours"] = f"{hours:.2f}"
-            df.at[idx, "total_minutes"] = f"{minutes:.2f}"
-            df.at[idx, "duration"] = dur
-            df.at[idx, "updated_at"] = now_iso
-
-            prev_q = df.at[idx, "time_quality"] if "time_quality" in df.columns else "SANE"
-            df.at[idx, "time_quality"] = "SANE" if prev_q == "SANE" else prev_q
-            # mono_out_ns intentionally left blank for autoclose
-
-            updates += 1
+        with _day_lock:
+            df = _read_daily(target_date)
+            if df.empty:
+                return 0
+
+            updates = 0
+            now_iso = _now().isoformat()
+
+            for idx, row in df.iterrows():
+                # Skip absences and rows without an open check-in
+                if row.get("is_absent", "").upper() == "TRUE":
+                    continue
+                cin_str = row.get("clock_in", "")
+                cout_str = row.get("clock_out", "")
+                if not cin_str or cout_str:
+                    continue
+
+                tin = _parse_clock_time(cin_str)
+                if tin is None:
+                    continue
+
+                cin_dt = datetime.combine(target_date, tin, TZ)
+                cutoff_dt = datetime.combine(target_date, cutoff_time, TZ)
+                cout_dt = cutoff_dt if cutoff_dt >= cin_dt else cin_dt  # never negative duration
+
+                total_seconds = max((cout_dt - cin_dt).total_seconds(), 0.0)
+                hours = round(total_seconds / 3600.0, 2)
+                minutes = round(total_seconds / 60.0, 2)
+                dur = _fmt_hms(total_seconds)
+
+                df.at[idx, "clock_out"] = _format_time_12(cout_dt)  # e.g., "06:00:00 PM"
+                df.at[idx, "total_hours"] = f"{hours:.2f}"
+                df.at[idx, "total_minutes"] = f"{minutes:.2f}"
+                df.at[idx, "duration"] = dur
+                df.at[idx, "updated_at"] = now_iso
+
+                prev_q = df.at[idx, "time_quality"] if "time_quality" in df.columns else "SANE"
+                df.at[idx, "time_quality"] = "SANE" if prev_q == "SANE" else prev_q
+                # mono_out_ns intentionally left blank for autoclose
+
+                updates += 1
+
+            if updates > 0:
+                _write_daily(target_date, df)  # regenerates CSV + PDF
 
         if updates > 0:
-            _write_daily(target_date, df)  # regenerates CSV + PDF
             try:
                 self.export_weekly(any_day=target_date, to_csv=True, to_pdf=True)
                 print(f"[AUTOCLOSE] Weekly refreshed due to changes on {target_date}")
@@ -1038,47 +1590,49 @@ class LocalAttendanceManager:
             print(f"[ABSENT] weekend {target_date}, skipped.")
             return
         _ensure_daily_file(target_date)
-        df = _read_daily(target_date)
-        present_ids = set(df[df["clock_in"] != ""]["employee_id"].tolist())
-        missing = [eid for eid in all_employee_ids if str(eid) not in present_ids]
-        now = _now()
-
-        if not missing:
-            print(f"[ABSENT] none to mark on {target_date}")
-            return
-
-        rows = []
-        for eid in missing:
-            rows.append({
-                "id": f"{eid}-{target_date.isoformat()}-A",
-                "employee_id": str(eid),
-                "full_name": eid_to_name.get(str(eid), str(eid).replace("_", " ")),
-                "attendance_date": target_date.isoformat(),
-                "clock_in": "",
-                "clock_out": "",
-                "total_hours": "0.00",
-                "total_minutes": "0.00",
-                "duration": "",
-                "is_late": "FALSE",
-                "is_absent": "TRUE",
-                "method": METHOD_USED,
-                "created_at": now.isoformat(),
-                "updated_at": now.isoformat(),
-                "time_quality": "SANE" if _clock_sane() else "UNSANE",
-                "mono_in_ns": "",
-                "mono_out_ns": "",
-                "boot_id": _current_boot_id(),
-                "time_corrected": "FALSE",
-            })
-        df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
-        _write_daily(target_date, df)
+        with _day_lock:
+            df = _read_daily(target_date)
+            present_ids = set(df[df["clock_in"] != ""]["employee_id"].tolist())
+            missing = [eid for eid in all_employee_ids if str(eid) not in present_ids]
+            now = _now()
+
+            if not missing:
+                print(f"[ABSENT] none to mark on {target_date}")
+                return
+
+            rows = []
+            for eid in missing:
+                rows.append({
+                    "id": f"{eid}-{target_date.isoformat()}-A",
+                    "employee_id": str(eid),
+                    "full_name": gallery.name(eid),
+                    "attendance_date": target_date.isoformat(),
+                    "clock_in": "",
+                    "clock_out": "",
+                    "total_hours": "0.00",
+                    "total_minutes": "0.00",
+                    "duration": "",
+                    "is_late": "FALSE",
+                    "is_absent": "TRUE",
+                    "method": METHOD_USED,
+                    "created_at": now.isoformat(),
+                    "updated_at": now.isoformat(),
+                    "time_quality": "SANE" if _clock_sane() else "UNSANE",
+                    "mono_in_ns": "",
+                    "mono_out_ns": "",
+                    "boot_id": _current_boot_id(),
+                    "time_corrected": "FALSE",
+                })
+            df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
+            _write_daily(target_date, df)
         print(f"[ABSENT] Marked {len(rows)} employees absent for {target_date}")
 
     def export_weekly(self, any_day: date = None, to_csv=True, to_pdf=True):
         day = any_day or _today()
         iso_year, iso_week, _ = day.isocalendar()
-        logs_df = _build_weekly_frames(day)
-        summary_df = _weekly_summary(logs_df)
+        typed = _build_weekly_frames(day)
+        summary_df = _weekly_summary(typed)
+        logs_df = legacy_frame(typed)   # 12-hour text form for the exports
 
         base = os.path.join(REPORTS_DIR, f"weekly_{iso_year}-{iso_week:02d}")
         if to_csv:
@@ -1091,11 +1645,9 @@ class LocalAttendanceManager:
     def export_monthly(self, year: int, month: int, to_csv=True, to_pdf=True):
         start = date(year, month, 1)
         end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
-        days = (end - start).days
-        frames = [_read_daily(start + timedelta(days=i)) for i in range(days)]
-        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DAILY_HEADERS)
-
-        summary_df = _monthly_summary(df)
+        typed = load_range(start, end)
+        summary_df = _monthly_summary(typed)
+        df = legacy_frame(typed)   # 12-hour text form for the exports
 
         base = os.path.join(REPORTS_DIR, f"monthly_{year}-{month:02d}")
         if to_csv:
@@ -1135,22 +1687,22 @@ def recalc_and_regen_day(target_date: date):
     """Recompute totals from CSV for a given day and rebuild that day's PDF.
        Also refresh the week that contains that day."""
     _ensure_daily_file(target_date)
-    df = _read_daily(target_date)
-
-    for idx, row in df.iterrows():
-        tin  = _parse_clock_time(row.get("clock_in", ""))
-        tout = _parse_clock_time(row.get("clock_out", ""))
-        if tin and tout:
-            cin  = datetime.combine(target_date, tin,  TZ)
-            cout = datetime.combine(target_date, tout, TZ)
-            total_seconds = max((cout - cin).total_seconds(), 0.0)
-            df.at[idx, "total_hours"]   = f"{(total_seconds/3600.0):.2f}"
-            df.at[idx, "total_minutes"] = f"{(total_seconds/60.0):.2f}"
-            df.at[idx, "duration"]      = _fmt_hms(total_seconds)
-            df.at[idx, "is_late"]       = _to_bool_str(tin > LATE_CUTOFF)
-            df.at[idx, "updated_at"]    = _now().isoformat()
-
-    _write_daily(target_date, df)  # writes CSV + PDF
+    with _day_lock:
+        df = _read_daily(target_date)
+
+        cin = clock_seconds(df["clock_in"])
+        cout = clock_seconds(df["clock_out"])
+        done = (cin != NO_TIME) & (cout != NO_TIME)
+        if done.any():
+            secs = (cout[done] - cin[done]).clip(lower=0)
+            late_s = LATE_CUTOFF.hour * 3600 + LATE_CUTOFF.minute * 60 + LATE_CUTOFF.second
+            df.loc[done, "total_hours"]   = hours_strings(secs / 3600.0)
+            df.loc[done, "total_minutes"] = hours_strings(secs / 60.0)
+            df.loc[done, "duration"]      = duration_strings(secs)
+            df.loc[done, "is_late"]       = np.where(cin[done] > late_s, "TRUE", "FALSE")
+            df.loc[done, "updated_at"]    = _now().isoformat()
+
+        _write_daily(target_date, df)  # writes CSV + PDF
 
     try:
         mgr = _GLOBAL_MGR or LocalAttendanceManager()
@@ -1175,8 +1727,18 @@ def _regen_recent_days(n=3):
 def main():
     global _GLOBAL_SCHEDULER, _GLOBAL_MGR, _SCHEDULER_STARTED
 
+    if hardware is None:
+        init_hardware()
+
     mgr = LocalAttendanceManager()
     _GLOBAL_MGR = mgr
+    _compact_pending_journals()   # punches journaled before a crash/restart
+
+    # Load the recognition models while the gallery loads, so the first press doesn't wait
+    load_models = getattr(face_recognition.api, "load_models", None)
+    if load_models is not None:
+        threading.Thread(target=load_models, args=KIOSK_MODELS,
+                         name="ats-model-warmup", daemon=True).start()
 
     # Encodings: load cache or build from local employee folders
     load_encodings_from_cache_or_build()
@@ -1230,6 +1792,11 @@ def main():
     # LCD greeting thread after encodings are ready
     threading.Thread(target=lambda: (encoding_ready.wait(), hourly_greeting_updater()), daemon=True).start()
 
+    # Warm pre-roll detector on the already-running camera stream
+    if PREROLL_ENABLED:
+        threading.Thread(target=lambda: (encoding_ready.wait(), _resume_preroll(), _preroll_worker()),
+                         daemon=True).start()
+
     try:
         display(get_greeting_lines())
         while True:
@@ -1254,6 +1821,7 @@ def main():
             picam2.stop()
         except Exception:
             pass
+        compactor.stop()   # bring today's CSV/PDF up to date before exiting
         print("[SYSTEM] Shutdown")
         
         
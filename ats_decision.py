@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Decision rules that turn per-frame match distances into a recognition result.
+
+StreakDecision is the original fixed rule (TOLERANCE, SECOND_BEST_MARGIN,
+MATCH_STREAK). SequentialDecision is a Wald sequential probability ratio
+test per candidate ID: each frame adds the log-likelihood ratio of
+"genuine" vs "impostor" for the observed distance, and the attempt stops as
+soon as one ID (accept) or the best candidate (reject -> unknown) crosses a
+bound. Clear matches resolve in one or two frames instead of a fixed count.
+
+Both expose the same interface: observe(eid, best, second, weight) returns
+ACCEPT, REJECT or None, then winner/confidence describe the accepted ID.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+ACCEPT = "accept"
+REJECT = "reject"
+
+
+class StreakDecision:
+    """Accept once one ID collects `streak` (weighted) votes within tolerance."""
+
+    def __init__(self, tolerance=0.41, margin=0.05, streak=2):
+        self.tolerance = tolerance
+        self.margin = margin
+        self.streak = streak
+        self.reset()
+
+    def reset(self):
+        self.scores = {}
+        self.best_conf = {}
+        self.winner = None
+
+    @property
+    def confidence(self):
+        return self.best_conf.get(self.winner)
+
+    def observe(self, eid, best, second, weight=1.0):
+        if best > self.tolerance:
+            return None
+        if second is not None and (second - best) < self.margin:
+            return None
+
+        self.scores[eid] = self.scores.get(eid, 0) + weight
+        conf = 1.0 - best
+        if eid not in self.best_conf or conf > self.best_conf[eid]:
+            self.best_conf[eid] = conf
+
+        if self.scores[eid] >= self.streak:
+            self.winner = eid
+            return ACCEPT
+        return None
+
+    def hold_open(self):
+        """Cap the evidence just short of a decision (used for pre-roll seeding)."""
+        self.winner = None
+        for eid in self.scores:
+            self.scores[eid] = min(self.scores[eid], self.streak - 1)
+
+
+def _gauss_logpdf(x, mean, std):
+    return -0.5 * ((x - mean) / std) ** 2 - math.log(std) - 0.5 * math.log(2.0 * math.pi)
+
+
+def _gauss_kl(m1, s1, m2, s2):
+    """KL(N(m1, s1^2) || N(m2, s2^2))"""
+    return math.log(s2 / s1) + (s1 ** 2 + (m1 - m2) ** 2) / (2.0 * s2 ** 2) - 0.5
+
+
+class SequentialDecision:
+    """
+    SPRT on match distances, one running log-likelihood ratio per candidate.
+
+    Distances are modelled as Gaussians: genuine N(genuine_mean, genuine_std)
+    and impostor N(impostor_mean, impostor_std). alpha is the target false
+    accept rate, beta the target false reject rate. Frames whose best and
+    runner-up IDs are closer than `margin` add no evidence *for* the best ID,
+    and neither do frames with best > `tolerance`: the Gaussians above would
+    otherwise score distances up to their crossover (~0.455 with the
+    defaults) as genuine, loosening the tuned per-frame threshold.
+    A reject needs at least `min_reject_frames` observed frames so one bad
+    frame of a genuine user cannot end the attempt.
+    """
+
+    def __init__(self, genuine_mean=0.32, genuine_std=0.06, impostor_mean=0.62,
+                 impostor_std=0.08, alpha=0.001, beta=0.01, margin=0.05,
+                 llr_clip=8.0, min_reject_frames=2, tolerance=0.41):
+        self.genuine = (genuine_mean, genuine_std)
+        self.impostor = (impostor_mean, impostor_std)
+        self.alpha = alpha
+        self.beta = beta
+        self.margin = margin
+        self.llr_clip = llr_clip
+        self.min_reject_frames = min_reject_frames
+        self.tolerance = tolerance
+        self.upper = math.log((1.0 - beta) / alpha)
+        self.lower = math.log(beta / (1.0 - alpha))
+        self.reset()
+
+    def reset(self):
+        self.scores = {}
+        self.best_conf = {}
+        self.winner = None
+        self.observed = 0
+
+    @property
+    def confidence(self):
+        return self.best_conf.get(self.winner)
+
+    def llr(self, distance):
+        """
+        log p(d | genuine) - log p(d | impostor), clipped to +/- llr_clip;
+        never positive beyond tolerance.
+        """
+        v = _gauss_logpdf(distance, *self.genuine) - _gauss_logpdf(distance, *self.impostor)
+        if self.tolerance is not None and distance > self.tolerance:
+            v = min(v, 0.0)
+        return max(-self.llr_clip, min(self.llr_clip, v))
+
+    def observe(self, eid, best, second, weight=1.0):
+        llr = self.llr(best)
+        if llr > 0 and second is not None and (second - best) < self.margin:
+            return None   # close runner-up: no evidence *for* this ID (evidence against still counts)
+
+        self.observed += 1
+        self.scores[eid] = self.scores.get(eid, 0.0) + weight * llr
+        conf = 1.0 - best
+        if eid not in self.best_conf or conf > self.best_conf[eid]:
+            self.best_conf[eid] = conf
+
+        if self.scores[eid] >= self.upper:
+            self.winner = eid
+            return ACCEPT
+        if self.observed >= self.min_reject_frames and max(self.scores.values()) <= self.lower:
+            return REJECT
+        return None
+
+    def hold_open(self):
+        """Clamp every running LLR strictly inside (lower, upper)."""
+        self.winner = None
+        eps = 1e-6
+        for eid, v in self.scores.items():
+            self.scores[eid] = min(max(v, self.lower + eps), self.upper - eps)
+
+    def expected_frames(self):
+        """
+        Wald's average sample number (observed frames to decision) under each
+        hypothesis: {"genuine": E[N | genuine], "impostor": E[N | impostor]}.
+        Ignores clipping and the min_reject_frames floor.
+        """
+        (mg, sg), (mi, si) = self.genuine, self.impostor
+        a, b = self.upper, self.lower
+        drift_g = _gauss_kl(mg, sg, mi, si)
+        drift_i = -_gauss_kl(mi, si, mg, sg)
+        return {
+            "genuine": ((1.0 - self.beta) * a + self.beta * b) / drift_g,
+            "impostor": (self.alpha * a + (1.0 - self.alpha) * b) / drift_i,
+        }
+
+
+class DecisionStats:
+    """Frames-to-decision per outcome over recent attempts."""
+
+    def __init__(self, maxlen=500):
+        self._maxlen = maxlen
+        self._records = []
+        self._lock = threading.Lock()
+
+    def record(self, outcome, frames):
+        with self._lock:
+            self._records.append((outcome, int(frames)))
+            del self._records[:-self._maxlen]
+
+    def reset(self):
+        with self._lock:
+            self._records = []
+
+    def summary(self):
+        """{outcome: {count, mean_frames, p95_frames}} plus an "all" row."""
+        with self._lock:
+            records = list(self._records)
+        out = {}
+        groups = {"all": [f for _, f in records]}
+        for outcome, f in records:
+            groups.setdefault(outcome, []).append(f)
+        for outcome, frames in groups.items():
+            if not frames:
+                continue
+            arr = np.asarray(frames, dtype=np.float64)
+            out[outcome] = {
+                "count": int(arr.size),
+                "mean_frames": round(float(arr.mean()), 2),
+                "p95_frames": round(float(np.percentile(arr, 95)), 2),
+            }
+        return out
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental enrollment for the ATS kiosk.
+
+Photos live under employees/<First_Last>/*.jpg. A manifest remembers, per
+photo, (size, mtime, sha1) and the encoding it produced (None when no face
+was found), so a sync only runs the detector/encoder on new or changed
+photos and drops entries for deleted ones. An unchanged tree is a handful
+of os.stat calls; a renamed or touched file is matched by its sha1 and
+reuses the stored encoding.
+
+With a chip cache directory, the first encode of a photo also stores a
+downscaled copy and the aligned 150x150 face chip (dlib.get_face_chip, the
+crop the encoder itself uses), keyed by the photo's sha1. Any later
+encode of the same content, e.g. with a different num_jitters, starts
+from the chip and skips decoding and detection.
+
+Photos that do need encoding are fanned out to a forkserver process pool
+(encode_in_pool). The forkserver preloads this module, so workers start
+with dlib/numpy/cv2 imported; importing the patched face_recognition.api
+(face_recognition-1.3.0/, see requirements.txt) loads no model, and each
+worker loads its own copy of ENROLL_MODELS in _pool_init.
+"""
+
+import os
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import threading
+import subprocess
+import multiprocessing
+
+import cv2
+import dlib
+import numpy as np
+import face_recognition
+from face_recognition import api as fr_api
+
+MANIFEST_VERSION = 2
+PHOTO_EXTS = (".jpg", ".jpeg", ".png")
+CHIP_SIZE = 150             # what the ResNet encoder expects
+CHIP_PADDING = 0.25         # same padding compute_face_descriptor uses
+CHIP_VERSION = 2            # bump when the chip recipe changes; older cache entries are rebuilt
+DOWNSCALE_MAX_SIDE = 1280   # detection runs on (and the cache keeps) this size
+ENROLL_MODELS = ("face_detector", "pose_predictor_5_point", "face_encoder")
+ENROLL_BATCH_SIZE = 8       # chips per face_encoder call in a worker
+
+_sync_lock = threading.Lock()
+
+
+def encode_photo_faces(path, num_jitters=1):
+    """Encodings of every face found in the photo (HOG detector)."""
+    image = face_recognition.load_image_file(path)
+    locs = face_recognition.face_locations(image, model="hog")
+    batch = getattr(fr_api, "batch_face_encodings", None)
+    if batch is None:   # stock PyPI face_recognition: one encoder call per face
+        return face_recognition.face_encodings(image, locs, num_jitters=num_jitters, model="small")
+    return batch([image], [locs], num_jitters=num_jitters)[0]
+
+
+def encode_photo(path, num_jitters=2, chip_dir=None, sha=None):
+    """
+    Encoding of the first face found in the photo, or None if there is none.
+    With chip_dir the encoding comes from the cached face chip (built on the
+    first call); returns (encoding, info) in that case, see encode_from_chip.
+    """
+    if chip_dir:
+        return encode_from_chip(path, chip_dir, sha or file_sha1(path), num_jitters)
+    encs = encode_photo_faces(path, num_jitters=num_jitters)
+    return np.asarray(encs[0], dtype=np.float64) if encs else None
+
+
+# -------------------- Chip cache --------------------
+def _chip_paths(chip_dir, sha):
+    base = os.path.join(chip_dir, sha)
+    return base + ".png", base + ".jpg", base + ".json"
+
+
+def prepare_chip(path, chip_dir, sha):
+    """
+    Decode the photo once, downscale it, detect the first face and store
+    <sha>.jpg (downscaled copy), <sha>.png (aligned chip, lossless, only if
+    a face was found) and <sha>.json (source size and decode/detect time).
+    Only detection runs on the downscaled copy: the landmarks and the chip
+    come from the full image inside the scaled-up box, the same crop
+    face_encodings(image) would hand the encoder.
+    Returns (chip or None, meta).
+    """
+    chip_png, small_jpg, meta_json = _chip_paths(chip_dir, sha)
+    t0 = time.perf_counter()
+    image = face_recognition.load_image_file(path)
+    t1 = time.perf_counter()
+
+    h, w = image.shape[:2]
+    scale = min(1.0, DOWNSCALE_MAX_SIDE / float(max(h, w)))
+    small = image if scale >= 1.0 else cv2.resize(image, (int(w * scale), int(h * scale)),
+                                                   interpolation=cv2.INTER_AREA)
+    locs = face_recognition.face_locations(small, model="hog")
+    chip = None
+    if locs:
+        box = tuple(int(round(v / scale)) for v in locs[0])
+        shape = fr_api._raw_face_landmarks(image, [box], model="small")[0]
+        chip = dlib.get_face_chip(image, shape, size=CHIP_SIZE, padding=CHIP_PADDING)
+    t2 = time.perf_counter()
+
+    os.makedirs(chip_dir, exist_ok=True)
+    cv2.imwrite(small_jpg, cv2.cvtColor(small, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 92])
+    if chip is not None:
+        cv2.imwrite(chip_png, cv2.cvtColor(chip, cv2.COLOR_RGB2BGR))
+    meta = {"version": CHIP_VERSION, "face": chip is not None, "src_shape": [h, w], "small_shape": list(small.shape[:2]),
+            "decode_s": round(t1 - t0, 4), "detect_s": round(t2 - t1, 4)}
+    tmp = meta_json + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_json)   # written last: a .json means the entry is complete
+    return chip, meta
+
+
+def load_chip(chip_dir, sha):
+    """(chip or None, meta) from the cache, or None if this content is not cached."""
+    chip_png, _, meta_json = _chip_paths(chip_dir, sha)
+    try:
+        with open(meta_json, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CHIP_VERSION:
+        return None
+    if not meta.get("face"):
+        return None, meta
+    bgr = cv2.imread(chip_png, cv2.IMREAD_COLOR)
+    if bgr is None:
+        return None
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), meta
+
+
+def encode_chips(chips, num_jitters=2):
+    """
+    Encodings (float64) of aligned chips, all in one face_encoder call;
+    falls back to one call per chip on dlib builds without batch support.
+    """
+    if not chips:
+        return []
+    encoder = fr_api.face_encoder
+    try:
+        encs = encoder.compute_face_descriptor(list(chips), num_jitters)
+    except TypeError:
+        encs = [encoder.compute_face_descriptor(chip, num_jitters) for chip in chips]
+    return [np.asarray(enc, dtype=np.float64) for enc in encs]
+
+
+def chip_for(path, chip_dir, sha):
+    """
+    (chip or None, info). info["chip_hit"] says whether the cache was
+    used; on a hit "saved_s" is the decode+detect time recorded when the chip
+    was made minus the chip load time, and "saved_bytes" the decoded source
+    pixels that did not have to be held in memory.
+    """
+    t0 = time.perf_counter()
+    cached = load_chip(chip_dir, sha)
+    load_s = time.perf_counter() - t0
+    info = {"chip_hit": cached is not None, "saved_s": 0.0, "saved_bytes": 0}
+    if cached is None:
+        chip, meta = prepare_chip(path, chip_dir, sha)
+    else:
+        chip, meta = cached
+        h, w = meta["src_shape"]
+        info["saved_s"] = max(0.0, meta["decode_s"] + meta["detect_s"] - load_s)
+        info["saved_bytes"] = max(0, h * w * 3 - CHIP_SIZE * CHIP_SIZE * 3)
+    return chip, info
+
+
+def encode_from_chip(path, chip_dir, sha, num_jitters=2):
+    """(encoding or None, info); info as in chip_for."""
+    chip, info = chip_for(path, chip_dir, sha)
+    if chip is None:
+        return None, info
+    return encode_chips([chip], num_jitters)[0], info
+
+
+def prune_chips(chip_dir, keep_shas):
+    """Delete cached chips whose photo content is no longer enrolled; returns the count."""
+    if not chip_dir or not os.path.isdir(chip_dir):
+        return 0
+    removed = set()
+    for name in os.listdir(chip_dir):
+        sha = name.split(".", 1)[0]
+        if sha not in keep_shas:
+            try:
+                os.remove(os.path.join(chip_dir, name))
+                removed.add(sha)
+            except OSError:
+                pass
+    return len(removed)
+
+
+# -------------------- Priority --------------------
+def lower_priority(nice=10, ionice_class=2, ionice_level=7, thread=True):
+    """
+    Raise the niceness (and lower the I/O priority via ionice) of the calling
+    thread, or of the whole process with thread=False. On Linux both are
+    per-thread when given the thread id, so a background refresh thread can
+    step back without slowing the recognition threads. Best effort: failures
+    are reported and ignored.
+    """
+    who = threading.get_native_id() if thread else os.getpid()
+    try:
+        os.setpriority(os.PRIO_PROCESS, who, min(19, os.getpriority(os.PRIO_PROCESS, who) + nice))
+    except (AttributeError, OSError) as e:
+        print(f"[ENROLL] setpriority failed: {e}")
+    if ionice_class is None or not shutil.which("ionice"):
+        return
+    cmd = ["ionice", "-c", str(ionice_class), "-p", str(who)]
+    if ionice_class == 2:
+        cmd[3:3] = ["-n", str(ionice_level)]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[ENROLL] ionice failed: {e}")
+
+
+# -------------------- Process pool --------------------
+_worker_opts = {"num_jitters": 2, "all_faces": False, "chip_dir": None}
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _pool_init(num_jitters, all_faces, nice=None, chip_dir=None):
+    _worker_opts["num_jitters"] = num_jitters
+    _worker_opts["all_faces"] = all_faces
+    _worker_opts["chip_dir"] = chip_dir
+    if nice:
+        lower_priority(nice, thread=False)
+    # The patched face_recognition.api loads models on first use; load the ones
+    # enrollment needs here so they are resident before the first job arrives
+    # (the stock PyPI 1.3.0 has no load_models: it loaded them all at import).
+    load_models = getattr(fr_api, "load_models", None)
+    if load_models is not None:
+        load_models(*ENROLL_MODELS)
+
+
+def _encode_job(job):
+    key, path, *rest = job
+    jitters, chip_dir = _worker_opts["num_jitters"], _worker_opts["chip_dir"]
+    try:
+        if _worker_opts["all_faces"]:
+            return key, encode_photo_faces(path, jitters), None, {}
+        if chip_dir:
+            enc, info = encode_photo(path, jitters, chip_dir=chip_dir, sha=rest[0] if rest else None)
+            return key, enc, None, info
+        return key, encode_photo(path, jitters), None, {}
+    except Exception as e:
+        return key, None, f"{type(e).__name__}: {e}", {}
+
+
+def _encode_batch(jobs):
+    """
+    _encode_job over a batch. In chip mode the chips are loaded/made one
+    by one and then encoded together in a single face_encoder call.
+    """
+    chip_dir = _worker_opts["chip_dir"]
+    if _worker_opts["all_faces"] or not chip_dir:
+        return [_encode_job(job) for job in jobs]
+
+    out, pending = [], []
+    for key, path, *rest in jobs:
+        try:
+            chip, info = chip_for(path, chip_dir, rest[0] if rest else file_sha1(path))
+        except Exception as e:
+            out.append((key, None, f"{type(e).__name__}: {e}", {}))
+            continue
+        if chip is None:
+            out.append((key, None, None, info))
+        else:
+            pending.append((key, chip, info))
+    try:
+        encs = encode_chips([chip for _, chip, _ in pending], _worker_opts["num_jitters"])
+        out.extend((key, enc, None, info) for (key, _, info), enc in zip(pending, encs))
+    except Exception as e:
+        out.extend((key, None, f"{type(e).__name__}: {e}", info) for key, _, info in pending)
+    return out
+
+
+def _pool_context():
+    # forkserver: workers fork from a clean process with dlib/numpy/cv2 already
+    # imported (not the models: each worker loads ENROLL_MODELS in _pool_init),
+    # which is also safe from threads (the scheduler) unlike plain fork.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context()
+
+
+def encode_in_pool(jobs, processes=None, num_jitters=2, all_faces=False, nice=None, chip_dir=None,
+                   batch_size=ENROLL_BATCH_SIZE):
+    """
+    Encode [(key, path)] or [(key, path, sha1)] and yield
+    (key, result, error, info) in completion order.
+
+    result is encode_photo(path) (first encoding or None), or with
+    all_faces=True the list from encode_photo_faces(path). error is a string
+    when the photo could not be read/encoded. With chip_dir encodings go
+    through the chip cache and info carries the chip hit/savings (see
+    chip_for); otherwise info is empty. processes defaults to the
+    available cores; one process (or one job) runs in-process without a pool.
+    Jobs go to the workers in batches of up to batch_size (fewer when that
+    keeps every worker busy); see _encode_batch.
+    nice lowers the workers' CPU/I/O priority (see lower_priority); the
+    in-process path leaves the caller's priority alone. Prints the throughput
+    (and chip cache savings) when done.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    processes = min(processes or available_cpus(), len(jobs))
+    size = max(1, min(batch_size or 1, -(-len(jobs) // processes)))
+    batches = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    t0 = time.perf_counter()
+
+    hits, saved_s, saved_bytes = 0, 0.0, 0
+    if processes <= 1:
+        _pool_init(num_jitters, all_faces, None, chip_dir)
+        results = map(_encode_batch, batches)
+        pool = None
+    else:
+        pool = _pool_context().Pool(processes, initializer=_pool_init,
+                                    initargs=(num_jitters, all_faces, nice, chip_dir))
+        results = pool.imap_unordered(_encode_batch, batches)
+    try:
+        for batch in results:
+            for out in batch:
+                info = out[3]
+                if info.get("chip_hit"):
+                    hits += 1
+                    saved_s += info["saved_s"]
+                    saved_bytes += info["saved_bytes"]
+                yield out
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    dt = time.perf_counter() - t0
+    print(f"[ENROLL] {len(jobs)} photos in {dt:.1f}s "
+          f"({len(jobs) / dt if dt > 0 else 0.0:.2f} photos/s, {processes} process(es))")
+    if chip_dir:
+        print(f"[ENROLL] chip cache: {hits}/{len(jobs)} hits, ~{saved_s:.1f}s decode+detect "
+              f"and {saved_bytes / 1e6:.1f} MB decoded pixels saved")
+
+
+def file_sha1(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def scan_photos(root):
+    """[(relpath, employee_id, full_name, stat)] for every photo, in path order."""
+    photos = []
+    if not os.path.isdir(root):
+        return photos
+    for folder in sorted(os.listdir(root)):
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        full_name = folder.replace("_", " ").strip()
+        for file in sorted(os.listdir(folder_path)):
+            if not file.lower().endswith(PHOTO_EXTS):
+                continue
+            try:
+                st = os.stat(os.path.join(folder_path, file))
+            except OSError:
+                continue
+            photos.append((os.path.join(folder, file), folder, full_name, st))
+    return photos
+
+
+def load_manifest(path):
+    """{relpath: entry} from disk; empty on a missing, stale or unreadable file."""
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            return dict(data["photos"])
+        if data.get("version") == 1:   # v1 always encoded with num_jitters=2
+            return {rel: dict(e, num_jitters=2) for rel, e in data["photos"].items()}
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[ENROLL] Ignoring unreadable manifest {path}: {e}")
+    return {}
+
+
+def save_manifest(path, photos):
+    """Write the manifest atomically (temp file + os.replace)."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": MANIFEST_VERSION, "photos": photos}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _usable(entry, num_jitters):
+    """A stored result can be reused: same jitter count, or no face at all."""
+    return entry["encoding"] is None or entry.get("num_jitters") == num_jitters
+
+
+class SyncResult:
+    """Gallery rows (path order) plus what the sync had to do."""
+
+    def __init__(self, photos, stats):
+        self.encodings, self.names, self.ids = [], [], []
+        for rel in sorted(photos):
+            entry = photos[rel]
+            if entry["encoding"] is not None:
+                self.encodings.append(entry["encoding"])
+                self.names.append(entry["name"])
+                self.ids.append(entry["employee_id"])
+        self.stats = stats
+
+    @property
+    def changed(self):
+        return any(self.stats[k] for k in ("encoded", "no_face", "removed", "rehashed"))
+
+
+def sync_enrollment(root, manifest_path, processes=None, num_jitters=2, nice=None, chip_dir=None):
+    """
+    Bring the manifest in line with the photos under root and return a
+    SyncResult. Only photos whose content (or num_jitters) is not already in
+    the manifest are encoded, in a process pool (see encode_in_pool) and
+    through the chip cache when chip_dir is given; a photo that fails to
+    encode is left out and retried on the next sync (its cached chip is
+    kept). stats["removed"] counts photos gone from disk; chips are pruned
+    only for content no photo on disk has any more.
+    """
+    with _sync_lock:
+        old = load_manifest(manifest_path)
+        by_sha = {e["sha1"]: e for e in old.values()}
+        photos, pending, on_disk, keep_shas = {}, {}, set(), set()
+        stats = {"photos": 0, "reused": 0, "rehashed": 0, "encoded": 0,
+                 "no_face": 0, "failed": 0, "removed": 0}
+
+        for rel, eid, name, st in scan_photos(root):
+            stats["photos"] += 1
+            on_disk.add(rel)
+            prev = old.get(rel)
+            if prev is not None and not _usable(prev, num_jitters):
+                prev = None
+            if prev is not None and prev["size"] == st.st_size and prev["mtime"] == st.st_mtime_ns:
+                photos[rel] = dict(prev, employee_id=eid, name=name)
+                stats["reused"] += 1
+                continue
+
+            path = os.path.join(root, rel)
+            try:
+                sha = file_sha1(path)
+            except OSError as e:
+                stats["failed"] += 1
+                print(f"[ENROLL] Failed on {path}: {e}")
+                if rel in old:
+                    keep_shas.add(old[rel]["sha1"])
+                continue
+            entry = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha1": sha,
+                     "employee_id": eid, "name": name, "encoding": None, "num_jitters": num_jitters}
+            known = by_sha.get(sha)
+            if known is not None and _usable(known, num_jitters):
+                entry["encoding"] = known["encoding"]
+                photos[rel] = entry
+                stats["rehashed"] += 1
+            else:
+                pending[rel] = entry
+
+        jobs = [(rel, os.path.join(root, rel), pending[rel]["sha1"]) for rel in pending]
+        for rel, enc, err, _ in encode_in_pool(jobs, processes=processes, num_jitters=num_jitters,
+                                                nice=nice, chip_dir=chip_dir):
+            if err is not None:
+                stats["failed"] += 1
+                print(f"[ENROLL] Failed on {rel}: {err}")
+                keep_shas.add(pending[rel]["sha1"])
+                continue
+            pending[rel]["encoding"] = enc
+            photos[rel] = pending[rel]
+            stats["encoded" if enc is not None else "no_face"] += 1
+            print(f"[ENROLL] {'Encoded' if enc is not None else 'No face in'} {rel}")
+
+        stats["removed"] = len(set(old) - on_disk)
+        result = SyncResult(photos, stats)
+        if result.changed or set(old) != set(photos):
+            save_manifest(manifest_path, photos)
+            if chip_dir:
+                prune_chips(chip_dir, keep_shas | {e["sha1"] for e in photos.values()})
+        return result
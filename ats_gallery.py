@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+Gallery matching for the ATS kiosk.
+
+The enrolled encodings are packed once into a contiguous float32 matrix,
+grouped by employee, so the per-employee minimum distance and the runner-up
+for a probe come out of NumPy reductions instead of a Python loop per row.
+
+The same layout is what goes to disk (save_gallery / load_gallery):
+
+    0   header   magic "ATSGALRY", version, dim, rows, ids, table offset/length
+    64  float32  rows x dim block, rows grouped by employee in table order
+    ..  JSON     {"ids": [...], "names": [...], "counts": [...]}
+
+so loading is one np.memmap of the block plus a small string table, and
+the matrix (with GalleryIndex.sq_norms) can be handed to
+face_recognition.packed_face_distance as is.
+"""
+
+import os
+import json
+import time
+import struct
+import threading
+import itertools
+from types import MappingProxyType
+
+import numpy as np
+
+ENCODING_DIM = 128
+
+GALLERY_MAGIC = b"ATSGALRY"
+GALLERY_VERSION = 1
+_HEADER = struct.Struct("<8sIIQIQQ")   # magic, version, dim, rows, ids, table_off, table_len
+_HEADER_SIZE = 64                       # data block starts 64-byte aligned
+
+
+def _packed_dists(matrix, sq_norms, probes, out):
+    """
+    Distances from one probe (or a (P, 128) block) to every row, written
+    into out: ||a||^2 + ||b||^2 - 2a.b with the cached row norms. Same kernel
+    as face_recognition.api.packed_face_distance, kept here so the matcher
+    does not pull in dlib. No arrays are allocated for float32 probes.
+    """
+    np.dot(probes, matrix.T, out=out)
+    # row by row: a broadcast in-place add over a (P, N) block allocates a temporary
+    for row, p in zip(np.atleast_2d(out), np.atleast_2d(probes)):
+        row *= -2.0
+        row += sq_norms
+        row += np.dot(p, p)
+    np.maximum(out, 0.0, out=out)
+    return np.sqrt(out, out=out)
+
+
+class GalleryIndex:
+    """
+    Read-only matcher built from the parallel (encodings, ids) lists.
+
+    Rows are reordered so every employee's encodings are contiguous; the
+    per-ID minimum is then one np.minimum.reduceat over the row distances.
+    Row norms are computed once, and each thread matches into its own
+    preallocated buffers, so match() allocates no arrays per probe.
+    """
+
+    def __init__(self, encodings, ids):
+        if len(encodings) != len(ids):
+            raise ValueError(f"encodings/ids length mismatch: {len(encodings)} != {len(ids)}")
+
+        if len(ids) == 0:
+            self.ids = []
+            self.codes = np.empty(0, dtype=np.int32)
+            self.matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+            self.starts = np.empty(0, dtype=np.intp)
+            self.sq_norms = np.empty(0, dtype=np.float32)
+            self._local = threading.local()
+            return
+
+        uniq, codes = np.unique(np.asarray([str(i) for i in ids]), return_inverse=True)
+        order = np.argsort(codes, kind="stable")
+
+        self.ids = [str(u) for u in uniq]                      # code -> employee_id
+        self.codes = codes[order].astype(np.int32)             # row -> code
+        self.matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32)[order])
+        # first row of each employee's run (codes are sorted, every code present)
+        self.starts = np.flatnonzero(np.r_[True, self.codes[1:] != self.codes[:-1]])
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self._local = threading.local()
+
+    @classmethod
+    def from_packed(cls, matrix, ids, counts):
+        """Wrap an already grouped (rows x 128) matrix without copying it."""
+        counts = np.asarray(counts, dtype=np.intp)
+        if int(counts.sum()) != matrix.shape[0] or len(ids) != counts.size or (counts <= 0).any():
+            raise ValueError("packed gallery counts do not match the matrix")
+        self = cls.__new__(cls)
+        self.ids = [str(i) for i in ids]
+        self.codes = np.repeat(np.arange(counts.size, dtype=np.int32), counts)
+        self.matrix = matrix
+        self.starts = np.r_[0, np.cumsum(counts)[:-1]].astype(np.intp) if counts.size else counts
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32)
+        self._local = threading.local()
+        return self
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Encodings per employee, indexed by code."""
+        return np.diff(np.r_[self.starts, len(self)])
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def num_ids(self) -> int:
+        return len(self.ids)
+
+    def _buffers(self):
+        """This thread's (probe, row distances, per-ID minimum) work arrays."""
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = (np.empty(ENCODING_DIM, dtype=np.float32),
+                                     np.empty(len(self), dtype=np.float32),
+                                     np.empty(self.num_ids, dtype=np.float32))
+        return buf
+
+    def per_id_min(self, probe, out=None) -> np.ndarray:
+        """Minimum distance from one probe to each employee (indexed by code), into out if given."""
+        p, dists, _ = self._buffers()
+        np.copyto(p, probe, casting="same_kind")
+        _packed_dists(self.matrix, self.sq_norms, p, dists)
+        if out is None:
+            out = np.empty(self.num_ids, dtype=np.float32)
+        return np.minimum.reduceat(dists, self.starts, out=out)
+
+    def match(self, probe):
+        """
+        Returns (best_id, best_distance, second_distance) for one probe.
+        second_distance is the best distance to any *other* employee, or None
+        when only one employee is enrolled. Returns (None, None, None) on an
+        empty gallery.
+        """
+        if len(self) == 0:
+            return None, None, None
+
+        per_id = self.per_id_min(probe, out=self._buffers()[2])
+        if per_id.shape[0] == 1:
+            return self.ids[0], float(per_id[0]), None
+
+        best = int(per_id.argmin())
+        best_dist = float(per_id[best])
+        per_id[best] = np.inf       # scratch buffer: mask the winner for the runner-up
+        return self.ids[best], best_dist, float(per_id.min())
+
+    def match_many(self, probes):
+        """
+        Batched match for a (P, 128) block of probes.
+        Returns (best_ids, best_distances, second_distances); second is NaN
+        when only one employee is enrolled.
+        """
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        n_probes = probes.shape[0]
+        if len(self) == 0 or n_probes == 0:
+            return [None] * n_probes, np.full(n_probes, np.nan), np.full(n_probes, np.nan)
+
+        dists = _packed_dists(self.matrix, self.sq_norms, probes,
+                              np.empty((n_probes, len(self)), dtype=np.float32))
+        per_id = np.minimum.reduceat(dists, self.starts, axis=1)
+
+        rows = np.arange(n_probes)
+        if per_id.shape[1] == 1:
+            return [self.ids[0]] * n_probes, per_id[:, 0], np.full(n_probes, np.nan)
+
+        top2 = np.argpartition(per_id, 1, axis=1)[:, :2]
+        d0 = per_id[rows, top2[:, 0]]
+        d1 = per_id[rows, top2[:, 1]]
+        swap = d1 < d0
+        best_codes = np.where(swap, top2[:, 1], top2[:, 0])
+        best = np.minimum(d0, d1)
+        second = np.maximum(d0, d1)
+        return [self.ids[c] for c in best_codes], best, second
+
+
+_versions = itertools.count(1)
+
+
+class Gallery:
+    """
+    Immutable snapshot of the enrolled gallery: the packed index, the
+    matcher on top of it (exact or IVF, see make_searcher) and the
+    employee_id -> full name table, built completely before it is published.
+    Readers grab the current snapshot once (g = ats.gallery) and use only
+    that; a refresh builds a new Gallery and swaps the reference.
+    """
+
+    __slots__ = ("index", "names", "version", "built_at", "searcher")
+
+    def __init__(self, index, names=None, backend="exact", **search_opts):
+        if index.matrix.flags.writeable:
+            index.matrix.setflags(write=False)
+        index.sq_norms.setflags(write=False)
+        names = names or {}
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "names", MappingProxyType(
+            {eid: names.get(eid, eid.replace("_", " ")) for eid in index.ids}))
+        object.__setattr__(self, "version", next(_versions))
+        object.__setattr__(self, "built_at", time.time())
+        object.__setattr__(self, "searcher", make_searcher(index, backend, **search_opts))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Gallery snapshots are read-only")
+
+    @classmethod
+    def empty(cls):
+        return cls(GalleryIndex([], []))
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def ids(self):
+        return self.index.ids
+
+    def name(self, eid):
+        eid = str(eid)
+        return self.names.get(eid, eid.replace("_", " "))
+
+    def match(self, probe):
+        return self.searcher.match(probe)
+
+    def same_content(self, other):
+        """True if other holds the same IDs, names and rows (e.g. nothing to re-save)."""
+        a, b = self.index, other.index
+        return (a.ids == b.ids and dict(self.names) == dict(other.names)
+                and np.array_equal(a.counts, b.counts) and np.array_equal(a.matrix, b.matrix))
+
+
+# -------------------- Template consolidation --------------------
+def _sq_dists(x, c, chunk=16384):
+    """Squared distances (len(x), len(c)) via |x|^2 + |c|^2 - 2 x.c, in row chunks."""
+    cc = np.einsum("ij,ij->i", c, c)
+    out = np.empty((len(x), len(c)), dtype=np.result_type(x, c))
+    for i in range(0, len(x), chunk):
+        xs = x[i:i + chunk]
+        d = np.einsum("ij,ij->i", xs, xs)[:, None] + cc[None, :] - 2.0 * (xs @ c.T)
+        out[i:i + chunk] = np.maximum(d, 0.0)
+    return out
+
+
+def _kmeans(x, k, iters=25, seed=0):
+    """Small deterministic k-means (k-means++ init); returns (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    idx = [int(rng.integers(len(x)))]
+    d2 = _sq_dists(x, x[idx])[:, 0]
+    for _ in range(1, k):
+        total = d2.sum()
+        idx.append(int(rng.choice(len(x), p=d2 / total)) if total > 0 else int(rng.integers(len(x))))
+        d2 = np.minimum(d2, _sq_dists(x, x[idx[-1:]])[:, 0])
+    centroids = x[idx].copy()
+
+    labels = np.zeros(len(x), dtype=np.intp)
+    for it in range(iters):
+        new = _sq_dists(x, centroids).argmin(axis=1)
+        if it and np.array_equal(new, labels):
+            break
+        labels = new
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids, labels
+
+
+def _mean_medoids(x, k):
+    """Mean template plus the medoids of k-1 clusters (real photos, not averages)."""
+    templates = [x.mean(axis=0)]
+    if k > 1:
+        _, labels = _kmeans(x, k - 1)
+        for j in np.unique(labels):
+            members = x[labels == j]
+            d = np.linalg.norm(members[:, None, :] - members[None], axis=2).sum(axis=1)
+            templates.append(members[d.argmin()])
+    return np.asarray(templates)
+
+
+def _coverage(x, templates):
+    """Mean distance from each photo to its nearest template (lower = more faithful)."""
+    return float(np.linalg.norm(x[:, None, :] - templates[None], axis=2).min(axis=1).mean())
+
+
+def consolidate(encodings, max_templates=4, method="auto"):
+    """
+    Summarize one employee's (n, 128) encodings into at most max_templates rows.
+
+    method "mean_medoids": the mean template plus medoid exemplars;
+    "kmeans": k centroids; "auto": whichever covers the photos more closely
+    (mean distance of each photo to its nearest template), preferring
+    mean_medoids on a tie. n <= max_templates is returned unchanged.
+    Returns (templates, method_used).
+    """
+    x = np.asarray(encodings, dtype=np.float64)
+    if len(x) <= max_templates:
+        return x, "raw"
+
+    candidates = {}
+    if method in ("auto", "mean_medoids"):
+        candidates["mean_medoids"] = _mean_medoids(x, max_templates)
+    if method in ("auto", "kmeans"):
+        candidates["kmeans"] = _kmeans(x, max_templates)[0]
+    if not candidates:
+        raise ValueError(f"unknown consolidation method {method!r}")
+
+    best = min(candidates, key=lambda m: (round(_coverage(x, candidates[m]), 4), m != "mean_medoids"))
+    return candidates[best], best
+
+
+def consolidate_gallery(encodings, ids, max_templates=4, method="auto"):
+    """
+    Per-employee consolidate() over parallel (encodings, ids) lists.
+    Returns (encodings, ids, {employee_id: method_used}).
+    """
+    groups = {}
+    for enc, eid in zip(encodings, ids):
+        groups.setdefault(str(eid), []).append(enc)
+
+    out_encs, out_ids, methods = [], [], {}
+    for eid, encs in groups.items():
+        templates, used = consolidate(encs, max_templates=max_templates, method=method)
+        out_encs.extend(templates)
+        out_ids.extend([eid] * len(templates))
+        methods[eid] = used
+    return out_encs, out_ids, methods
+
+
+# -------------------- Approximate search --------------------
+class IVFIndex:
+    """
+    Inverted-file index over a GalleryIndex: a k-means coarse quantizer
+    (nlist centroids, trained on up to train_size rows) splits the rows into
+    lists, and a probe only scans the rows of its nprobe nearest lists.
+
+    match() has the GalleryIndex contract, including a runner-up from a
+    different employee: if the probed lists hold only one employee, more
+    lists are scanned (doubling nprobe) until a second one turns up or the
+    whole gallery has been searched.
+    """
+
+    def __init__(self, index, nlist=None, nprobe=16, train_size=20000, seed=0):
+        self.index = index
+        self.nprobe = max(1, int(nprobe))
+        x = np.asarray(index.matrix, dtype=np.float32)
+        n = len(x)
+        self.nlist = max(1, min(n, int(nlist or round(np.sqrt(n)))))
+        if n == 0:
+            self.centroids = np.empty((0, x.shape[1]), dtype=np.float32)
+            self.order = np.empty(0, dtype=np.intp)
+            self.list_starts = np.zeros(1, dtype=np.intp)
+            return
+
+        rng = np.random.default_rng(seed)
+        sample = x if n <= train_size else x[rng.choice(n, train_size, replace=False)]
+        self.centroids, _ = _kmeans(sample, self.nlist, iters=10, seed=seed)
+        assign = _sq_dists(x, self.centroids).argmin(axis=1)
+
+        # rows regrouped by list; list j is matrix/codes[list_starts[j]:list_starts[j + 1]]
+        self.order = np.argsort(assign, kind="stable")
+        self.matrix = np.ascontiguousarray(x[self.order])
+        self.codes = index.codes[self.order]
+        self.list_starts = np.r_[0, np.cumsum(np.bincount(assign, minlength=self.nlist))]
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def ids(self):
+        return self.index.ids
+
+    def _candidates(self, lists):
+        return np.concatenate([np.arange(self.list_starts[j], self.list_starts[j + 1]) for j in lists])
+
+    def match(self, probe):
+        """(best_id, best_distance, second_distance) over the probed lists."""
+        if len(self) == 0:
+            return None, None, None
+        p = np.asarray(probe, dtype=np.float32)
+        near = np.argsort(_sq_dists(p[None, :], self.centroids)[0])
+        nprobe = self.nprobe
+        while True:
+            rows = self._candidates(near[:nprobe])
+            if len(rows):
+                d = np.linalg.norm(self.matrix[rows] - p, axis=1)
+                codes = self.codes[rows]
+                i = int(d.argmin())
+                best_code, best = int(codes[i]), float(d[i])
+                others = d[codes != best_code]
+                if len(others):
+                    return self.ids[best_code], best, float(others.min())
+            if nprobe >= self.nlist:
+                return (self.ids[best_code], best, None) if len(rows) else (None, None, None)
+            nprobe *= 2
+
+
+SEARCH_BACKENDS = ("exact", "ivf")
+
+
+def make_searcher(index, backend="exact", **opts):
+    """Matcher for a GalleryIndex: the index itself ("exact") or an IVFIndex ("ivf", opts passed on)."""
+    if backend == "exact":
+        return index
+    if backend == "ivf":
+        return IVFIndex(index, **opts)
+    raise ValueError(f"unknown search backend {backend!r} (expected one of {SEARCH_BACKENDS})")
+
+
+# -------------------- Gallery file --------------------
+def save_gallery(path, gallery):
+    """
+    Write a Gallery to path atomically: temp file, fsync, os.replace.
+    Readers holding a memmap of the old file keep it.
+    """
+    index, names = gallery.index, gallery.names
+    matrix = np.ascontiguousarray(index.matrix, dtype="<f4")
+    table = json.dumps({
+        "ids": index.ids,
+        "names": [names[i] for i in index.ids],
+        "counts": [int(c) for c in index.counts],
+    }).encode("utf-8")
+    table_off = _HEADER_SIZE + matrix.nbytes
+    header = _HEADER.pack(GALLERY_MAGIC, GALLERY_VERSION, ENCODING_DIM, matrix.shape[0],
+                          len(index.ids), table_off, len(table))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        f.write(matrix.tobytes())
+        f.write(table)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_gallery(path, backend="exact", **search_opts):
+    """
+    Memory-map a gallery file into a Gallery (matcher backend as for Gallery).
+    Raises ValueError on a file that is not a gallery or has the wrong layout.
+    """
+    with open(path, "rb") as f:
+        head = f.read(_HEADER_SIZE)
+        if len(head) < _HEADER.size:
+            raise ValueError(f"{path}: truncated gallery header")
+        magic, version, dim, rows, n_ids, table_off, table_len = _HEADER.unpack_from(head)
+        if magic != GALLERY_MAGIC:
+            raise ValueError(f"{path}: not a gallery file")
+        if version != GALLERY_VERSION or dim != ENCODING_DIM:
+            raise ValueError(f"{path}: unsupported gallery version {version} / dim {dim}")
+        if table_off != _HEADER_SIZE + rows * dim * 4:
+            raise ValueError(f"{path}: corrupt gallery header")
+        f.seek(table_off)
+        raw = f.read(table_len)
+        if len(raw) != table_len:
+            raise ValueError(f"{path}: truncated gallery string table")
+    table = json.loads(raw.decode("utf-8"))
+    if len(table["ids"]) != n_ids:
+        raise ValueError(f"{path}: string table does not match header")
+
+    if rows:
+        matrix = np.memmap(path, dtype="<f4", mode="r", offset=_HEADER_SIZE, shape=(rows, dim))
+    else:
+        matrix = np.empty((0, dim), dtype=np.float32)
+    index = GalleryIndex.from_packed(matrix, table["ids"], table["counts"])
+    return Gallery(index, dict(zip(table["ids"], table["names"])), backend, **search_opts)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Hardware backends for the ATS kiosk.
+
+open_hardware("pi") wraps the real RPi.GPIO module, the RPLCD I2C display and
+Picamera2 (imported lazily, so nothing touches the Pi at import time).
+open_hardware("fake") returns in-memory stand-ins with the same surface:
+
+FakeGPIO      pins, buttons (press/release) and LED output history
+FakeLCD       16x2 text buffer
+ReplayCamera  replays frames from an .npz ("frames" array) or a JPEG/PNG
+              directory, honouring the configured size and pixel format
+
+This lets ats_attendance be imported, profiled and load-tested off-device.
+"""
+
+import os
+import time
+import threading
+
+import cv2
+import numpy as np
+
+BACKENDS = ("pi", "fake")
+
+
+class Hardware:
+    """The three devices the kiosk drives, plus the backend name."""
+
+    def __init__(self, name, gpio, lcd, camera):
+        self.name = name
+        self.gpio = gpio
+        self.lcd = lcd
+        self.camera = camera
+
+
+# -------------------- Fakes --------------------
+class FakeGPIO:
+    """
+    RPi.GPIO look-alike. Inputs idle HIGH (pull-ups, as wired on the kiosk);
+    press(pin) pulls one LOW, optionally for `hold` seconds. Every output()
+    call is kept in `history` as (monotonic_time, pin, value).
+    """
+
+    BCM = "BCM"
+    BOARD = "BOARD"
+    IN = "IN"
+    OUT = "OUT"
+    PUD_UP = "PUD_UP"
+    PUD_DOWN = "PUD_DOWN"
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.mode = None
+        self.modes = {}
+        self.levels = {}
+        self.history = []
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.modes[pin] = direction
+            if direction == self.IN:
+                self.levels[pin] = self.LOW if pull_up_down == self.PUD_DOWN else self.HIGH
+            else:
+                self.levels[pin] = self.LOW if initial is None else initial
+
+    def input(self, pin):
+        with self._lock:
+            return self.levels.get(pin, self.HIGH)
+
+    def output(self, pin, value):
+        with self._lock:
+            self.levels[pin] = value
+            self.history.append((time.monotonic(), pin, value))
+
+    def cleanup(self, *pins):
+        with self._lock:
+            for pin in (pins or list(self.modes)):
+                self.modes.pop(pin, None)
+                self.levels.pop(pin, None)
+
+    # ---- test driving ----
+    def press(self, pin, hold=None):
+        """Pull an input LOW; release automatically after `hold` seconds if given."""
+        with self._lock:
+            self.levels[pin] = self.LOW
+        if hold is not None:
+            t = threading.Timer(hold, self.release, args=(pin,))
+            t.daemon = True
+            t.start()
+
+    def release(self, pin):
+        with self._lock:
+            self.levels[pin] = self.HIGH
+
+
+class FakeLCD:
+    """CharLCD look-alike that keeps the rows currently on screen in `lines`."""
+
+    def __init__(self, cols=16, rows=2):
+        self.cols = cols
+        self.rows = rows
+        self.clear()
+
+    def clear(self):
+        self.lines = [""] * self.rows
+        self._row = 0
+
+    def write_string(self, text):
+        if self._row < self.rows:
+            self.lines[self._row] = (self.lines[self._row] + str(text))[:self.cols]
+
+    def crlf(self):
+        self._row += 1
+
+    def close(self, clear=False):
+        if clear:
+            self.clear()
+
+
+def load_frames(path):
+    """RGB uint8 frames from an .npz ("frames" array) or an image directory (name order)."""
+    if os.path.isdir(path):
+        names = sorted(f for f in os.listdir(path) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        frames = []
+        for name in names:
+            bgr = cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR)
+            if bgr is not None:
+                frames.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+        return frames
+    with np.load(path) as data:
+        return [np.ascontiguousarray(f) for f in data["frames"]]
+
+
+class ReplayCamera:
+    """
+    Picamera2 stand-in. capture_array() paces itself to `fps` and returns the
+    next frame resized to the configured size, in the configured format.
+    After the last frame it holds that frame, or starts over with loop=True.
+    """
+
+    def __init__(self, frames=None, fps=30.0, loop=False):
+        self.fps = fps
+        self.loop = loop
+        self.size = (640, 480)
+        self.format = "XRGB8888"
+        self.started = False
+        self._lock = threading.Lock()
+        self._next_t = 0.0
+        self.load(frames if frames is not None else [np.zeros((480, 640, 3), dtype=np.uint8)])
+
+    def load(self, frames):
+        """Replace the sequence (list of RGB arrays, or a path for load_frames)."""
+        if isinstance(frames, str):
+            frames = load_frames(frames)
+        if not frames:
+            raise ValueError("ReplayCamera needs at least one frame")
+        with self._lock:
+            self.frames = list(frames)
+            self._i = 0
+
+    def create_preview_configuration(self, main=None, **_):
+        return {"main": dict(main or {})}
+
+    def configure(self, config):
+        main = config.get("main", {})
+        self.size = tuple(main.get("size", self.size))
+        self.format = main.get("format", self.format)
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def capture_array(self):
+        with self._lock:
+            now = time.perf_counter()
+            if now < self._next_t:
+                time.sleep(self._next_t - now)
+            self._next_t = max(now, self._next_t) + 1.0 / self.fps
+
+            n = len(self.frames)
+            rgb = self.frames[self._i % n if self.loop else min(self._i, n - 1)]
+            self._i += 1
+
+        if (rgb.shape[1], rgb.shape[0]) != self.size:
+            rgb = cv2.resize(rgb, self.size, interpolation=cv2.INTER_AREA)
+        # Picamera2 naming: BGR888 is [R,G,B] in memory, RGB888 is [B,G,R]
+        if self.format == "BGR888":
+            return rgb.copy()
+        if self.format == "RGB888":
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGRA)   # XRGB8888
+
+
+# -------------------- Backends --------------------
+def _open_pi(lcd_expander, lcd_address, **_):
+    import RPi.GPIO as GPIO
+    from RPLCD.i2c import CharLCD
+    from picamera2 import Picamera2
+    return Hardware("pi", GPIO, CharLCD(lcd_expander, lcd_address), Picamera2())
+
+
+def _open_fake(frames=None, fps=30.0, loop=True, **_):
+    return Hardware("fake", FakeGPIO(), FakeLCD(), ReplayCamera(frames, fps=fps, loop=loop))
+
+
+def open_hardware(backend="pi", lcd_expander="PCF8574", lcd_address=0x27,
+                  frames=None, fps=30.0, loop=True):
+    """
+    Build the GPIO/LCD/camera set for `backend` ("pi" or "fake").
+    frames/fps/loop only apply to the fake camera (frames may be a path).
+    """
+    if backend == "pi":
+        return _open_pi(lcd_expander, lcd_address)
+    if backend == "fake":
+        return _open_fake(frames=frames, fps=fps, loop=loop)
+    raise ValueError(f"unknown hardware backend {backend!r} (expected one of {BACKENDS})")
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only attendance journal for the ATS kiosk.
+
+A punch is one JSON line appended (and fsync'd) to <root>/<date>.jsonl:
+
+    {"v": 1, "row": {"id": ..., "employee_id": ..., "clock_in": ..., ...}}
+
+The record holds the whole attendance row as it stands after the punch, so
+replaying a day is "last record per row id wins". Replay is idempotent: the
+daily CSV is a materialized view (CSV rows overlaid with the journaled
+ones), and compaction writes that view out and then drops the journal. A
+crash between the two only means the same rows are replayed again. A crash
+mid-append leaves a torn last line: replay skips it and the next append
+starts a fresh line after it.
+
+Compactor runs the compaction on a background thread, debounced per day, so
+a burst of punches costs one CSV/PDF rewrite instead of one each.
+
+DayLedger is the resident per-day state the punch path checks against:
+rows keyed by employee_id, loaded once and updated in place, so the
+"already logged" and "open check-in" lookups are dict operations.
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import date
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = ".jsonl"
+
+
+def _fsync_dir(path):
+    """Make a new directory entry durable (best effort, POSIX only)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DayJournal:
+    """One append-only JSON-lines file per attendance date under root."""
+
+    def __init__(self, root, fsync=True):
+        self.root = root
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    def path(self, day: date) -> str:
+        return os.path.join(self.root, day.isoformat() + JOURNAL_SUFFIX)
+
+    def append(self, day: date, row: dict):
+        """Append one row record; durable on return when fsync is on."""
+        line = (json.dumps({"v": JOURNAL_VERSION, "row": row}, separators=(",", ":")) + "\n").encode("utf-8")
+        p = self.path(day)
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            new = not os.path.exists(p)
+            with open(p, "ab+") as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":   # torn record from a crash: keep it off this line
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            if new and self.fsync:
+                _fsync_dir(self.root)
+
+    def replay(self, day: date) -> dict:
+        """
+        {row id: row} for the day, in first-seen order with the last record
+        per id. A torn final line (crash mid-append) is skipped.
+        """
+        rows = {}
+        try:
+            with open(self.path(day), encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return rows
+        for n, line in enumerate(lines, 1):
+            try:
+                rec = json.loads(line)
+                row = rec["row"]
+                rows[row["id"]] = row
+            except (ValueError, KeyError, TypeError):
+                if n < len(lines):
+                    print(f"[JOURNAL] {self.path(day)}:{n}: skipping unreadable record")
+        return rows
+
+    def has(self, day: date) -> bool:
+        return os.path.exists(self.path(day))
+
+    def days(self):
+        """Dates that have a journal, oldest first."""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        out = []
+        for name in names:
+            if name.endswith(JOURNAL_SUFFIX):
+                try:
+                    out.append(date.fromisoformat(name[:-len(JOURNAL_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(out)
+
+    def discard(self, day: date):
+        """Drop the day's journal once its rows are in the compacted CSV."""
+        with self._lock:
+            try:
+                os.remove(self.path(day))
+            except FileNotFoundError:
+                return
+            if self.fsync:
+                _fsync_dir(self.root)
+
+
+class DayLedger:
+    """
+    One day's attendance rows (dicts with string fields, as in the daily
+    CSV) indexed by employee_id and row id. put() adds a row or replaces the
+    row with the same id; every lookup is a dict access, whatever the size
+    of the day.
+    """
+
+    def __init__(self, day: date, rows=()):
+        self.day = day
+        self._by_employee = {}   # employee_id -> [row, ...] in insertion order
+        self._by_id = {}         # row id -> row
+        for row in rows:
+            self.put(row)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def put(self, row: dict):
+        old = self._by_id.get(row["id"])
+        self._by_id[row["id"]] = row
+        rows = self._by_employee.setdefault(str(row["employee_id"]), [])
+        if old is None:
+            rows.append(row)
+        else:
+            rows[next(i for i, r in enumerate(rows) if r is old)] = row
+
+    def rows_for(self, employee_id) -> list:
+        return self._by_employee.get(str(employee_id), [])
+
+    def has(self, employee_id) -> bool:
+        return bool(self._by_employee.get(str(employee_id)))
+
+    def open_row(self, employee_id):
+        """The employee's latest row with a clock_in and no clock_out, or None."""
+        for row in reversed(self.rows_for(employee_id)):
+            if row.get("clock_in") and not row.get("clock_out"):
+                return row
+        return None
+
+
+class Compactor:
+    """
+    Calls fn(key) on a background thread once key has gone `delay` seconds
+    without another schedule(key). flush() runs everything pending now (on
+    the caller's thread); stop() flushes and ends the thread.
+    """
+
+    def __init__(self, fn, delay=60.0, name="ats-compactor"):
+        self._fn = fn
+        self.delay = delay
+        self._name = name
+        self._due = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def schedule(self, key):
+        with self._cond:
+            if self._stopped:
+                return
+            self._due[key] = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return sorted(self._due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if not self._due:
+                        self._cond.wait()
+                        continue
+                    key, due = min(self._due.items(), key=lambda kv: kv[1])
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        del self._due[key]
+                        break
+                    self._cond.wait(wait)
+                else:
+                    return
+            self._call(key)
+
+    def _call(self, key):
+        try:
+            self._fn(key)
+        except Exception as e:
+            print(f"[JOURNAL] Compaction of {key} failed: {e}")
+
+    def flush(self):
+        with self._cond:
+            keys = sorted(self._due)
+            self._due.clear()
+        for key in keys:
+            self._call(key)
+
+    def stop(self, flush=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if flush:
+            self.flush()   # schedule() is a no-op from here on
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Threaded capture -> detect -> encode pipeline for the ATS kiosk.
+
+Each stage runs on its own thread and hands work forward through a small
+drop-oldest buffer, so the camera keeps capturing while dlib is busy and
+the detector always works on the newest frame instead of a stale backlog.
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class LatestFrameBuffer:
+    """
+    Bounded ring buffer that drops the oldest item when full.
+    get_latest() hands back the newest item and discards anything older.
+    """
+
+    def __init__(self, maxlen=2):
+        self._items = deque(maxlen=max(1, int(maxlen)))
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get_latest(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            item = self._items.pop()
+            self.dropped += len(self._items)
+            self._items.clear()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Rolling per-stage latency samples (seconds), summarized in ms."""
+
+    def __init__(self, maxlen=500):
+        self._maxlen = maxlen
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            buf = self._samples.get(stage)
+            if buf is None:
+                buf = self._samples[stage] = deque(maxlen=self._maxlen)
+            buf.append(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def samples(self, stage):
+        with self._lock:
+            return list(self._samples.get(stage, ()))
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms, max_ms}}"""
+        with self._lock:
+            snap = {k: np.asarray(v, dtype=np.float64) * 1e3 for k, v in self._samples.items() if v}
+        return {
+            stage: {
+                "count": int(ms.size),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+            for stage, ms in snap.items()
+        }
+
+
+class RecognitionPipeline:
+    """
+    capture() -> frame
+    detect(frame) -> face locations
+    encode(frame, locations) -> encodings
+
+    Results come out of get_result() as (frame, locations, encodings). The
+    end-to-end capture-to-result time is recorded under the "pipeline" stage.
+    """
+
+    def __init__(self, capture, detect, encode, stats=None, buffer_size=2):
+        self._capture = capture
+        self._detect = detect
+        self._encode = encode
+        self.stats = stats or StageStats()
+        self._frames = LatestFrameBuffer(buffer_size)
+        self._detections = LatestFrameBuffer(buffer_size)
+        self._results = queue.Queue()
+        self._running = threading.Event()
+        self._threads = []
+        self.errors = []
+
+    def start(self):
+        self._running.set()
+        for name, target in (("capture", self._capture_loop),
+                             ("detect", self._detect_loop),
+                             ("encode", self._encode_loop)):
+            t = threading.Thread(target=target, name=f"ats-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, join_timeout=2.0):
+        self._running.clear()
+        self._frames.close()
+        self._detections.close()
+        for t in self._threads:
+            t.join(join_timeout)
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def dropped_frames(self):
+        return self._frames.dropped + self._detections.dropped
+
+    def get_result(self, timeout=None):
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # ---- workers ----
+    def _guard(self, stage, fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            self.errors.append((stage, e))
+            print(f"[PIPELINE] {stage} failed: {e}")
+            time.sleep(0.05)
+            return None
+
+    def _capture_loop(self):
+        while self._running.is_set():
+            frame = self._guard("capture", self._capture)
+            if frame is not None:
+                self._frames.put((frame, time.perf_counter()))
+
+    def _detect_loop(self):
+        while self._running.is_set():
+            item = self._frames.get_latest(timeout=0.1)
+            if item is None:
+                continue
+            frame, t_cap = item
+            locs = self._guard("detect", self._detect, frame)
+            if locs is not None:
+                self._detections.put((frame, locs, t_cap))
+
+    def _encode_loop(self):
+        while self._running.is_set():
+            item = self._detections.get_latest(timeout=0.1)
+            if item is None:
+                continue
+            frame, locs, t_cap = item
+            encs = self._guard("encode", self._encode, frame, locs) if locs else []
+            if encs is None:
+                continue
+            self.stats.record("pipeline", time.perf_counter() - t_cap)
+            self._results.put((frame, locs, encs))
+
+
+class EncodingCache:
+    """
+    Timestamped face encodings from recent frames (newest last), used by the
+    idle pre-roll so a button press can start from votes already collected.
+    """
+
+    def __init__(self, maxlen=64):
+        self._frames = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, encodings, ts=None):
+        with self._lock:
+            self._frames.append((time.monotonic() if ts is None else ts, list(encodings)))
+
+    def recent(self, max_age, now=None):
+        """Encodings lists from frames newer than max_age seconds, oldest first."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return [encs for ts, encs in self._frames if now - ts <= max_age]
+
+    def age(self, now=None):
+        """Seconds since the newest cached frame (inf when empty)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return now - self._frames[-1][0] if self._frames else float("inf")
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._frames)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Typed attendance frame for the ATS kiosk.
+
+The daily CSV (and the attendance store) keep every field as text, e.g.
+clock_in "08:30:00 AM" and is_late "TRUE". typed_frame() converts a whole
+frame of such rows in bulk, one vectorized parse per column:
+
+  attendance_date             datetime64[ns]
+  clock_in, clock_out         int32 seconds since midnight, NO_TIME if empty
+  total_hours, total_minutes  float32 (NaN if empty)
+  is_late, is_absent,
+  time_corrected              boolean (nullable; <NA> if empty, as in legacy rows)
+  employee_id, full_name,
+  method, time_quality,
+  boot_id                     category
+  mono_in_ns, mono_out_ns     int64, NO_TIME if empty
+  everything else             str
+
+Clock strings are parsed with the 12-hour format first and the legacy
+24-hour one only for the rows that failed. legacy_frame() goes back to the
+text form, for CSV/PDF exports; empty fields stay empty both ways.
+"""
+
+import numpy as np
+import pandas as pd
+
+# 12-hour display format with AM/PM
+TIME_FMT_12 = "%I:%M:%S %p"
+# legacy support: old rows may be HH:MM:SS 24h
+TIME_FMT_24 = "%H:%M:%S"
+NO_TIME = -1                   # clock_in/clock_out (and mono_*_ns) when empty
+
+# Column layout of the daily CSV, the store and the archive
+DAILY_COLUMNS = [
+    "id", "employee_id", "full_name", "attendance_date",
+    "clock_in", "clock_out", "total_hours", "total_minutes", "duration",
+    "is_late", "is_absent", "method", "created_at", "updated_at",
+    "time_quality", "mono_in_ns", "mono_out_ns", "boot_id", "time_corrected"
+]
+TIME_COLUMNS = ("clock_in", "clock_out")
+BOOL_COLUMNS = ("is_late", "is_absent", "time_corrected")
+FLOAT_COLUMNS = ("total_hours", "total_minutes")
+NS_COLUMNS = ("mono_in_ns", "mono_out_ns")
+CATEGORY_COLUMNS = ("employee_id", "full_name", "method", "time_quality", "boot_id")
+
+
+# -------------------- Parsing --------------------
+def clock_seconds(s: pd.Series) -> pd.Series:
+    """12-hour (or legacy 24-hour) clock strings -> int32 seconds since midnight."""
+    s = s.fillna("").astype(str).str.strip()
+    t = pd.to_datetime(s, format=TIME_FMT_12, errors="coerce")
+    retry = t.isna() & (s != "")
+    if retry.any():
+        t = t.where(~retry, pd.to_datetime(s.where(retry, ""), format=TIME_FMT_24, errors="coerce"))
+    secs = t.dt.hour * 3600 + t.dt.minute * 60 + t.dt.second
+    return secs.fillna(NO_TIME).astype(np.int32)
+
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Daily-CSV style string frame -> typed frame (DAILY_COLUMNS)."""
+    df = df.reindex(columns=DAILY_COLUMNS)
+    out = {}
+    for c in DAILY_COLUMNS:
+        s = df[c].fillna("").astype(str)
+        if c == "attendance_date":
+            out[c] = pd.to_datetime(s, format="%Y-%m-%d", errors="coerce").astype("datetime64[ns]")
+        elif c in TIME_COLUMNS:
+            out[c] = clock_seconds(s)
+        elif c in BOOL_COLUMNS:
+            flag = s.str.strip().str.upper()
+            out[c] = flag.eq("TRUE").astype("boolean").mask(flag == "")
+        elif c in FLOAT_COLUMNS:
+            out[c] = pd.to_numeric(s, errors="coerce").astype(np.float32)
+        elif c in NS_COLUMNS:
+            out[c] = pd.to_numeric(s.where(s != "", str(NO_TIME)), errors="coerce").fillna(NO_TIME).astype(np.int64)
+        elif c in CATEGORY_COLUMNS:
+            out[c] = s.astype("category")
+        else:
+            out[c] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def empty_typed() -> pd.DataFrame:
+    return typed_frame(pd.DataFrame(columns=DAILY_COLUMNS))
+
+
+# -------------------- Formatting (exports) --------------------
+def clock_strings(secs: pd.Series) -> pd.Series:
+    """int32 seconds since midnight -> "hh:MM:SS AM/PM" ("" for NO_TIME)."""
+    v = secs.to_numpy(dtype=np.int64)
+    h, m, s = v // 3600, (v // 60) % 60, v % 60
+    h12 = np.where(h % 12 == 0, 12, h % 12)
+    out = (pd.Series(h12, index=secs.index).astype(str).str.zfill(2) + ":"
+           + pd.Series(m, index=secs.index).astype(str).str.zfill(2) + ":"
+           + pd.Series(s, index=secs.index).astype(str).str.zfill(2) + " "
+           + pd.Series(np.where(h < 12, "AM", "PM"), index=secs.index))
+    return out.where(v >= 0, "")
+
+
+def hours_strings(values: pd.Series) -> pd.Series:
+    """Numbers -> "%.2f" strings ("" for NaN)."""
+    v = values.to_numpy(dtype=np.float64)
+    return pd.Series(np.char.mod("%.2f", np.nan_to_num(v)), index=values.index).where(~np.isnan(v), "")
+
+
+def duration_strings(secs: pd.Series) -> pd.Series:
+    """Seconds (under a day) -> "H:MM:SS", as str(timedelta) writes them."""
+    v = np.rint(secs.to_numpy(dtype=np.float64)).astype(np.int64)
+    return (pd.Series(v // 3600, index=secs.index).astype(str) + ":"
+            + pd.Series((v // 60) % 60, index=secs.index).astype(str).str.zfill(2) + ":"
+            + pd.Series(v % 60, index=secs.index).astype(str).str.zfill(2))
+
+
+def legacy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Typed frame -> the daily CSV's string form (for exports)."""
+    out = {}
+    for c in df.columns:
+        s = df[c]
+        if c == "attendance_date":
+            out[c] = s.dt.strftime("%Y-%m-%d").fillna("")
+        elif c in TIME_COLUMNS:
+            out[c] = clock_strings(s)
+        elif c in BOOL_COLUMNS:
+            s = s.astype("boolean")
+            flags = np.where(s.fillna(False).to_numpy(dtype=bool), "TRUE", "FALSE")
+            out[c] = pd.Series(flags, index=s.index).where(s.notna(), "")
+        elif c in FLOAT_COLUMNS:
+            out[c] = hours_strings(s)
+        elif c in NS_COLUMNS:
+            out[c] = s.astype(str).where(s != NO_TIME, "")
+        else:
+            out[c] = s.astype(object).fillna("").astype(str)
+    return pd.DataFrame(out, index=df.index)
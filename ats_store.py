@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite attendance store for the ATS kiosk.
+
+One table of attendance rows with the daily CSV's columns (all TEXT, as in
+the CSVs), primary key id, indexed on (attendance_date, employee_id), in
+WAL mode so report queries do not block punches. A day, a week or a month
+is one indexed range query; the daily CSVs become exports written from it.
+
+import_csv_history() loads attendance/<date>.csv files into the store,
+each non-empty file replacing its day. The csv_files table remembers each file's (mtime,
+size) as last imported or exported, so later runs only pick up CSVs that
+changed outside the store, e.g. days written while the kiosk ran on the
+csv backend. Exports the store writes itself are recorded with
+mark_csv() and are not read back.
+
+Usage (from the repo root), to (re)import by hand:
+    python ats_store.py --base-dir /home/pi/.../ATS_PROJECT [--force]
+"""
+
+import os
+import re
+import csv
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import date
+
+STORE_SCHEMA_VERSION = 1
+_CSV_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})\.csv$")
+
+
+class AttendanceStore:
+    """
+    Attendance rows in SQLite. columns is the row layout (DAILY_HEADERS);
+    columns missing from an older database are added on open. Each thread
+    gets its own connection; callers serialize writers (ats_attendance holds
+    its day lock around every read-modify-write).
+    """
+
+    def __init__(self, path, columns, synchronous="FULL"):
+        if "id" not in columns or "attendance_date" not in columns or "employee_id" not in columns:
+            raise ValueError("columns must include id, attendance_date and employee_id")
+        self.path = path
+        self.columns = list(columns)
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self._init_schema()
+
+    # ---- connections
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._conn()
+        cols = ", ".join(f'"{c}" TEXT NOT NULL DEFAULT \'\'' + (" PRIMARY KEY" if c == "id" else "")
+                         for c in self.columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS attendance ({cols})")
+        have = {r["name"] for r in conn.execute("PRAGMA table_info(attendance)")}
+        for c in self.columns:
+            if c not in have:
+                conn.execute(f'ALTER TABLE attendance ADD COLUMN "{c}" TEXT NOT NULL DEFAULT \'\'')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date_employee "
+                     "ON attendance (attendance_date, employee_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_unsane "
+                     "ON attendance (boot_id) WHERE time_quality = 'UNSANE'")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS csv_files "
+                     "(name TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(STORE_SCHEMA_VERSION),))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- meta
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        self._conn().execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    # ---- daily CSV bookkeeping
+    def csv_state(self, name):
+        """(mtime_ns, size) of name as last imported/exported, or None."""
+        row = self._conn().execute("SELECT mtime_ns, size FROM csv_files WHERE name = ?", (name,)).fetchone()
+        return (row["mtime_ns"], row["size"]) if row else None
+
+    def mark_csv(self, path):
+        """Record path's current (mtime, size): its content is in the store."""
+        st = os.stat(path)
+        self._conn().execute("INSERT OR REPLACE INTO csv_files VALUES (?, ?, ?)",
+                             (os.path.basename(path), st.st_mtime_ns, st.st_size))
+
+    # ---- rows
+    def _select(self, where, args):
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        cur = self._conn().execute(
+            f"SELECT {cols} FROM attendance WHERE {where} ORDER BY attendance_date, rowid", args)
+        return [dict(zip(self.columns, r)) for r in cur]
+
+    def _values(self, row):
+        return tuple("" if row.get(c) is None else str(row.get(c)) for c in self.columns)
+
+    def day_rows(self, day: date) -> list:
+        return self._select("attendance_date = ?", (day.isoformat(),))
+
+    def range_rows(self, start: date, end: date) -> list:
+        """Rows with start <= attendance_date < end."""
+        return self._select("attendance_date >= ? AND attendance_date < ?", (start.isoformat(), end.isoformat()))
+
+    def unsane_rows(self, boot_id) -> list:
+        """Rows stamped while the clock was not sane, during boot boot_id."""
+        return self._select("time_quality = 'UNSANE' AND boot_id = ?", (boot_id,))
+
+    def upsert(self, rows):
+        """
+        Insert rows, updating any with the same id in place (a row keeps its
+        position in the day), in one transaction.
+        """
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        marks = ", ".join("?" for _ in self.columns)
+        sets = ", ".join(f'"{c}" = excluded."{c}"' for c in self.columns if c != "id")
+        conn = self._conn()
+        with _transaction(conn):
+            conn.executemany(f"INSERT INTO attendance ({cols}) VALUES ({marks}) "
+                             f"ON CONFLICT(id) DO UPDATE SET {sets}",
+                             [self._values(r) for r in rows])
+
+    def replace_day(self, day: date, rows):
+        """Make rows the whole content of day (one transaction)."""
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        marks = ", ".join("?" for _ in self.columns)
+        conn = self._conn()
+        with _transaction(conn):
+            conn.execute("DELETE FROM attendance WHERE attendance_date = ?", (day.isoformat(),))
+            conn.executemany(f"INSERT OR REPLACE INTO attendance ({cols}) VALUES ({marks})",
+                             [self._values(r) for r in rows])
+
+    def first_date(self):
+        """Earliest attendance_date in the store, or None when empty."""
+        row = self._conn().execute("SELECT MIN(attendance_date) FROM attendance WHERE attendance_date != ''").fetchone()
+        return date.fromisoformat(row[0]) if row[0] else None
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+
+class _transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _read_csv_rows(path, day):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [dict(r) for r in csv.DictReader(f)]
+    for n, row in enumerate(rows, 1):
+        row["attendance_date"] = row.get("attendance_date") or day
+        if not row.get("id"):
+            row["id"] = f"{row.get('employee_id', '')}-{row['attendance_date']}-{n}"
+    return rows
+
+
+def import_csv_history(store, attend_dir, force=False):
+    """
+    Load every attendance/<date>.csv that is new or changed since it was
+    last imported or exported (all of them with force): its rows become
+    the whole day, so rows deleted or renumbered in the CSV leave the
+    store too. Header-only files (_ensure_daily_file) import nothing.
+    Returns the number of rows imported. Rows without an id get
+    <employee_id>-<date>-<n>, as the kiosk would have made them.
+    """
+    names = sorted(n for n in os.listdir(attend_dir) if _CSV_NAME.match(n)) if os.path.isdir(attend_dir) else []
+    imported_at = store.get_meta("csv_imported_at")
+    total, files = 0, 0
+    for name in names:
+        path = os.path.join(attend_dir, name)
+        try:
+            st = os.stat(path)
+            if not force and store.csv_state(name) == (st.st_mtime_ns, st.st_size):
+                continue
+            day = _CSV_NAME.match(name).group(1)
+            rows = _read_csv_rows(path, day)
+        except Exception as e:
+            print(f"[STORE] Skipping unreadable {path}: {e}")
+            continue
+        if rows:
+            store.replace_day(date.fromisoformat(day), rows)
+            total += len(rows)
+        store.mark_csv(path)
+        files += 1
+    if files or not imported_at:
+        store.set_meta("csv_imported_at", time.strftime("%Y-%m-%dT%H:%M:%S"))
+        print(f"[STORE] Imported {total} rows from {files} daily CSVs into {store.path}")
+    return total
+
+
+def main():
+    ap = argparse.ArgumentParser(description="import attendance/*.csv into the SQLite attendance store")
+    ap.add_argument("--base-dir", required=True, help="ATS_BASE_DIR (attendance/*.csv read, attendance.db written)")
+    ap.add_argument("--force", action="store_true",
+                    help="import every CSV, changed or not (each non-empty CSV replaces its day in the store)")
+    args = ap.parse_args()
+    os.environ["ATS_BASE_DIR"] = args.base_dir
+    import ats_attendance as ats
+    import_csv_history(AttendanceStore(ats.ATTENDANCE_DB, ats.DAILY_HEADERS), ats.ATTEND_DIR, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
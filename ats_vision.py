@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Frame-level helpers that sit in front of the dlib face detector.
+
+MotionGate does frame differencing on a small grayscale copy and, once a
+face has been found, limits detection to a padded region around it, so the
+full-frame HOG pass only runs when something actually changed.
+
+FaceTracker follows a confirmed face box from frame to frame and falls back
+to the detector when tracking confidence drops, something else moves in
+the frame, or the redetect interval is up.
+
+face_quality scores a detected face (sharpness, size, yaw, exposure) so the
+expensive descriptor is only computed for crops that can actually match.
+"""
+
+import cv2
+import numpy as np
+
+MIN_DETECT_CROP = 96   # px; HOG (upsample=1) needs room around a ~40px face
+
+
+def _clip_box(top, right, bottom, left, shape):
+    h, w = shape[:2]
+    return max(0, int(top)), min(w, int(right)), min(h, int(bottom)), max(0, int(left))
+
+
+def _pad_box(box, padding, shape, min_size=MIN_DETECT_CROP):
+    t, r, b, l = box
+    ph = max((b - t) * padding, (min_size - (b - t)) / 2.0, 0)
+    pw = max((r - l) * padding, (min_size - (r - l)) / 2.0, 0)
+    return _clip_box(t - ph, r + pw, b + ph, l - pw, shape)
+
+
+def detect_in_region(rgb, box, detect):
+    """Run detect() on a crop of rgb and map the boxes back to frame coordinates."""
+    t, r, b, l = box
+    crop = np.ascontiguousarray(rgb[t:b, l:r])
+    return [(ct + t, cr + l, cb + t, cl + l) for (ct, cr, cb, cl) in detect(crop)]
+
+
+class MotionGate:
+    """
+    locate(rgb, detect) returns face locations for the frame, calling
+    detect(image) only when needed:
+
+    - no motion since the last frame: reuse the last known locations
+      (including "no face") without touching the detector;
+    - motion and a known face: detect inside the padded face ROI first;
+    - motion and no known face: detect inside the changed region;
+    - every `full_every` gated frames: one full-frame detect as a safety net.
+
+    Frames answered without locate() (e.g. by FaceTracker) must be passed to
+    observe(), so motion is always measured against the previous frame.
+
+    stats counts frames, full/ROI detector calls and calls saved since reset().
+    """
+
+    def __init__(self, downscale=4, pixel_delta=25, min_fraction=0.01,
+                 roi_padding=0.5, full_every=5):
+        self.downscale = max(1, int(downscale))
+        self.pixel_delta = pixel_delta
+        self.min_fraction = min_fraction
+        self.roi_padding = roi_padding
+        self.full_every = max(1, int(full_every))
+        self.reset()
+
+    def reset(self):
+        self._prev = None
+        self._last_locs = []
+        self._since_full = 0
+        self.stats = {"frames": 0, "full_calls": 0, "roi_calls": 0, "saved": 0}
+
+    def _small_gray(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        return cv2.resize(gray, None, fx=1.0 / self.downscale, fy=1.0 / self.downscale,
+                          interpolation=cv2.INTER_AREA)
+
+    def observe(self, rgb, locs=None):
+        """Take a frame handled elsewhere as the new motion reference (and locs as the last known faces)."""
+        self._prev = self._small_gray(rgb)
+        if locs is not None:
+            self._last_locs = list(locs)
+
+    def _motion_box(self, rgb):
+        """Changed-region box in frame coordinates, None if nothing moved."""
+        small = self._small_gray(rgb)
+        prev, self._prev = self._prev, small
+        if prev is None or prev.shape != small.shape:
+            return (0, rgb.shape[1], rgb.shape[0], 0)
+
+        mask = cv2.absdiff(small, prev) > self.pixel_delta
+        if mask.mean() < self.min_fraction:
+            return None
+        ys, xs = np.nonzero(mask)
+        s = self.downscale
+        return (int(ys.min()) * s, (int(xs.max()) + 1) * s, (int(ys.max()) + 1) * s, int(xs.min()) * s)
+
+    def _full(self, rgb, detect):
+        self.stats["full_calls"] += 1
+        self._since_full = 0
+        return detect(rgb)
+
+    def locate(self, rgb, detect):
+        self.stats["frames"] += 1
+        moved = self._motion_box(rgb)
+        self._since_full += 1
+
+        if self._since_full >= self.full_every:
+            locs = self._full(rgb, detect)
+        elif moved is None:
+            self.stats["saved"] += 1
+            return list(self._last_locs)
+        elif self._last_locs:
+            self.stats["roi_calls"] += 1
+            t = min(l[0] for l in self._last_locs)
+            r = max(l[1] for l in self._last_locs)
+            b = max(l[2] for l in self._last_locs)
+            lf = min(l[3] for l in self._last_locs)
+            roi = _pad_box((t, r, b, lf), self.roi_padding, rgb.shape)
+            locs = detect_in_region(rgb, roi, detect)
+            if not locs:   # face left the ROI; look everywhere once
+                locs = self._full(rgb, detect)
+        else:
+            region = _pad_box(moved, 0.25, rgb.shape)
+            h, w = rgb.shape[:2]
+            if (region[2] - region[0]) * (region[1] - region[3]) >= 0.6 * h * w:
+                locs = self._full(rgb, detect)
+            else:
+                self.stats["roi_calls"] += 1
+                locs = detect_in_region(rgb, region, detect)
+
+        self._last_locs = list(locs)
+        return locs
+
+    @property
+    def saved_calls(self):
+        return self.stats["saved"]
+
+
+def _make_cv2_tracker(backend):
+    """KCF/MOSSE from opencv-contrib (legacy or main namespace), None if missing."""
+    name = {"kcf": "TrackerKCF_create", "mosse": "TrackerMOSSE_create"}.get(backend)
+    if name is None:
+        return None
+    for ns in (getattr(cv2, "legacy", None), cv2):
+        factory = getattr(ns, name, None) if ns is not None else None
+        if factory is not None:
+            return factory()
+    return None
+
+
+class FaceTracker:
+    """
+    locate(rgb, detect) follows a single confirmed face between detections.
+
+    After a detection with exactly one face, the box is tracked either by a
+    normalized template search inside a padded ROI ("template") or by an
+    OpenCV KCF/MOSSE tracker ("kcf"/"mosse", template fallback if the
+    contrib module is missing). Confidence is the normalized correlation of
+    the tracked box against the face captured at detection time.
+
+    Tracking never runs the detector, so it cannot see a second face walk
+    in. detect() therefore runs again when confidence drops below
+    min_confidence, after redetect_every tracked frames (keep it below the
+    frames a decision needs, so every decision includes a detector frame),
+    and whenever more than min_fraction of a downscaled frame difference
+    lies outside the search window around the face: anything entering the
+    view moves there first.
+    """
+
+    def __init__(self, backend="template", min_confidence=0.6, search_padding=0.5,
+                 redetect_every=1, downscale=4, pixel_delta=25, min_fraction=0.01):
+        self.backend = backend
+        self.min_confidence = min_confidence
+        self.search_padding = search_padding
+        self.redetect_every = max(1, int(redetect_every))
+        self.downscale = max(1, int(downscale))
+        self.pixel_delta = pixel_delta
+        self.min_fraction = min_fraction
+        self.reset()
+
+    def reset(self):
+        self._box = None
+        self._template = None
+        self._cv2_tracker = None
+        self._prev = None
+        self._age = 0
+        self.last_confidence = None
+        self.stats = {"frames": 0, "tracked": 0, "detections": 0, "lost": 0, "intrusions": 0}
+
+    def _start(self, gray, box):
+        t, r, b, l = box
+        if b - t < 8 or r - l < 8:
+            self._box = None
+            return
+        self._box = box
+        self._age = 0
+        self._template = gray[t:b, l:r].copy()
+        self._cv2_tracker = _make_cv2_tracker(self.backend)
+        if self._cv2_tracker is not None:
+            self._cv2_tracker.init(gray, (l, t, r - l, b - t))
+
+    def _score(self, gray, top, left):
+        """Correlation of the template placed at (top, left), over the part inside the frame."""
+        h, w = self._template.shape
+        t0, l0 = max(top, 0), max(left, 0)
+        t1, l1 = min(top + h, gray.shape[0]), min(left + w, gray.shape[1])
+        if t1 - t0 < 8 or l1 - l0 < 8:
+            return 0.0
+        patch = gray[t0:t1, l0:l1]
+        template = self._template[t0 - top:t1 - top, l0 - left:l1 - left]
+        return float(cv2.matchTemplate(patch, template, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+    def _track(self, gray):
+        h, w = self._template.shape
+        if self._cv2_tracker is not None:
+            ok, (x, y, bw, bh) = self._cv2_tracker.update(gray)
+            if not ok:
+                return None, 0.0
+            box = _clip_box(y, x + bw, y + bh, x, gray.shape)
+            # Template-sized patch on the tracker's centre (its box may be resized or clipped)
+            top, left = int(round(y + (bh - h) / 2.0)), int(round(x + (bw - w) / 2.0))
+            return box, self._score(gray, top, left)
+
+        st, sr, sb, sl = _pad_box(self._box, self.search_padding, gray.shape, min_size=0)
+        window = gray[st:sb, sl:sr]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None, 0.0
+        res = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, conf, _, (x, y) = cv2.minMaxLoc(res)
+        return (st + y, sl + x + w, st + y + h, sl + x), float(conf)
+
+    def _small_gray(self, gray):
+        return cv2.resize(gray, None, fx=1.0 / self.downscale, fy=1.0 / self.downscale,
+                          interpolation=cv2.INTER_AREA)
+
+    def _intrusion(self, shape, small, prev):
+        """True when the frame changed outside the search window around the tracked face."""
+        if prev is None or prev.shape != small.shape:
+            return True
+        mask = cv2.absdiff(small, prev) > self.pixel_delta
+        st, sr, sb, sl = _pad_box(self._box, self.search_padding, shape, min_size=0)
+        s = self.downscale
+        mask[st // s:(sb + s - 1) // s, sl // s:(sr + s - 1) // s] = False
+        return mask.mean() >= self.min_fraction
+
+    def locate(self, rgb, detect, on_tracked=None):
+        """on_tracked(rgb, locs), if given, is called for frames answered by tracking."""
+        self.stats["frames"] += 1
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        small = self._small_gray(gray)
+        prev, self._prev = self._prev, small
+
+        if self._box is not None and self._age < self.redetect_every:
+            if self._intrusion(gray.shape, small, prev):
+                self.stats["intrusions"] += 1
+            else:
+                box, conf = self._track(gray)
+                self.last_confidence = conf
+                if box is not None and conf >= self.min_confidence:
+                    self._box = box
+                    self._age += 1
+                    self.stats["tracked"] += 1
+                    if on_tracked is not None:
+                        on_tracked(rgb, [box])
+                    return [box]
+                self.stats["lost"] += 1
+
+        self.stats["detections"] += 1
+        locs = detect(rgb)
+        if len(locs) == 1:
+            self._start(gray, tuple(int(v) for v in locs[0]))
+        else:
+            self._box = None
+        return locs
+
+
+def face_quality(gray, loc, points5, blur_ref=120.0, size_ref=80, max_yaw=0.35):
+    """
+    Score one face crop in [0, 1]; returns a dict with the combined "score"
+    and its parts:
+
+    sharpness  Laplacian variance of the crop relative to blur_ref
+    size       shorter box side in px relative to size_ref
+    yaw        nose-tip offset from the eye midpoint, as a fraction of the
+               inter-ocular distance (dlib 5-point: 0-1 one eye, 2-3 the
+               other, 4 nose); 0 = frontal, max_yaw or more = 0
+    exposure   penalizes very dark or blown-out crops
+
+    The score is the product of the parts, so one bad factor sinks it.
+    """
+    t, r, b, l = _clip_box(*loc, gray.shape)
+    crop = gray[t:b, l:r]
+    if crop.size == 0:
+        return {"score": 0.0, "sharpness": 0.0, "size": 0.0, "yaw": 0.0, "exposure": 0.0}
+
+    sharpness = min(1.0, float(cv2.Laplacian(crop, cv2.CV_64F).var()) / blur_ref)
+    size = min(1.0, min(b - t, r - l) / float(size_ref))
+
+    pts = np.asarray(points5, dtype=np.float64)
+    yaw = 0.0
+    if pts.shape == (5, 2):
+        eye_a = pts[0:2].mean(axis=0)
+        eye_b = pts[2:4].mean(axis=0)
+        inter = float(np.linalg.norm(eye_a - eye_b))
+        if inter > 1e-6:
+            offset = abs(float(pts[4, 0] - (eye_a[0] + eye_b[0]) / 2.0)) / inter
+            yaw = max(0.0, 1.0 - offset / max_yaw)
+    else:
+        yaw = 1.0
+
+    mean = float(crop.mean())
+    exposure = max(0.0, min(1.0, mean / 60.0, (255.0 - mean) / 60.0))
+
+    return {
+        "score": sharpness * size * yaw * exposure,
+        "sharpness": sharpness,
+        "size": size,
+        "yaw": yaw,
+        "exposure": exposure,
+    }
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Exact vs IVF gallery search: recall against exact search and latency per probe.
+
+For each gallery size, probes are noisy copies of enrolled encodings
+(genuine) plus encodings of people who are not enrolled (impostor). Recall
+compares IVFIndex.match with the exact GalleryIndex.match:
+
+  genuine   same best employee, genuine probes only
+  top2      same best employee and best/runner-up distances (1e-4), all probes
+  decision  same per-frame outcome as exact search: accepted employee, or
+            no accept, under --tolerance / --margin (what the kiosk votes on)
+
+Usage (from the repo root):
+    python benchmarks/bench_ann_index.py [--sizes 1000 10000 100000] [--nprobe 8 16 32]
+        [--per-id 4] [--probes 200] [--out ann.json]
+
+Encodings are synthetic (clustered around per-employee centres), so no
+camera or dlib is needed.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_gallery import GalleryIndex, IVFIndex  # noqa: E402
+
+
+def _synthetic_gallery(n, per_id, rng):
+    """Per-employee centres around a shared mean, at roughly dlib-like distances."""
+    n_ids = max(1, n // per_id)
+    mean = rng.normal(size=128)
+    mean /= np.linalg.norm(mean)
+    centers = mean + rng.normal(scale=0.55 / np.sqrt(128), size=(n_ids, 128))
+    codes = np.arange(n) % n_ids
+    encs = centers[codes] + rng.normal(scale=0.25 / np.sqrt(128), size=(n, 128))
+    ids = [f"Employee_{k:06d}" for k in codes]
+    return encs.astype(np.float32), ids, mean
+
+
+def _probes(encs, mean, count, rng):
+    half = count // 2
+    genuine = encs[rng.integers(0, len(encs), half)] + rng.normal(scale=0.2 / np.sqrt(128), size=(half, 128))
+    impostor = mean + rng.normal(scale=0.55 / np.sqrt(128), size=(count - half, 128))
+    return np.vstack([genuine, impostor]).astype(np.float32)
+
+
+def _time_all(fn, probes):
+    t0 = time.perf_counter()
+    out = [fn(p) for p in probes]
+    return out, (time.perf_counter() - t0) / len(probes) * 1e3
+
+
+def _decision(match, tolerance, margin):
+    eid, best, second = match
+    if best is None or best > tolerance or (second is not None and second - best < margin):
+        return None
+    return eid
+
+
+def _recall(exact, approx, n_genuine, tolerance, margin):
+    genuine = top2 = decision = 0
+    for i, (e, a) in enumerate(zip(exact, approx)):
+        if i < n_genuine:
+            genuine += a[0] == e[0]
+        second_ok = (e[2] is None and a[2] is None) or (
+            e[2] is not None and a[2] is not None and abs(a[2] - e[2]) < 1e-4)
+        top2 += a[0] == e[0] and abs(a[1] - e[1]) < 1e-4 and second_ok
+        decision += _decision(a, tolerance, margin) == _decision(e, tolerance, margin)
+    n = len(exact)
+    return round(genuine / max(1, n_genuine), 4), round(top2 / n, 4), round(decision / n, 4)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 3000, 10000, 30000, 100000])
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    ap.add_argument("--per-id", type=int, default=4, help="templates per employee (consolidated gallery)")
+    ap.add_argument("--probes", type=int, default=200, help="half genuine, half impostor")
+    ap.add_argument("--tolerance", type=float, default=0.41)
+    ap.add_argument("--margin", type=float, default=0.05)
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    print(f"{'encodings':>10} {'ids':>7} {'backend':>10} {'build s':>8} {'ms/probe':>9} "
+          f"{'genuine':>8} {'top2':>6} {'decision':>9}")
+    for n in args.sizes:
+        encs, ids, mean = _synthetic_gallery(n, args.per_id, rng)
+        index = GalleryIndex(encs, ids)
+        probes = _probes(encs, mean, args.probes, rng)
+
+        exact, exact_ms = _time_all(index.match, probes)
+        row = {"encodings": n, "ids": index.num_ids, "exact_ms": round(exact_ms, 4), "ivf": []}
+        print(f"{n:>10} {index.num_ids:>7} {'exact':>10} {'-':>8} {exact_ms:>9.3f}")
+
+        t0 = time.perf_counter()
+        ivf = IVFIndex(index, nprobe=args.nprobe[0])
+        build_s = time.perf_counter() - t0
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            approx, ivf_ms = _time_all(ivf.match, probes)
+            genuine, top2, decision = _recall(exact, approx, args.probes // 2, args.tolerance, args.margin)
+            row["ivf"].append({"nlist": ivf.nlist, "nprobe": nprobe, "build_s": round(build_s, 3),
+                               "ms": round(ivf_ms, 4), "genuine": genuine, "top2": top2,
+                               "decision": decision})
+            print(f"{'':>10} {'':>7} {f'ivf/{nprobe}':>10} {build_s:>8.2f} {ivf_ms:>9.3f} "
+                  f"{genuine:>8.3f} {top2:>6.3f} {decision:>9.3f}")
+        results.append(row)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
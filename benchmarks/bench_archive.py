@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Year-range load: daily CSVs / SQLite store vs the monthly Parquet archive.
+
+A scratch ATS_BASE_DIR gets --days of daily CSVs (--employees rows each,
+ending a month ago so every day is archivable), which are imported into the
+store and rolled into the archive. Each variant then loads the whole range
+in a fresh process and reports the best time of --repeat loads, the peak
+RSS growth of the first load and the deep size of the resulting frame:
+
+  csv             ATTENDANCE_BACKEND="csv": one pandas read_csv per day, dtype=str
+  sqlite          one indexed range query on the store, string frame
+  archive         load_range(): typed frame from the Parquet months
+  archive, proj   load_range() with 3 columns and an is_absent filter pushed down
+
+Usage (from the repo root):
+    python benchmarks/bench_archive.py [--days 365] [--employees 50] [--out archive.json]
+
+Needs pyarrow for the archive variants.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SETUP = r"""
+import sys
+sys.path.insert(0, sys.argv[1])
+from datetime import timedelta
+import pandas as pd
+import ats_attendance as ats
+
+days, employees = int(sys.argv[2]), int(sys.argv[3])
+end = ats._today() - timedelta(days=30)
+for i in range(days):
+    d = end - timedelta(days=days - i)
+    rows = []
+    for j in range(employees):
+        absent = (i + j) % 17 == 0
+        rows.append(dict({h: "" for h in ats.DAILY_HEADERS}, id=f"Emp_{j:04d}-{d}-1", employee_id=f"Emp_{j:04d}",
+                         full_name=f"Employee {j:04d}", attendance_date=d.isoformat(),
+                         clock_in="" if absent else f"08:{j % 60:02d}:00 AM", clock_out="" if absent else "05:00:00 PM",
+                         total_hours="0.00" if absent else "8.25", total_minutes="0.00" if absent else "495.00",
+                         duration="" if absent else "8:15:00", is_late="TRUE" if j % 60 > 45 else "FALSE",
+                         is_absent="TRUE" if absent else "FALSE", method="Face Recognition",
+                         created_at=f"{d}T08:00:00+01:00", updated_at=f"{d}T17:00:00+01:00", time_quality="SANE",
+                         boot_id="3f1c", time_corrected="FALSE"))
+    pd.DataFrame(rows, columns=ats.DAILY_HEADERS).to_csv(ats._attendance_path(d), index=False)
+ats._store()
+ats.archive_closed_days()
+ats.compactor.stop(flush=False)
+"""
+
+_CHILD = r"""
+import json, sys, time, resource
+sys.path.insert(0, sys.argv[1])
+from datetime import timedelta
+import pyarrow.parquet
+import ats_attendance as ats
+
+mode, days, repeat = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+end = ats._today() - timedelta(days=30)
+start = end - timedelta(days=days)
+if mode == "csv":
+    ats.ATTENDANCE_BACKEND = "csv"
+if mode in ("csv", "sqlite"):
+    load = lambda: ats._load_range(start, end)
+elif mode == "archive":
+    load = lambda: ats.load_range(start, end)
+else:
+    load = lambda: ats.load_range(start, end, columns=["employee_id", "attendance_date", "total_hours"],
+                                  filters=[("is_absent", "==", False)])
+if mode != "csv":
+    ats._store()
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+best = None
+for _ in range(repeat):
+    t0 = time.perf_counter()
+    df = load()
+    dt = time.perf_counter() - t0
+    best = dt if best is None else min(best, dt)
+    if _ == 0:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+ats.compactor.stop(flush=False)
+print(json.dumps({"rows": len(df), "s": best, "rss_kb": rss, "frame_bytes": int(df.memory_usage(deep=True).sum())}))
+"""
+
+VARIANTS = [("csv", "csv"), ("sqlite", "sqlite"), ("archive", "archive"), ("archive_proj", "archive, proj")]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--employees", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    base = tempfile.mkdtemp(prefix="ats_archive_")
+    results = []
+    try:
+        env = dict(os.environ, ATS_BASE_DIR=base)
+        subprocess.run([sys.executable, "-c", _SETUP, REPO_ROOT, str(args.days), str(args.employees)],
+                       check=True, capture_output=True, text=True, env=env)
+        print(f"{'variant':>14} {'rows':>7} {'load s':>8} {'peak RSS MB':>12} {'frame MB':>9}")
+        for mode, label in VARIANTS:
+            out = subprocess.run([sys.executable, "-c", _CHILD, REPO_ROOT, mode, str(args.days), str(args.repeat)],
+                                 check=True, capture_output=True, text=True, env=env)
+            res = json.loads(out.stdout.strip().splitlines()[-1])
+            res["variant"] = label
+            results.append(res)
+            print(f"{label:>14} {res['rows']:>7} {res['s']:>8.3f} {res['rss_kb'] / 1024:>12.1f} "
+                  f"{res['frame_bytes'] / 2**20:>9.1f}")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"days": args.days, "employees": args.employees, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Per-frame distance cost: face_recognition.face_distance vs the packed
+float32 kernel (pack_face_encodings + packed_face_distance with an out
+buffer) and GalleryIndex.match, which uses the same kernel.
+
+For each gallery size reports the time per call and the peak memory
+tracemalloc sees during one call (after a warm-up call):
+
+  face_distance  list of float64 encodings, as recognize_face used to call it
+  packed         prepacked matrix + cached norms, float32 probe, out buffer
+  packed x8      one call for a batch of 8 probes (time per probe)
+  match          GalleryIndex.match with a float64 probe (what _vote calls)
+
+Usage (from the repo root):
+    python benchmarks/bench_distance_kernel.py [--sizes 20 100 500 2000] [--out dist.json]
+
+Encodings are synthetic, so no camera is needed (dlib is, for the import).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_recognition import api  # noqa: E402
+from ats_gallery import GalleryIndex  # noqa: E402
+
+BATCH = 8
+
+
+def _per_call_us(fn, calls):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def _peak_bytes(fn):
+    fn()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500, 2000])
+    ap.add_argument("--calls", type=int, default=2000)
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    print(f"{'rows':>6} {'variant':>14} {'us/probe':>9} {'peak B':>9}")
+    for n in args.sizes:
+        known = [v for v in rng.normal(scale=0.09, size=(n, 128))]      # float64, like dlib output
+        probe = rng.normal(scale=0.09, size=128)
+        probe32 = probe.astype(np.float32)
+        batch32 = rng.normal(scale=0.09, size=(BATCH, 128)).astype(np.float32)
+
+        matrix, sq_norms = api.pack_face_encodings(known)
+        out = np.empty(n, dtype=np.float32)
+        out_batch = np.empty((BATCH, n), dtype=np.float32)
+        index = GalleryIndex(known, [f"Employee_{i % max(1, n // 4):05d}" for i in range(n)])
+
+        variants = {
+            "face_distance": (lambda: api.face_distance(known, probe), 1),
+            "packed": (lambda: api.packed_face_distance(matrix, sq_norms, probe32, out=out), 1),
+            f"packed x{BATCH}": (lambda: api.packed_face_distance(matrix, sq_norms, batch32, out=out_batch), BATCH),
+            "match": (lambda: index.match(probe), 1),
+        }
+        row = {"rows": n}
+        for name, (fn, per_call) in variants.items():
+            us = _per_call_us(fn, max(1, args.calls // per_call)) / per_call
+            peak = _peak_bytes(fn)
+            row[name] = {"us_per_probe": round(us, 2), "peak_bytes": peak}
+            print(f"{n:>6} {name:>14} {us:>9.2f} {peak:>9}")
+        results.append(row)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
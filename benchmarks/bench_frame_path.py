@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Per-frame allocations and time: legacy vs direct camera frame path.
+
+legacy: 640x480 XRGB8888 capture -> cv2.resize -> cv2.cvtColor(BGR2RGB)
+direct: capture already at detector size as RGB (Picamera2 "BGR888" main)
+
+Usage (from the repo root):
+    python benchmarks/bench_frame_path.py [--frames 200] [--scaler 2]
+
+The camera is simulated: like Picamera2.capture_array(), every capture
+returns a freshly allocated array, so both paths pay for that one buffer.
+"""
+
+import time
+import argparse
+import tracemalloc
+
+import cv2
+import numpy as np
+
+NUMPY_DOMAIN = 389047   # tracemalloc domain NumPy reports array data under
+BIG_BLOCK = 4096        # count only frame-sized buffers, not small Python objects
+
+
+def _capture(shape):
+    return np.empty(shape, dtype=np.uint8)
+
+
+def legacy_path(scaler):
+    frame = _capture((480, 640, 4))
+    resized = cv2.resize(frame, (0, 0), fx=1 / scaler, fy=1 / scaler)
+    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    return frame, resized, rgb
+
+
+def direct_path(scaler):
+    frame = _capture((480 // scaler, 640 // scaler, 3))
+    rgb = frame if frame.flags.c_contiguous else np.ascontiguousarray(frame)
+    return frame, rgb
+
+
+def _allocations(fn, scaler):
+    """(buffers, bytes) allocated by one call, counting everything it keeps alive."""
+    fn(scaler)  # warm-up (lazy OpenCV init)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = fn(scaler)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    filt = [tracemalloc.DomainFilter(True, NUMPY_DOMAIN)]
+    diff = after.filter_traces(filt).compare_to(before.filter_traces(filt), "traceback")
+    big = [d for d in diff if d.size_diff >= BIG_BLOCK]
+    del keep
+    return sum(d.count_diff for d in big), sum(d.size_diff for d in big)
+
+
+def _time_per_frame(fn, scaler, frames):
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        fn(scaler)
+    return (time.perf_counter() - t0) / frames
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--scaler", type=int, default=2)
+    args = ap.parse_args()
+
+    print(f"{'path':>7} {'buffers/frame':>14} {'KiB/frame':>10} {'ms/frame':>9}")
+    for name, fn in (("legacy", legacy_path), ("direct", direct_path)):
+        count, size = _allocations(fn, args.scaler)
+        ms = _time_per_frame(fn, args.scaler, args.frames) * 1e3
+        print(f"{name:>7} {count:>14} {size / 1024:>10.1f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
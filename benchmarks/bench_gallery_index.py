@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: legacy per-row Python matcher vs ats_gallery.GalleryIndex.
+
+Usage (from the repo root):
+    python benchmarks/bench_gallery_index.py [--sizes 100 1000 10000] [--per-id 5]
+
+Encodings are synthetic unit vectors, so no camera or dlib is needed.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_gallery import GalleryIndex  # noqa: E402
+
+
+def _legacy_match(known_face_encodings, known_face_ids, enc):
+    """Copy of the loop recognize_face used before GalleryIndex."""
+    # face_recognition.face_distance on a Python list of float64 arrays
+    dists = np.linalg.norm(known_face_encodings - enc, axis=1)
+    per_id_min = {}
+    for idx, dist in enumerate(dists):
+        eid_k = known_face_ids[idx]
+        cur = per_id_min.get(eid_k, 1e9)
+        if dist < cur:
+            per_id_min[eid_k] = float(dist)
+    best_eid, best = min(per_id_min.items(), key=lambda kv: kv[1])
+    others = [v for k, v in per_id_min.items() if k != best_eid]
+    second = min(others) if others else None
+    return best_eid, best, second
+
+
+def _synthetic_gallery(n, per_id, rng):
+    n_ids = max(1, n // per_id)
+    centers = rng.normal(size=(n_ids, 128))
+    ids, encs = [], []
+    for i in range(n):
+        k = i % n_ids
+        v = centers[k] + 0.3 * rng.normal(size=128)
+        encs.append(v / np.linalg.norm(v) * 0.9)
+        ids.append(f"Employee_{k:05d}")
+    return encs, ids
+
+
+def _time_per_call(fn, probes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in probes:
+            fn(p)
+        best = min(best, (time.perf_counter() - t0) / len(probes))
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    ap.add_argument("--per-id", type=int, default=5, help="enrolled photos per employee")
+    ap.add_argument("--probes", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'encodings':>10} {'ids':>6} {'legacy ms':>10} {'index ms':>9} {'speedup':>8}")
+    for n in args.sizes:
+        encs, ids = _synthetic_gallery(n, args.per_id, rng)
+        index = GalleryIndex(encs, ids)
+        probes = [encs[j] + 0.05 * rng.normal(size=128) for j in rng.integers(0, n, args.probes)]
+
+        # sanity: both paths must agree on the winner
+        for p in probes[:5]:
+            assert _legacy_match(encs, ids, p)[0] == index.match(p)[0]
+
+        t_legacy = _time_per_call(lambda p: _legacy_match(encs, ids, p), probes, args.repeat)
+        t_index = _time_per_call(index.match, probes, args.repeat)
+        print(f"{n:>10} {index.num_ids:>6} {t_legacy * 1e3:>10.3f} {t_index * 1e3:>9.3f} {t_legacy / t_index:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
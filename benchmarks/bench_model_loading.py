@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Start-up cost of face_recognition: eager vs lazy model loading.
+
+Each mode runs in a fresh interpreter (so nothing is cached in-process) and
+reports wall time and resident memory after it finishes:
+
+  import   import face_recognition only (lazy: no model is loaded)
+  kiosk    import + the models the kiosk uses (HOG, 5-point, encoder)
+  eager    import + every model (what importing the package used to do,
+           including the CNN detector and the 68-point predictor)
+
+Usage (from the repo root):
+    python benchmarks/bench_model_loading.py [--repeat 5] [--out models.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    "import": (),
+    "kiosk": ("face_detector", "pose_predictor_5_point", "face_encoder"),
+    "eager": None,
+}
+
+_CHILD = r"""
+import json, sys, time, resource
+t0 = time.perf_counter()
+import face_recognition
+from face_recognition import api
+t_import = time.perf_counter() - t0
+names = json.loads(sys.argv[1])
+if names is None:
+    api.load_models()
+elif names:
+    api.load_models(*names)
+total = time.perf_counter() - t0
+rss = None
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"import_s": t_import, "total_s": total, "rss_mb": rss, "loaded": sorted(api._models)}))
+"""
+
+
+def _run(names):
+    out = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(names)],
+                         check=True, capture_output=True, text=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5, help="fresh interpreters per mode (median is reported)")
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    _run(())  # warm the OS page cache so the first mode isn't penalised
+    results = {}
+    print(f"{'mode':<8}{'import s':>10}{'total s':>10}{'RSS MB':>9}  models")
+    for mode, names in MODES.items():
+        runs = [_run(names) for _ in range(args.repeat)]
+        row = {k: round(statistics.median(r[k] for r in runs), 4) for k in ("import_s", "total_s", "rss_mb")}
+        row["loaded"] = runs[0]["loaded"]
+        results[mode] = row
+        print(f"{mode:<8}{row['import_s']:>10.3f}{row['total_s']:>10.3f}{row['rss_mb']:>9.1f}  "
+              f"{', '.join(row['loaded']) or '-'}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
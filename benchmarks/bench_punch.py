@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Punch latency vs day size: LocalAttendanceManager.log_attendance.
+
+For each size, today's CSV is pre-filled with that many rows (other
+employees, checked in) in a scratch ATS_BASE_DIR. Then --punches employees
+check in and check out again, and the latency of each call is recorded.
+Background compaction is held off for the run (COMPACT_DELAY_SEC), so the
+numbers are the punch path alone: one durable write (a SQLite upsert, or a
+journal append on the csv backend) plus the DayLedger lookups. The first
+punch of a run loads the ledger (and, on sqlite, imports the pre-filled
+CSV), which is reported separately.
+
+Usage (from the repo root):
+    python benchmarks/bench_punch.py [--sizes 10 1000 10000] [--punches 50] [--backend sqlite|csv] [--no-fsync]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import pandas as pd
+import ats_attendance as ats
+
+size, punches, fsync = int(sys.argv[2]), int(sys.argv[3]), sys.argv[4] == "1"
+ats.ATTENDANCE_BACKEND = sys.argv[5]
+ats.journal.fsync = fsync
+ats.compactor.delay = 3600
+day = ats._today()
+rows = [dict({h: "" for h in ats.DAILY_HEADERS}, id=f"Filler_{i:05d}-{day}-{i + 1}", employee_id=f"Filler_{i:05d}",
+             full_name=f"Filler {i:05d}", attendance_date=day.isoformat(), clock_in="08:00:00 AM",
+             total_hours="0.00", total_minutes="0.00", is_late="FALSE", is_absent="FALSE")
+        for i in range(size)]
+pd.DataFrame(rows, columns=ats.DAILY_HEADERS).to_csv(ats._attendance_path(day), index=False)
+
+mgr = ats.LocalAttendanceManager()
+t0 = time.perf_counter()
+ats._day_ledger(day)
+if ats.ATTENDANCE_BACKEND == "sqlite" and not fsync:
+    ats._store()._conn().execute("PRAGMA synchronous=OFF")
+load_ms = (time.perf_counter() - t0) * 1e3
+lat = {"Check-In": [], "Check-Out": []}
+for kind in lat:
+    for i in range(punches):
+        t0 = time.perf_counter()
+        mgr.log_attendance(f"Bench_{i:04d}", f"Bench {i:04d}", kind)
+        lat[kind].append((time.perf_counter() - t0) * 1e3)
+ats.compactor.stop(flush=False)
+print(json.dumps({"load_ms": load_ms, **lat}))
+"""
+
+
+def _median(xs):
+    xs = sorted(xs)
+    return xs[len(xs) // 2]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    ap.add_argument("--punches", type=int, default=50, help="check-ins (and check-outs) per size")
+    ap.add_argument("--backend", choices=["sqlite", "csv"], default="sqlite", help="ATTENDANCE_BACKEND to measure")
+    ap.add_argument("--no-fsync", action="store_true", help="write without fsync (isolates CPU cost)")
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    results = []
+    print(f"{'rows':>7} {'ledger load ms':>15} {'check-in p50':>13} {'max':>7} {'check-out p50':>14} {'max':>7}")
+    for size in args.sizes:
+        base = tempfile.mkdtemp(prefix="ats_punch_")
+        try:
+            env = dict(os.environ, ATS_BASE_DIR=base)
+            out = subprocess.run([sys.executable, "-c", _CHILD, REPO_ROOT, str(size), str(args.punches),
+                                  "0" if args.no_fsync else "1", args.backend],
+                                 check=True, capture_output=True, text=True, env=env)
+            res = json.loads(out.stdout.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+        row = {"rows": size, "backend": args.backend, "ledger_load_ms": round(res["load_ms"], 2)}
+        for kind in ("Check-In", "Check-Out"):
+            row[kind] = {"p50_ms": round(_median(res[kind]), 3), "max_ms": round(max(res[kind]), 3)}
+        results.append(row)
+        print(f"{size:>7} {row['ledger_load_ms']:>15.1f} {row['Check-In']['p50_ms']:>13.3f} "
+              f"{row['Check-In']['max_ms']:>7.2f} {row['Check-Out']['p50_ms']:>14.3f} {row['Check-Out']['max_ms']:>7.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
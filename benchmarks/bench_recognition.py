@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark for ats_attendance.recognize_face on recorded frames.
+
+Replays recorded frame sequences through the real recognition path (motion
+gate, tracker, quality gate, dlib, gallery match, decision rule) with the
+ats_hardware "fake" camera, GPIO and LCD, so it runs headless on a plain
+Linux box. Reports per-stage latency percentiles, time-to-decision and the
+error rates, and writes a JSON result that can be diffed across commits:
+
+    far                 impostor attempts accepted as anyone / impostor attempts
+    frr                 genuine attempts rejected / genuine attempts
+    misidentification   genuine attempts accepted as someone else / genuine attempts
+
+Sequences (--sequences DIR), one attempt each:
+    DIR/<label>.npz        array "frames" (N, H, W, 3) RGB uint8; optional "label"
+    DIR/<label>/*.jpg      JPEG/PNG frames, replayed in name order
+<label> is the expected employee_id (employees/ folder name); labels starting
+with "unknown" or "impostor" are people who must NOT be recognized.
+
+Gallery: --base-dir must contain employees/ (and optionally a cached
+employees/gallery.bin, or a legacy encodings.pickle that is migrated to it
+on load); it is used as ATS_BASE_DIR, so attendance and
+report folders are created under it.
+
+Usage (from the repo root):
+    python benchmarks/bench_recognition.py --base-dir /tmp/ats --sequences recs/ \\
+        --out bench_recognition.json [--set TOLERANCE=0.45 --set DECISION_MODE=streak]
+"""
+
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+import subprocess
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from ats_hardware import load_frames   # noqa: E402
+
+IMPOSTOR_PREFIXES = ("unknown", "impostor")
+TUNABLES = (
+    "TOLERANCE", "SECOND_BEST_MARGIN", "MATCH_STREAK", "MAX_FRAMES", "cv_scaler",
+    "CAMERA_FRAME_PATH", "PIPELINED_RECOGNITION", "MOTION_GATE_ENABLED",
+    "FACE_TRACKING_ENABLED", "QUALITY_GATE_ENABLED", "QUALITY_MIN_SCORE", "DECISION_MODE",
+    "MATCH_BACKEND", "IVF_NPROBE",
+)
+
+
+# -------------------- Sequences --------------------
+def _load_sequences(root):
+    seqs = []
+    for entry in sorted(os.listdir(root)):
+        path = os.path.join(root, entry)
+        if entry.endswith(".npz"):
+            with np.load(path) as data:
+                label = str(data["label"]) if "label" in data else entry[:-4]
+            seqs.append((label, load_frames(path)))
+        elif os.path.isdir(path):
+            frames = load_frames(path)
+            if frames:
+                seqs.append((entry, frames))
+    return seqs
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=np.float64)
+    return {"count": int(arr.size), "mean": round(float(arr.mean()), 3),
+            "p50": round(float(np.percentile(arr, 50)), 3),
+            "p95": round(float(np.percentile(arr, 95)), 3),
+            "p99": round(float(np.percentile(arr, 99)), 3)}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+
+def _apply_overrides(ats, overrides):
+    for item in overrides:
+        key, _, raw = item.partition("=")
+        try:
+            value = ast.literal_eval(raw)
+        except Exception:
+            value = raw
+        if not hasattr(ats, key):
+            raise SystemExit(f"unknown setting: {key}")
+        setattr(ats, key, value)
+        if key == "cv_scaler":
+            ats.DETECT_SIZE = (ats.CAPTURE_SIZE[0] // value, ats.CAPTURE_SIZE[1] // value)
+    ats.picam2.configure(ats._camera_config(ats.picam2))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--base-dir", required=True, help="ATS_BASE_DIR with employees/ inside")
+    ap.add_argument("--sequences", required=True)
+    ap.add_argument("--out", default="bench_recognition.json")
+    ap.add_argument("--fps", type=float, default=30.0, help="replay rate of the fake camera")
+    ap.add_argument("--timeout", type=float, default=10.0, help="recognize_face timeout (s)")
+    ap.add_argument("--repeat", type=int, default=1, help="attempts per sequence")
+    ap.add_argument("--set", dest="overrides", action="append", default=[],
+                    help="override an ats_attendance setting, e.g. TOLERANCE=0.45")
+    args = ap.parse_args()
+
+    os.environ["ATS_BASE_DIR"] = os.path.abspath(args.base_dir)
+    import ats_attendance as ats
+
+    ats.init_hardware("fake", fps=args.fps, loop=False)
+    _apply_overrides(ats, args.overrides)
+    ats.load_encodings_from_cache_or_build()
+
+    seqs = _load_sequences(args.sequences)
+    if not seqs:
+        raise SystemExit(f"no sequences found in {args.sequences}")
+
+    ats.recognition_stats.reset()
+    ats.decision_stats.reset()
+    cam = ats.picam2
+    rows, decide_ms = [], []
+    counts = {"genuine": 0, "impostor": 0, "true_accept": 0, "false_accept": 0,
+              "false_reject": 0, "true_reject": 0, "misidentified": 0}
+
+    for label, frames in seqs:
+        impostor = label.lower().startswith(IMPOSTOR_PREFIXES)
+        for _ in range(args.repeat):
+            cam.load(frames)
+            t0 = time.perf_counter()
+            eid, name, conf = ats.recognize_face(timeout=args.timeout, headless=True)
+            elapsed_ms = (time.perf_counter() - t0) * 1e3
+            decide_ms.append(elapsed_ms)
+
+            if impostor:
+                counts["impostor"] += 1
+                outcome = "false_accept" if eid else "true_reject"
+            else:
+                counts["genuine"] += 1
+                if eid is None:
+                    outcome = "false_reject"
+                elif str(eid) == label:
+                    outcome = "true_accept"
+                else:
+                    outcome = "misidentified"
+            counts[outcome] += 1
+            rows.append({"sequence": label, "expected": None if impostor else label,
+                         "got": eid, "confidence": conf, "outcome": outcome,
+                         "ms": round(elapsed_ms, 1)})
+            print(f"[BENCH] {label:<24} -> {str(eid):<24} {outcome:<13} {elapsed_ms:8.1f} ms")
+
+    attempts = counts["genuine"] + counts["impostor"]
+    genuine, impostor = counts["genuine"], counts["impostor"]
+    result = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {k: getattr(ats, k) for k in TUNABLES if hasattr(ats, k)},
+        "gallery": {"encodings": len(ats.gallery), "ids": ats.gallery.index.num_ids},
+        "stages_ms": ats.recognition_stats.summary(),
+        "time_to_decision_ms": _percentiles(decide_ms),
+        "frames_to_decision": ats.decision_stats.summary(),
+        "rates": {
+            "attempts": attempts,
+            "far": round(counts["false_accept"] / impostor, 4) if impostor else None,
+            "frr": round(counts["false_reject"] / genuine, 4) if genuine else None,
+            "misidentification": round(counts["misidentified"] / genuine, 4) if genuine else None,
+            **counts,
+        },
+        "attempts": rows,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, default=str)
+
+    print(json.dumps({k: result[k] for k in ("stages_ms", "time_to_decision_ms", "rates")}, indent=2))
+    print(f"[BENCH] wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Offline evaluation: raw per-photo gallery vs consolidated templates.
+
+Leave-one-out over the enrollment photos. Each photo is matched against a
+gallery built from every other photo. That gallery is used raw (one row
+per photo) and consolidated (ats_gallery.consolidate_gallery). Reports for
+both:
+
+  top1        best ID is the right employee
+  accept      best <= TOLERANCE and runner-up at least MARGIN further away
+              (the per-frame rule the kiosk votes with)
+  false_accept  same rule with the photo's own employee removed from the
+              gallery (every photo acting as an impostor)
+  rows / us_per_match  gallery size and GalleryIndex.match latency
+
+Encodings come from the enrollment manifest (no dlib needed), or from a
+synthetic gallery.
+
+Usage (from the repo root):
+    python benchmarks/eval_consolidation.py --base-dir /home/pi/.../ATS_PROJECT
+    python benchmarks/eval_consolidation.py --synthetic 200 --per-id 12
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_gallery import GalleryIndex, consolidate, consolidate_gallery  # noqa: E402
+
+
+def _from_manifest(base_dir):
+    from ats_enroll import load_manifest
+    photos = load_manifest(os.path.join(base_dir, "employees", "manifest.pickle"))
+    rows = [(e["employee_id"], e["encoding"]) for _, e in sorted(photos.items()) if e["encoding"] is not None]
+    return [r[1] for r in rows], [r[0] for r in rows]
+
+
+def _synthetic(n_ids, per_id, seed=0):
+    """Two pose modes per employee, roughly dlib-like distances (median intra ~0.4, inter ~0.9)."""
+    rng = np.random.default_rng(seed)
+    mean = rng.normal(size=128)
+    mean /= np.linalg.norm(mean)
+    encs, ids = [], []
+    for k in range(n_ids):
+        center = mean + rng.normal(scale=0.55 / np.sqrt(128), size=128)
+        pose = rng.normal(scale=0.3 / np.sqrt(128), size=128)
+        for j in range(per_id):
+            encs.append(center + (pose if j % 2 else 0) + rng.normal(scale=0.22 / np.sqrt(128), size=128))
+            ids.append(f"Employee_{k:04d}")
+    return encs, ids
+
+
+def _decide(per_id, tolerance, margin):
+    """(best_code, accepted) for one per-ID minimum vector."""
+    order = np.argsort(per_id)[:2]
+    best = per_id[order[0]]
+    second = per_id[order[1]] if len(order) > 1 and np.isfinite(per_id[order[1]]) else None
+    ok = bool(best <= tolerance and (second is None or second - best >= margin))
+    return int(order[0]), ok
+
+
+def _evaluate(encs, ids, index, own_rows, tolerance, margin, max_templates):
+    """
+    Leave-one-out over every photo. own_rows(rest, max_templates) gives the
+    probe's employee gallery rows built from their other photos; every other
+    employee uses the rows already in index.
+    """
+    x = np.asarray(encs, dtype=np.float32)
+    code_of = {eid: c for c, eid in enumerate(index.ids)}
+    by_id = {}
+    for i, eid in enumerate(ids):
+        by_id.setdefault(eid, []).append(i)
+
+    stats = {"probes": 0, "top1": 0, "accept": 0, "impostor_probes": 0, "false_accept": 0}
+    for eid, rows in by_id.items():
+        code = code_of[eid]
+        for i in rows:
+            per_id = index.per_id_min(x[i]).astype(np.float64)
+
+            # impostor: the employee is not enrolled at all
+            imp = per_id.copy()
+            imp[code] = np.inf
+            if np.isfinite(imp).any():
+                stats["impostor_probes"] += 1
+                stats["false_accept"] += _decide(imp, tolerance, margin)[1]
+
+            # genuine: the employee is enrolled from the other photos only
+            rest = [j for j in rows if j != i]
+            if not rest:
+                continue
+            templates = own_rows(x[rest], max_templates)
+            per_id[code] = np.linalg.norm(templates - x[i], axis=1).min()
+            best_code, ok = _decide(per_id, tolerance, margin)
+            stats["probes"] += 1
+            stats["top1"] += best_code == code
+            stats["accept"] += ok and best_code == code
+
+    out = {"rows": len(index)}
+    if stats["probes"]:
+        out["top1"] = round(stats["top1"] / stats["probes"], 4)
+        out["accept"] = round(stats["accept"] / stats["probes"], 4)
+    if stats["impostor_probes"]:
+        out["false_accept"] = round(stats["false_accept"] / stats["impostor_probes"], 4)
+    out.update(probes=stats["probes"], impostor_probes=stats["impostor_probes"])
+
+    probes = x[: min(len(x), 500)]
+    t0 = time.perf_counter()
+    for p in probes:
+        index.match(p)
+    out["us_per_match"] = round((time.perf_counter() - t0) / len(probes) * 1e6, 2)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="raw vs consolidated gallery, leave-one-out")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--base-dir", help="ATS_BASE_DIR with employees/manifest.pickle")
+    src.add_argument("--synthetic", type=int, metavar="IDS", help="synthetic gallery with IDS employees")
+    ap.add_argument("--per-id", type=int, default=12, help="photos per synthetic employee")
+    ap.add_argument("--max-templates", type=int, default=4)
+    ap.add_argument("--method", default="auto", choices=("auto", "mean_medoids", "kmeans"))
+    ap.add_argument("--tolerance", type=float, default=0.41)
+    ap.add_argument("--margin", type=float, default=0.05)
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    encs, ids = _from_manifest(args.base_dir) if args.base_dir else _synthetic(args.synthetic, args.per_id)
+    if not encs:
+        raise SystemExit("no encodings found")
+
+    raw_index = GalleryIndex(encs, ids)
+    t0 = time.perf_counter()
+    c_encs, c_ids, methods = consolidate_gallery(encs, ids, args.max_templates, args.method)
+    consolidate_ms = (time.perf_counter() - t0) * 1e3
+    cons_index = GalleryIndex(c_encs, c_ids)
+
+    raw = _evaluate(encs, ids, raw_index, lambda rest, k: rest,
+                    args.tolerance, args.margin, args.max_templates)
+    cons = _evaluate(encs, ids, cons_index,
+                     lambda rest, k: consolidate(rest, k, args.method)[0],
+                     args.tolerance, args.margin, args.max_templates)
+
+    used = {}
+    for m in methods.values():
+        used[m] = used.get(m, 0) + 1
+    result = {"encodings": len(encs), "ids": raw_index.num_ids, "max_templates": args.max_templates,
+              "consolidate_ms": round(consolidate_ms, 1), "methods": used,
+              "raw": raw, "consolidated": cons}
+
+    print(f"{'':<14}{'rows':>8}{'top1':>8}{'accept':>8}{'FA':>8}{'us/match':>10}")
+    for name, r in (("raw", raw), ("consolidated", cons)):
+        print(f"{name:<14}{r['rows']:>8}{r.get('top1', float('nan')):>8.3f}{r.get('accept', float('nan')):>8.3f}"
+              f"{r.get('false_accept', float('nan')):>8.4f}{r['us_per_match']:>10.1f}")
+    print(f"methods: {used}  (consolidation {consolidate_ms:.0f} ms)")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
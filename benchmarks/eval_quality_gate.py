@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Offline calibration of the face-quality gate (ats_vision.face_quality).
+
+Runs recorded kiosk sequences through the kiosk's detector-scale frame
+(DETECT_SIZE), HOG detection and 5-point landmarks. Every frame with one
+face is scored with the QUALITY_* constants from ats_attendance. For the
+genuine sequences it reports:
+
+  score / sharpness / size / yaw / exposure   percentiles of each factor
+  dropped      share of genuine frames below QUALITY_MIN_SCORE, i.e.
+               frames the gate would keep away from the encoder
+  raw          Laplacian variance and face side (px) before normalization
+
+It then suggests constants: QUALITY_BLUR_REF and QUALITY_SIZE_REF at the
+25th percentile of the raw values (3 in 4 genuine faces count as fully
+sharp and fully sized), and QUALITY_MIN_SCORE at 80% of the 1st
+percentile of the genuine scores under those refs.
+
+Sequences use the bench_recognition.py layout (DIR/<label>.npz or
+DIR/<label>/*.jpg); labels starting with "unknown"/"impostor" are left out
+of the genuine statistics.
+
+Usage (from the repo root):
+    python benchmarks/eval_quality_gate.py --sequences recs/ [--out quality.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("ATS_BASE_DIR", tempfile.mkdtemp(prefix="ats_quality_"))
+
+import face_recognition  # noqa: E402
+import ats_attendance as ats  # noqa: E402
+from ats_hardware import load_frames  # noqa: E402
+from ats_vision import face_quality  # noqa: E402
+
+IMPOSTOR_PREFIXES = ("unknown", "impostor")
+PARTS = ("score", "sharpness", "size", "yaw", "exposure")
+
+
+def _sequences(root):
+    for entry in sorted(os.listdir(root)):
+        path = os.path.join(root, entry)
+        if entry.endswith(".npz"):
+            yield entry[:-4], load_frames(path)
+        elif os.path.isdir(path):
+            yield entry, load_frames(path)
+
+
+def _faces(frames):
+    """(gray, loc, points5) for every frame with exactly one face, at detector scale."""
+    for frame in frames:
+        rgb = cv2.resize(frame, ats.DETECT_SIZE, interpolation=cv2.INTER_AREA)
+        locs = face_recognition.face_locations(rgb)
+        if len(locs) != 1:
+            continue
+        shape = face_recognition.api._raw_face_landmarks(rgb, locs, model="small")[0]
+        yield cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), locs[0], [(p.x, p.y) for p in shape.parts()]
+
+
+def _pct(values):
+    arr = np.asarray(values, dtype=np.float64)
+    return {p: round(float(np.percentile(arr, p)), 3) for p in (1, 5, 25, 50)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sequences", required=True)
+    ap.add_argument("--out", help="also write the result as JSON")
+    args = ap.parse_args()
+
+    faces = []
+    for label, frames in _sequences(args.sequences):
+        if not label.lower().startswith(IMPOSTOR_PREFIXES):
+            faces.extend(_faces(frames))
+    if not faces:
+        sys.exit("no genuine frames with exactly one face")
+
+    def score_all(blur_ref, size_ref):
+        return [face_quality(g, loc, pts, blur_ref=blur_ref, size_ref=size_ref, max_yaw=ats.QUALITY_MAX_YAW)
+                for g, loc, pts in faces]
+
+    current = score_all(ats.QUALITY_BLUR_REF, ats.QUALITY_SIZE_REF)
+    raw_blur, raw_side = [], []
+    for g, (t, r, b, l), _ in faces:
+        crop = g[max(t, 0):b, max(l, 0):r]
+        raw_blur.append(float(cv2.Laplacian(crop, cv2.CV_64F).var()) if crop.size else 0.0)
+        raw_side.append(min(b - t, r - l))
+
+    blur_ref = round(float(np.percentile(raw_blur, 25)), 1)
+    size_ref = int(np.percentile(raw_side, 25))
+    tuned = [q["score"] for q in score_all(blur_ref, size_ref)]
+    result = {
+        "frames": len(faces),
+        "current": {
+            "QUALITY_BLUR_REF": ats.QUALITY_BLUR_REF, "QUALITY_SIZE_REF": ats.QUALITY_SIZE_REF,
+            "QUALITY_MIN_SCORE": ats.QUALITY_MIN_SCORE,
+            "dropped": round(float(np.mean([q["score"] < ats.QUALITY_MIN_SCORE for q in current])), 3),
+            **{part: _pct([q[part] for q in current]) for part in PARTS},
+        },
+        "raw": {"laplacian_var": _pct(raw_blur), "face_side_px": _pct(raw_side)},
+        "suggested": {
+            "QUALITY_BLUR_REF": blur_ref, "QUALITY_SIZE_REF": size_ref,
+            "QUALITY_MIN_SCORE": round(0.8 * float(np.percentile(tuned, 1)), 3),
+        },
+    }
+
+    cur = result["current"]
+    print(f"{len(faces)} genuine frames; gate at QUALITY_MIN_SCORE={ats.QUALITY_MIN_SCORE} drops {cur['dropped']:.1%}")
+    for part in PARTS:
+        print(f"  {part:>10} p1 {cur[part][1]:.3f}  p5 {cur[part][5]:.3f}  p25 {cur[part][25]:.3f}  p50 {cur[part][50]:.3f}")
+    print(f"  raw Laplacian var p25/p50 {result['raw']['laplacian_var'][25]}/{result['raw']['laplacian_var'][50]}, "
+          f"face side p25/p50 {result['raw']['face_side_px'][25]}/{result['raw']['face_side_px'][50]} px")
+    print("suggested: " + ", ".join(f"{k}={v}" for k, v in result["suggested"].items()))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
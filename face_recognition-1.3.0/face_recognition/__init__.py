@@ -4,4 +4,4 @@ __author__ = """Adam Geitgey"""
 __email__ = 'ageitgey@gmail.com'
 __version__ = '1.2.3'
 
-from .api import load_image_file, face_locations, batch_face_locations, face_landmarks, face_encodings, compare_faces, face_distance
+from .api import load_image_file, face_locations, batch_face_locations, face_landmarks, face_encodings, batch_face_encodings, compare_faces, face_distance, pack_face_encodings, packed_face_distance
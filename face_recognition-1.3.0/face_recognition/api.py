@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import threading
+
 import PIL.Image
 import dlib
 import numpy as np
@@ -14,21 +16,58 @@ except Exception:
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-face_detector = dlib.get_frontal_face_detector()
-
 predictor_68_point_model = face_recognition_models.pose_predictor_model_location()
-pose_predictor_68_point = dlib.shape_predictor(predictor_68_point_model)
-
 predictor_5_point_model = face_recognition_models.pose_predictor_five_point_model_location()
-pose_predictor_5_point = dlib.shape_predictor(predictor_5_point_model)
-
 cnn_face_detection_model = face_recognition_models.cnn_face_detector_model_location()
-cnn_face_detector = dlib.cnn_face_detection_model_v1(cnn_face_detection_model)
-
 face_recognition_model = face_recognition_models.face_recognition_model_location()
-face_encoder = dlib.face_recognition_model_v1(face_recognition_model)
+
+# Models are loaded on first use rather than at import, so callers only pay
+# (in start-up time and memory) for the ones they actually use. They are
+# still reachable as module attributes (api.face_encoder etc.).
+_MODEL_LOADERS = {
+    "face_detector": lambda: dlib.get_frontal_face_detector(),
+    "pose_predictor_68_point": lambda: dlib.shape_predictor(predictor_68_point_model),
+    "pose_predictor_5_point": lambda: dlib.shape_predictor(predictor_5_point_model),
+    "cnn_face_detector": lambda: dlib.cnn_face_detection_model_v1(cnn_face_detection_model),
+    "face_encoder": lambda: dlib.face_recognition_model_v1(face_recognition_model),
+}
+_models = {}
+_model_locks = {name: threading.Lock() for name in _MODEL_LOADERS}
+
+
+def _get_model(name):
+    """
+    Return the named dlib model, loading it on first use. Safe to call from several threads at once;
+    each model is loaded exactly once.
+
+    :param name: one of the keys of _MODEL_LOADERS
+    :return: the loaded dlib model
+    """
+    model = _models.get(name)
+    if model is None:
+        with _model_locks[name]:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = _MODEL_LOADERS[name]()
+    return model
 
 
+def load_models(*names):
+    """
+    Load models ahead of first use (e.g. while an app is otherwise idle). With no names, loads all of them.
+
+    :param names: model names, e.g. "face_detector", "pose_predictor_5_point", "face_encoder"
+    :return: None
+    """
+    for name in names or _MODEL_LOADERS:
+        _get_model(name)
+
+
+def __getattr__(name):
+    if name in _MODEL_LOADERS:
+        return _get_model(name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
 def _rect_to_css(rect):
     """
     Convert a dlib 'rect' object to a plain tuple in (top, right, bottom, left) order
@@ -75,6 +114,45 @@ def face_distance(face_encodings, face_to_compare):
     return np.linalg.norm(face_encodings - face_to_compare, axis=1)
 
 
+def pack_face_encodings(face_encodings):
+    """
+    Pack a list of known face encodings once, for repeated comparisons with packed_face_distance.
+
+    :param face_encodings: List of face encodings
+    :return: A tuple of (a C-contiguous float32 matrix with one encoding per row, the squared norm of each row)
+    """
+    matrix = np.ascontiguousarray(np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128))
+    return matrix, np.einsum("ij,ij->i", matrix, matrix)
+
+
+def packed_face_distance(known_matrix, known_sq_norms, faces_to_compare, out=None):
+    """
+    Like face_distance, but against a packed matrix of known encodings (see pack_face_encodings), and for one face
+    encoding or a batch of them at once. Uses ||a||^2 + ||b||^2 - 2a.b with the cached squared norms, so the work is
+    one matrix product and no N x 128 difference array is built.
+
+    With an `out` buffer and float32 encodings to compare, no new arrays are allocated, which makes it cheap to call
+    on every video frame.
+
+    :param known_matrix: float32 matrix of known face encodings, one per row
+    :param known_sq_norms: the squared norm of each row of known_matrix
+    :param faces_to_compare: A face encoding, or a (P, 128) array of them
+    :param out: Optional - float32 array of shape (N,) (or (P, N) for a batch) to write the distances into
+    :return: A float32 numpy ndarray with the distance to each known face (one row per face to compare for a batch)
+    """
+    faces = np.asarray(faces_to_compare, dtype=known_matrix.dtype)
+    if out is None:
+        out = np.empty(faces.shape[:-1] + known_matrix.shape[:1], dtype=known_matrix.dtype)
+    np.dot(faces, known_matrix.T, out=out)
+    # Row by row: a broadcast in-place add over a (P, N) block allocates a temporary
+    for row, face in zip(np.atleast_2d(out), np.atleast_2d(faces)):
+        row *= -2.0
+        row += known_sq_norms
+        row += np.dot(face, face)
+    np.maximum(out, 0.0, out=out)
+    return np.sqrt(out, out=out)
+
+
 def load_image_file(file, mode='RGB'):
     """
     Loads an image file (.jpg, .png, etc) into a numpy array
@@ -100,9 +178,9 @@ def _raw_face_locations(img, number_of_times_to_upsample=1, model="hog"):
     :return: A list of dlib 'rect' objects of found face locations
     """
     if model == "cnn":
-        return cnn_face_detector(img, number_of_times_to_upsample)
+        return _get_model("cnn_face_detector")(img, number_of_times_to_upsample)
     else:
-        return face_detector(img, number_of_times_to_upsample)
+        return _get_model("face_detector")(img, number_of_times_to_upsample)
 
 
 def face_locations(img, number_of_times_to_upsample=1, model="hog"):
@@ -129,7 +207,7 @@ def _raw_face_locations_batched(images, number_of_times_to_upsample=1, batch_siz
     :param number_of_times_to_upsample: How many times to upsample the image looking for faces. Higher numbers find smaller faces.
     :return: A list of dlib 'rect' objects of found face locations
     """
-    return cnn_face_detector(images, number_of_times_to_upsample, batch_size=batch_size)
+    return _get_model("cnn_face_detector")(images, number_of_times_to_upsample, batch_size=batch_size)
 
 
 def batch_face_locations(images, number_of_times_to_upsample=1, batch_size=128):
@@ -157,10 +235,10 @@ def _raw_face_landmarks(face_image, face_locations=None, model="large"):
     else:
         face_locations = [_css_to_rect(face_location) for face_location in face_locations]
 
-    pose_predictor = pose_predictor_68_point
-
     if model == "small":
-        pose_predictor = pose_predictor_5_point
+        pose_predictor = _get_model("pose_predictor_5_point")
+    else:
+        pose_predictor = _get_model("pose_predictor_68_point")
 
     return [pose_predictor(face_image, face_location) for face_location in face_locations]
 
@@ -211,7 +289,34 @@ def face_encodings(face_image, known_face_locations=None, num_jitters=1, model="
     :return: A list of 128-dimensional face encodings (one for each face in the image)
     """
     raw_landmarks = _raw_face_landmarks(face_image, known_face_locations, model)
-    return [np.array(face_encoder.compute_face_descriptor(face_image, raw_landmark_set, num_jitters)) for raw_landmark_set in raw_landmarks]
+    return [np.array(_get_model("face_encoder").compute_face_descriptor(face_image, raw_landmark_set, num_jitters)) for raw_landmark_set in raw_landmarks]
+
+
+def batch_face_encodings(images, locations_per_image=None, num_jitters=1, model="small"):
+    """
+    Given a list of images, return the 128-dimension face encodings for every face in every image. All faces
+    go through the face encoder in a single dlib call instead of one call per face.
+
+    :param images: A list of images (each as a numpy array)
+    :param locations_per_image: Optional - for each image, the bounding boxes of its faces if you already know them.
+    :param num_jitters: How many times to re-sample the face when calculating encoding. Higher is more accurate, but slower (i.e. 100 is 100x slower)
+    :param model: Optional - which model to use. "large" (default) or "small" which only returns 5 points but is faster.
+    :return: A list (one per image) of lists of 128-dimensional face encodings (one for each face in that image)
+    """
+    if locations_per_image is None:
+        locations_per_image = [None] * len(images)
+    if len(locations_per_image) != len(images):
+        raise ValueError("locations_per_image must have one entry per image.")
+
+    batch_faces = [dlib.full_object_detections(_raw_face_landmarks(image, locations, model))
+                   for image, locations in zip(images, locations_per_image)]
+    face_encoder = _get_model("face_encoder")
+    try:
+        batch = face_encoder.compute_face_descriptor(list(images), batch_faces, num_jitters)
+    except TypeError:
+        # dlib builds without the batch overload: one call per image instead
+        batch = [face_encoder.compute_face_descriptor(image, faces, num_jitters) for image, faces in zip(images, batch_faces)]
+    return [[np.array(encoding) for encoding in encodings] for encodings in batch]
 
 
 def compare_faces(known_face_encodings, face_encoding_to_check, tolerance=0.6):
@@ -11,6 +11,10 @@ Tests for `face_recognition` module.
 
 import unittest
 import os
+import sys
+import subprocess
+import threading
+import tracemalloc
 import numpy as np
 from click.testing import CliRunner
 
@@ -159,6 +163,29 @@ class Test_face_recognition(unittest.TestCase):
         self.assertEqual(len(encodings), 1)
         self.assertEqual(len(encodings[0]), 128)
 
+    def test_batch_face_encodings(self):
+        img_a = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama.jpg'))
+        img_b = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'biden.jpg'))
+        blank = np.zeros((100, 100, 3), dtype=np.uint8)
+
+        encodings = api.batch_face_encodings([img_a, blank, img_b])
+
+        self.assertEqual([len(e) for e in encodings], [1, 0, 1])
+        self.assertTrue(np.allclose(encodings[0][0], api.face_encodings(img_a)[0]))
+        self.assertTrue(np.allclose(encodings[2][0], api.face_encodings(img_b)[0]))
+
+    def test_batch_face_encodings_known_locations(self):
+        img = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama.jpg'))
+        locations = api.face_locations(img)
+
+        encodings = api.batch_face_encodings([img, img], [locations, []])
+
+        self.assertEqual([len(e) for e in encodings], [1, 0])
+        self.assertTrue(np.allclose(encodings[0][0], api.face_encodings(img, locations)[0]))
+
+        with self.assertRaises(ValueError):
+            api.batch_face_encodings([img, img], [locations])
+
     def test_face_distance(self):
         img_a1 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama.jpg'))
         img_a2 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama2.jpg'))
@@ -203,6 +230,54 @@ class Test_face_recognition(unittest.TestCase):
         self.assertEqual(type(distance_results), np.ndarray)
         self.assertEqual(len(distance_results), 0)
 
+    def test_packed_face_distance(self):
+        img_a1 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama.jpg'))
+        img_a2 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama2.jpg'))
+        img_b1 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'biden.jpg'))
+
+        known = [api.face_encodings(img_a2)[0], api.face_encodings(img_b1)[0]]
+        probe = api.face_encodings(img_a1)[0]
+        matrix, sq_norms = api.pack_face_encodings(known)
+
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertEqual(matrix.shape, (2, 128))
+        distance_results = api.packed_face_distance(matrix, sq_norms, probe)
+        self.assertTrue(np.allclose(distance_results, api.face_distance(known, probe), atol=1e-4))
+        self.assertLessEqual(distance_results[0], 0.6)
+        self.assertGreater(distance_results[1], 0.6)
+
+        # a batch of probes gives one row per probe, written into the given buffer
+        out = np.empty((2, 2), dtype=np.float32)
+        batch_results = api.packed_face_distance(matrix, sq_norms, np.array([probe, known[1]]), out=out)
+        self.assertIs(batch_results, out)
+        self.assertTrue(np.allclose(batch_results[0], distance_results, atol=1e-4))
+        self.assertLess(batch_results[1, 1], 1e-3)
+
+    def test_packed_face_distance_empty_gallery(self):
+        matrix, sq_norms = api.pack_face_encodings([])
+
+        distance_results = api.packed_face_distance(matrix, sq_norms, np.zeros(128))
+        self.assertEqual(type(distance_results), np.ndarray)
+        self.assertEqual(len(distance_results), 0)
+
+    def test_packed_face_distance_does_not_allocate_arrays(self):
+        rng = np.random.RandomState(0)
+        matrix, sq_norms = api.pack_face_encodings(rng.normal(scale=0.1, size=(1000, 128)))
+        probe = rng.normal(scale=0.1, size=128).astype(np.float32)
+        out = np.empty(1000, dtype=np.float32)
+        api.packed_face_distance(matrix, sq_norms, probe, out=out)
+
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            api.packed_face_distance(matrix, sq_norms, probe, out=out)
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+        # a 1000-row distance array alone would be 4000 bytes
+        self.assertLess(peak, 2048)
+
     def test_compare_faces(self):
         img_a1 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama.jpg'))
         img_a2 = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama2.jpg'))
@@ -245,6 +320,35 @@ class Test_face_recognition(unittest.TestCase):
         self.assertEqual(type(match_results), list)
         self.assertListEqual(match_results, [])
 
+    def test_models_not_loaded_at_import(self):
+        code = "import face_recognition; from face_recognition import api; print(sorted(api._models))"
+        output = subprocess.check_output([sys.executable, "-c", code], universal_newlines=True)
+        self.assertEqual(output.strip(), "[]")
+
+    def test_models_load_on_first_use(self):
+        img = api.load_image_file(os.path.join(os.path.dirname(__file__), 'test_images', 'obama.jpg'))
+        api.face_landmarks(img, model="small")
+        self.assertIn("face_detector", api._models)
+        self.assertIn("pose_predictor_5_point", api._models)
+        self.assertIs(api.pose_predictor_5_point, api._models["pose_predictor_5_point"])
+
+    def test_lazy_model_loading_is_thread_safe(self):
+        api._models.pop("face_encoder", None)
+        loaded = []
+        threads = [threading.Thread(target=lambda: loaded.append(api.face_encoder)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(loaded), 8)
+        self.assertTrue(all(model is loaded[0] for model in loaded))
+        self.assertIs(api._get_model("face_encoder"), loaded[0])
+
+    def test_unknown_module_attribute(self):
+        with self.assertRaises(AttributeError):
+            api.not_a_model
+
     def test_command_line_interface_options(self):
         target_string = 'Show this message and exit.'
         runner = CliRunner()
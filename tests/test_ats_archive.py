@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_archive
+----------------------------------
+
+Tests for the monthly Parquet archive (`ats_archive.ColumnarArchive`).
+"""
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from io import StringIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_archive import ColumnarArchive, _pyarrow  # noqa: E402
+from ats_schema import DAILY_COLUMNS  # noqa: E402
+
+
+def _rows(first, days):
+    """Two punches a day for E1/E2 (E2 late), daily-CSV style strings."""
+    rows = []
+    for i in range(days):
+        d = (first + timedelta(days=i)).isoformat()
+        for n, (eid, clock_in, late) in enumerate((("E1", "08:30:00 AM", "FALSE"),
+                                                   ("E2", "09:15:00 AM", "TRUE")), 1):
+            row = dict.fromkeys(DAILY_COLUMNS, "")
+            row.update(id=f"{eid}-{d}-{n}", employee_id=eid, full_name=eid, attendance_date=d,
+                       clock_in=clock_in, clock_out="05:00:00 PM", is_late=late, is_absent="FALSE")
+            rows.append(row)
+    return rows
+
+
+@unittest.skipIf(_pyarrow() is None, "pyarrow not installed")
+class Test_columnar_archive(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="ats_archive_test_")
+        self.rows = _rows(date(2025, 8, 25), 20)           # 2025-08-25 .. 2025-09-13
+        self.calls = []
+        self.archive = ColumnarArchive(os.path.join(self.dir, "archive"), self._fallback)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _fallback(self, start, end):
+        self.calls.append((start, end))
+        rows = [r for r in self.rows if start.isoformat() <= r["attendance_date"] < end.isoformat()]
+        return pd.DataFrame(rows, columns=DAILY_COLUMNS)
+
+    def _compact(self, through=date(2025, 9, 10)):
+        with redirect_stdout(StringIO()) as out:
+            n = self.archive.compact(date(2025, 8, 25), through)
+        return n, out.getvalue()
+
+    def _load(self, archive, start, end, **kw):
+        with redirect_stdout(StringIO()):
+            return archive.load_range(start, end, **kw)
+
+    def test_compact_writes_month_files_and_manifest(self):
+        self.assertEqual(self._compact()[0], 2)
+        with open(os.path.join(self.dir, "archive", "manifest.json")) as f:
+            self.assertEqual(json.load(f), {"2025-08": "2025-08-31", "2025-09": "2025-09-10"})
+        self.assertEqual(self._compact()[0], 0)              # nothing new
+        reopened = ColumnarArchive(self.archive.root, self._fallback)
+        self.assertEqual(reopened.covered_through(date(2025, 9, 1)), date(2025, 9, 10))
+        self.assertIsNone(reopened.covered_through(date(2025, 10, 1)))
+
+    def test_load_range_matches_the_fallback(self):
+        self._compact()
+        plain = ColumnarArchive(os.path.join(self.dir, "empty"), self._fallback)
+        start, end = date(2025, 8, 28), date(2025, 9, 13)
+        filters = [("is_late", "==", True), ("attendance_date", ">=", date(2025, 9, 1)),
+                   ("clock_in", ">", 9 * 3600)]
+        for kw in ({}, {"columns": ["attendance_date", "employee_id", "clock_in"]},
+                   {"columns": ["id", "clock_in"], "filters": filters}):
+            got = self._load(self.archive, start, end, **kw)
+            want = self._load(plain, start, end, **kw)
+            pd.testing.assert_frame_equal(got.astype(str), want.astype(str))
+            self.assertEqual(list(got.columns), kw.get("columns", DAILY_COLUMNS))
+
+        full = self._load(self.archive, start, end)
+        self.assertTrue(full["time_corrected"].isna().all())    # never set: stays empty, not FALSE
+        self.assertEqual(full["is_late"].sum(), 16)
+
+        got = self._load(self.archive, start, end, columns=["id", "clock_in"], filters=filters)
+        self.assertEqual(got["id"].tolist(), [f"E2-2025-09-{d:02d}-2" for d in range(1, 13)])
+
+    def test_only_uncovered_days_hit_the_fallback(self):
+        self._compact()
+        self.calls.clear()
+        self._load(self.archive, date(2025, 8, 25), date(2025, 9, 14), columns=["id"])
+        self.assertEqual(self.calls, [(date(2025, 9, 11), date(2025, 9, 14))])
+
+    def test_invalidate_pulls_coverage_back(self):
+        self._compact()
+        self.archive.invalidate(date(2025, 9, 5))
+        self.assertEqual(self.archive.covered_through(date(2025, 9, 1)), date(2025, 9, 4))
+        self.archive.invalidate(date(2025, 8, 1))
+        self.assertIsNone(self.archive.covered_through(date(2025, 8, 1)))
+        self.archive.invalidate(date(2025, 10, 3))           # not archived: nothing to do
+
+        self.rows = [dict(r, clock_out="06:00:00 PM") if r["attendance_date"] == "2025-09-05" else r
+                     for r in self.rows]
+        got = self._load(self.archive, date(2025, 9, 5), date(2025, 9, 6), columns=["clock_out"])
+        self.assertEqual(got["clock_out"].tolist(), [18 * 3600] * 2)
+
+    def test_invalidate_during_compact_is_not_lost(self):
+        def racing_fallback(start, end):
+            df = self._fallback(start, end)                  # read before the rewrite...
+            if start.month == 9 and len(self.calls) == 2:
+                self.rows = [dict(r, clock_out="06:00:00 PM") if r["attendance_date"] == "2025-09-05" else r
+                             for r in self.rows]
+                self.archive.invalidate(date(2025, 9, 5))   # ...which lands before compact() publishes
+            return df
+        self.archive.fallback = racing_fallback
+
+        n, out = self._compact()
+        self.assertEqual(n, 1)
+        self.assertIn("left for the next run", out)
+        self.assertIsNone(self.archive.covered_through(date(2025, 9, 1)))
+        self.assertFalse(os.path.exists(self.archive.path(date(2025, 9, 1)) + ".tmp"))
+        got = self._load(self.archive, date(2025, 9, 5), date(2025, 9, 6), columns=["clock_out"])
+        self.assertEqual(got["clock_out"].tolist(), [18 * 3600] * 2)
+
+        self.assertEqual(self._compact()[0], 1)
+        self.assertEqual(self.archive.covered_through(date(2025, 9, 1)), date(2025, 9, 10))
+        self.calls.clear()
+        got = self._load(self.archive, date(2025, 9, 5), date(2025, 9, 6), columns=["clock_out"])
+        self.assertEqual(got["clock_out"].tolist(), [18 * 3600] * 2)
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
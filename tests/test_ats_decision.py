@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_decision
+----------------------------------
+
+Tests for the per-attempt decision rules (`ats_decision`).
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_decision import ACCEPT, REJECT, StreakDecision, SequentialDecision, DecisionStats  # noqa: E402
+
+
+def _feed(decision, frames, limit=20):
+    """observe() (eid, best, second) frames, cycling, until a decision; (outcome, frames used)."""
+    for n in range(1, limit + 1):
+        eid, best, second = frames[(n - 1) % len(frames)]
+        outcome = decision.observe(eid, best, second)
+        if outcome:
+            return outcome, n
+    return None, limit
+
+
+class Test_streak_decision(unittest.TestCase):
+
+    def test_accepts_after_streak_votes(self):
+        d = StreakDecision(tolerance=0.41, margin=0.05, streak=2)
+        self.assertIsNone(d.observe("E1", 0.30, 0.60))
+        self.assertEqual(d.observe("E1", 0.35, 0.60), ACCEPT)
+        self.assertEqual(d.winner, "E1")
+        self.assertAlmostEqual(d.confidence, 0.70)
+
+    def test_tolerance_and_margin_block_votes(self):
+        d = StreakDecision(tolerance=0.41, margin=0.05, streak=2)
+        self.assertEqual(_feed(d, [("E1", 0.42, 0.60)]), (None, 20))
+        self.assertEqual(_feed(d, [("E1", 0.30, 0.33)]), (None, 20))
+        self.assertEqual(d.scores, {})
+
+    def test_weights_scale_votes(self):
+        d = StreakDecision(streak=2)
+        self.assertIsNone(d.observe("E1", 0.30, None, weight=0.5))
+        self.assertIsNone(d.observe("E1", 0.30, None, weight=0.5))
+        self.assertIsNone(d.observe("E1", 0.30, None, weight=0.5))
+        self.assertEqual(d.observe("E1", 0.30, None, weight=0.5), ACCEPT)
+
+    def test_hold_open_stops_one_short(self):
+        d = StreakDecision(streak=2)
+        for _ in range(3):
+            d.observe("E1", 0.30, None)
+        d.hold_open()
+        self.assertIsNone(d.winner)
+        self.assertEqual(d.scores["E1"], 1)
+        self.assertEqual(d.observe("E1", 0.30, None), ACCEPT)
+
+
+class Test_sequential_decision(unittest.TestCase):
+
+    def test_clear_match_accepts_fast(self):
+        self.assertEqual(_feed(SequentialDecision(), [("E1", 0.30, 0.70)]), (ACCEPT, 1))
+        self.assertEqual(_feed(SequentialDecision(), [("E1", 0.38, 0.70)]), (ACCEPT, 2))
+
+    def test_impostor_rejected_after_min_frames(self):
+        d = SequentialDecision(min_reject_frames=2)
+        self.assertIsNone(d.observe("E1", 0.70, 0.80))
+        self.assertEqual(d.observe("E1", 0.70, 0.80), REJECT)
+
+    def test_no_positive_evidence_beyond_tolerance(self):
+        d = SequentialDecision(tolerance=0.41)
+        for dist in (0.42, 0.43, 0.45):
+            self.assertLessEqual(d.llr(dist), 0.0)
+        self.assertGreater(d.llr(0.41), 0.0)
+        self.assertEqual(_feed(SequentialDecision(tolerance=0.41), [("E1", 0.43, 0.70)], limit=50), (None, 50))
+        # without the clamp the Gaussians would accept the same probe
+        self.assertEqual(_feed(SequentialDecision(tolerance=None), [("E1", 0.43, 0.70)], limit=50)[0], ACCEPT)
+
+    def test_close_runner_up_adds_no_evidence_for(self):
+        d = SequentialDecision()
+        self.assertEqual(_feed(d, [("E1", 0.30, 0.32)]), (None, 20))
+        self.assertEqual(d.scores, {})
+        self.assertEqual(d.observed, 0)
+
+    def test_hold_open_keeps_evidence_inside_the_bounds(self):
+        d = SequentialDecision()
+        self.assertEqual(d.observe("E1", 0.28, 0.70), ACCEPT)
+        d.observe("E2", 0.80, 0.90)
+        d.hold_open()
+        self.assertIsNone(d.winner)
+        self.assertTrue(all(d.lower < v < d.upper for v in d.scores.values()))
+        self.assertEqual(d.observe("E1", 0.30, 0.70), ACCEPT)
+
+    def test_expected_frames(self):
+        asn = SequentialDecision().expected_frames()
+        self.assertGreater(asn["genuine"], 0.0)
+        self.assertGreater(asn["impostor"], 0.0)
+        self.assertLess(asn["genuine"], 2.0)
+
+
+class Test_decision_stats(unittest.TestCase):
+
+    def test_summary_per_outcome(self):
+        stats = DecisionStats()
+        for outcome, frames in ((ACCEPT, 1), (ACCEPT, 3), (REJECT, 2)):
+            stats.record(outcome, frames)
+        s = stats.summary()
+        self.assertEqual(s["all"]["count"], 3)
+        self.assertEqual(s[ACCEPT]["mean_frames"], 2.0)
+        self.assertEqual(s[REJECT]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_enroll
+----------------------------------
+
+Tests for the incremental enrollment sync (`ats_enroll.sync_enrollment`).
+The encoder pool is replaced by a stub, so no photo is actually decoded.
+"""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ats_enroll  # noqa: E402
+
+
+class Test_sync_enrollment(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="ats_enroll_test_")
+        self.root = os.path.join(self.dir, "employees")
+        self.chips = os.path.join(self.dir, "chips")
+        self.manifest = os.path.join(self.root, "manifest.pickle")
+        os.makedirs(os.path.join(self.root, "Ada_Obi"))
+        os.makedirs(self.chips)
+        self.failing = set()
+        self._real_pool = ats_enroll.encode_in_pool
+        ats_enroll.encode_in_pool = self._stub_pool
+        self._write("p1.jpg", b"photo one")
+        self._write("p2.jpg", b"photo two")
+
+    def tearDown(self):
+        ats_enroll.encode_in_pool = self._real_pool
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write(self, name, data):
+        with open(os.path.join(self.root, "Ada_Obi", name), "wb") as f:
+            f.write(data)
+
+    def _stub_pool(self, jobs, chip_dir=None, **kw):
+        """Like encode_in_pool: the chip is cached before the encoder runs (and may fail)."""
+        for key, path, sha in jobs:
+            with open(os.path.join(chip_dir, sha + ".json"), "w") as f:
+                f.write("{}")
+            if key in self.failing:
+                yield key, None, "encoder failed", {}
+            else:
+                yield key, np.full(128, len(key), dtype=np.float64), None, {}
+
+    def _sync(self):
+        with redirect_stdout(StringIO()):
+            return ats_enroll.sync_enrollment(self.root, self.manifest, processes=1, chip_dir=self.chips)
+
+    def _chip_shas(self):
+        return {n.split(".", 1)[0] for n in os.listdir(self.chips)}
+
+    def test_unchanged_tree_encodes_nothing(self):
+        first = self._sync()
+        self.assertEqual(first.stats["encoded"], 2)
+        second = self._sync()
+        self.assertEqual(second.stats["reused"], 2)
+        self.assertEqual(second.stats["encoded"], 0)
+        self.assertEqual(len(second.encodings), 2)
+
+    def test_failed_photo_is_not_removed_and_keeps_its_chip(self):
+        self._sync()
+        self._write("p2.jpg", b"photo two, retaken")
+        self.failing.add(os.path.join("Ada_Obi", "p2.jpg"))
+        result = self._sync()
+        new_sha = ats_enroll.file_sha1(os.path.join(self.root, "Ada_Obi", "p2.jpg"))
+
+        self.assertEqual(result.stats["failed"], 1)
+        self.assertEqual(result.stats["removed"], 0)
+        self.assertIn(new_sha, self._chip_shas())
+
+        self.failing.clear()   # retried (from the cached chip) on the next sync
+        self.assertEqual(self._sync().stats["encoded"], 1)
+
+    def test_deleted_photo_is_removed_and_its_chip_pruned(self):
+        self._sync()
+        gone = ats_enroll.file_sha1(os.path.join(self.root, "Ada_Obi", "p1.jpg"))
+        os.remove(os.path.join(self.root, "Ada_Obi", "p1.jpg"))
+        result = self._sync()
+
+        self.assertEqual(result.stats["removed"], 1)
+        self.assertNotIn(gone, self._chip_shas())
+        self.assertEqual(len(result.encodings), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_gallery
+----------------------------------
+
+Tests for the packed gallery matcher (`ats_gallery`), against the per-row
+Python loop recognize_face used before it.
+"""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_gallery import GalleryIndex, Gallery, IVFIndex, save_gallery, load_gallery  # noqa: E402
+
+
+def _loop_match(encodings, ids, probe):
+    """The old recognize_face matching: per-ID minimum over face_distance rows."""
+    dists = np.linalg.norm(np.asarray(encodings) - probe, axis=1)
+    per_id_min = {}
+    for idx, dist in enumerate(dists):
+        eid_k = str(ids[idx])
+        cur = per_id_min.get(eid_k, 1e9)
+        if dist < cur:
+            per_id_min[eid_k] = float(dist)
+
+    best_eid, best = min(per_id_min.items(), key=lambda kv: kv[1])
+    others = [v for k, v in per_id_min.items() if k != best_eid]
+    second = min(others) if others else None
+    return best_eid, best, second
+
+
+def _gallery(rng, employees=12, max_rows=5):
+    """Encodings with a random number of rows per employee, employees interleaved."""
+    centres = rng.normal(0.0, 0.1, (employees, 128))
+    ids = [eid for eid in range(employees) for _ in range(rng.integers(1, max_rows + 1))]
+    ids = [ids[i] for i in rng.permutation(len(ids))]
+    ids = [f"E{eid}" if eid % 2 else eid for eid in ids]    # int and str IDs, as read from disk
+    encodings = [centres[int(str(eid).lstrip("E"))] + rng.normal(0.0, 0.03, 128) for eid in ids]
+    return encodings, ids
+
+
+class Test_gallery_index(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(11)
+        self.encodings, self.ids = _gallery(self.rng)
+        rows = np.asarray(self.encodings)
+        # probes near enrolled rows, between two employees (off the exact tie), and far from everyone
+        self.probes = np.concatenate([rows[:8] + self.rng.normal(0.0, 0.02, (8, 128)),
+                                      0.45 * rows[:4] + 0.55 * rows[-4:],
+                                      self.rng.normal(0.0, 0.1, (4, 128))])
+
+    def _assert_same(self, got, want):
+        self.assertEqual(got[0], want[0])
+        self.assertAlmostEqual(got[1], want[1], places=5)
+        if want[2] is None:
+            self.assertIsNone(got[2])
+        else:
+            self.assertAlmostEqual(got[2], want[2], places=5)
+
+    def test_match_equals_the_loop(self):
+        index = GalleryIndex(self.encodings, self.ids)
+        self.assertEqual(index.num_ids, 12)
+        for probe in self.probes:
+            self._assert_same(index.match(probe), _loop_match(self.encodings, self.ids, probe))
+
+    def test_match_many_equals_the_loop(self):
+        best_ids, best, second = GalleryIndex(self.encodings, self.ids).match_many(self.probes)
+        for i, probe in enumerate(self.probes):
+            self._assert_same((best_ids[i], float(best[i]), float(second[i])),
+                              _loop_match(self.encodings, self.ids, probe))
+
+    def test_saved_gallery_and_full_ivf_scan_equal_the_loop(self):
+        tmp = tempfile.mkdtemp(prefix="ats_gallery_test_")
+        try:
+            path = os.path.join(tmp, "gallery.bin")
+            save_gallery(path, Gallery(GalleryIndex(self.encodings, self.ids)))
+            loaded = load_gallery(path)
+            ivf = IVFIndex(loaded.index, nlist=4, nprobe=4)
+            for probe in self.probes:
+                want = _loop_match(self.encodings, self.ids, probe)
+                self._assert_same(loaded.match(probe), want)
+                self._assert_same(ivf.match(probe), want)
+            del loaded, ivf   # release the memmap before the directory goes
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def test_one_employee_has_no_runner_up(self):
+        encs, ids = self.encodings[:3], ["E1"] * 3
+        index = GalleryIndex(encs, ids)
+        self._assert_same(index.match(self.probes[0]), _loop_match(encs, ids, self.probes[0]))
+        self.assertTrue(np.isnan(index.match_many(self.probes[:2])[2]).all())
+
+    def test_empty_and_mismatched(self):
+        self.assertEqual(GalleryIndex([], []).match(self.probes[0]), (None, None, None))
+        self.assertEqual(GalleryIndex([], []).match_many(self.probes[:2])[0], [None, None])
+        with self.assertRaises(ValueError):
+            GalleryIndex(self.encodings, self.ids[:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_journal
+----------------------------------
+
+Tests for the punch journal and its compaction (`ats_journal`), and for the
+csv backend of `ats_attendance` that relies on them.
+"""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_journal import DayJournal, DayLedger, Compactor  # noqa: E402
+
+DAY = date(2025, 9, 22)
+
+
+def _row(rid, employee_id="E1", **fields):
+    row = {"id": rid, "employee_id": employee_id, "attendance_date": DAY.isoformat(),
+           "clock_in": "08:30:00 AM", "clock_out": ""}
+    row.update(fields)
+    return row
+
+
+class Test_day_journal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="ats_journal_test_")
+        self.journal = DayJournal(os.path.join(self.dir, "journal"), fsync=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_replay_keeps_the_last_record_per_id(self):
+        self.journal.append(DAY, _row("E1-1"))
+        self.journal.append(DAY, _row("E2-1", employee_id="E2"))
+        self.journal.append(DAY, _row("E1-1", clock_out="05:00:00 PM"))
+        rows = self.journal.replay(DAY)
+
+        self.assertEqual(list(rows), ["E1-1", "E2-1"])
+        self.assertEqual(rows["E1-1"]["clock_out"], "05:00:00 PM")
+        self.assertEqual(self.journal.days(), [DAY])
+        self.assertEqual(self.journal.replay(date(2025, 9, 23)), {})
+
+    def test_torn_last_line_is_skipped_and_appends_recover(self):
+        self.journal.append(DAY, _row("E1-1"))
+        with open(self.journal.path(DAY), "a", encoding="utf-8") as f:
+            f.write('{"v": 1, "row": {"id": "E2-1", "empl')            # crash mid-append
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(list(self.journal.replay(DAY)), ["E1-1"])
+        self.assertEqual(out.getvalue(), "")                          # a torn tail is expected, not reported
+
+        self.journal.append(DAY, _row("E2-1", employee_id="E2"))     # after the restart
+        with redirect_stdout(StringIO()) as out:
+            rows = self.journal.replay(DAY)
+        self.assertEqual(list(rows), ["E1-1", "E2-1"])
+        self.assertIn("skipping unreadable record", out.getvalue())
+
+    def test_discard(self):
+        self.journal.append(DAY, _row("E1-1"))
+        self.journal.discard(DAY)
+        self.assertFalse(self.journal.has(DAY))
+        self.assertEqual(self.journal.days(), [])
+        self.journal.discard(DAY)                                     # no journal: no error
+
+
+class Test_day_ledger(unittest.TestCase):
+
+    def test_lookups(self):
+        ledger = DayLedger(DAY, [_row("E1-1", clock_out="12:00:00 PM"), _row("E1-2"),
+                                 _row("7-3", employee_id=7)])
+        self.assertEqual(len(ledger), 3)
+        self.assertTrue(ledger.has("E1"))
+        self.assertTrue(ledger.has(7) and ledger.has("7"))
+        self.assertFalse(ledger.has("E9"))
+        self.assertEqual(ledger.open_row("E1")["id"], "E1-2")
+        self.assertIsNone(ledger.open_row("E9"))
+
+    def test_put_replaces_in_place(self):
+        ledger = DayLedger(DAY, [_row("E1-1"), _row("E1-2", clock_out="01:00:00 PM")])
+        ledger.put(_row("E1-1", clock_out="05:00:00 PM"))
+        self.assertEqual(len(ledger), 2)
+        self.assertEqual([r["id"] for r in ledger.rows_for("E1")], ["E1-1", "E1-2"])
+        self.assertIsNone(ledger.open_row("E1"))
+
+
+class Test_compactor(unittest.TestCase):
+
+    def test_burst_is_compacted_once_after_the_delay(self):
+        calls, done = [], threading.Event()
+
+        def fn(key):
+            calls.append(key)
+            done.set()
+
+        compactor = Compactor(fn, delay=0.05)
+        for _ in range(5):
+            compactor.schedule(DAY)
+        self.assertEqual(compactor.pending(), [DAY])
+        self.assertTrue(done.wait(2.0))
+        compactor.stop(flush=False)
+        self.assertEqual(calls, [DAY])
+
+    def test_stop_flushes_pending_keys(self):
+        calls = []
+        compactor = Compactor(calls.append, delay=60.0)
+        compactor.schedule(DAY)
+        compactor.schedule(date(2025, 9, 21))
+        compactor.stop()
+        compactor.schedule(date(2025, 9, 23))                         # ignored once stopped
+        self.assertEqual(calls, [date(2025, 9, 21), DAY])
+        self.assertEqual(compactor.pending(), [])
+
+
+class Test_csv_backend(unittest.TestCase):
+    """Punches journaled over the daily CSV (ATTENDANCE_BACKEND = "csv")."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp(prefix="ats_journal_csv_test_")
+        os.environ["ATS_BASE_DIR"] = cls.dir
+        import ats_attendance
+        cls.ats = ats_attendance
+        cls._backend = ats_attendance.ATTENDANCE_BACKEND
+        ats_attendance.ATTENDANCE_BACKEND = "csv"
+        ats_attendance.WRITE_DAILY_PDF = False
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ats.compactor.stop(flush=False)
+        cls.ats.ATTENDANCE_BACKEND = cls._backend
+        shutil.rmtree(cls.dir, ignore_errors=True)
+
+    def setUp(self):
+        self.day = self.ats._today()
+        self.ats._ledger = None
+        for p in (self.ats._attendance_path(self.day), self.ats.journal.path(self.day)):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def _csv_row(self, rid, employee_id, **fields):
+        row = dict.fromkeys(self.ats.DAILY_HEADERS, "")
+        row.update(id=rid, employee_id=employee_id, full_name=employee_id,
+                   attendance_date=self.day.isoformat(), **fields)
+        return row
+
+    def _write_csv(self, rows):
+        import pandas as pd
+        pd.DataFrame(rows, columns=self.ats.DAILY_HEADERS).to_csv(self.ats._attendance_path(self.day), index=False)
+
+    def test_journal_replays_over_the_csv(self):
+        self._write_csv([self._csv_row("E1-x-1", "E1", clock_in="08:00:00 AM"),
+                         self._csv_row("E2-x-2", "E2", clock_in="08:10:00 AM")])
+        self.ats.journal.append(self.day, self._csv_row("E1-x-1", "E1", clock_in="08:00:00 AM",
+                                                        clock_out="05:00:00 PM"))
+        self.ats.journal.append(self.day, self._csv_row("E3-x-3", "E3", clock_in="09:30:00 AM"))
+        df = self.ats._read_daily(self.day)
+
+        self.assertEqual(df["id"].tolist(), ["E1-x-1", "E2-x-2", "E3-x-3"])
+        self.assertEqual(df["clock_out"].tolist(), ["05:00:00 PM", "", ""])
+
+    def test_compaction_writes_the_csv_and_discards_the_journal(self):
+        self._write_csv([self._csv_row("E2-x-1", "E2", clock_in="08:10:00 AM")])
+        self.ats.journal.append(self.day, self._csv_row("E3-x-2", "E3", clock_in="09:30:00 AM"))
+        with redirect_stdout(StringIO()):
+            self.assertTrue(self.ats.compact_day(self.day, refresh_week=False))
+
+        self.assertFalse(self.ats.journal.has(self.day))
+        self.assertEqual(self.ats._read_daily(self.day)["id"].tolist(), ["E2-x-1", "E3-x-2"])
+        with redirect_stdout(StringIO()):
+            self.assertFalse(self.ats.compact_day(self.day, refresh_week=False))   # nothing pending
+
+    def _punch(self, employee_id, log_type):
+        with redirect_stdout(StringIO()):
+            return self.ats.LocalAttendanceManager().log_attendance(employee_id, employee_id, log_type)
+
+    def _restart(self):
+        """Drop the resident ledger, as a kiosk restart would."""
+        self.ats._ledger = None
+
+    def test_ledger_rebuilt_from_csv_and_journal(self):
+        self._write_csv([self._csv_row(f"E2-{self.day}-1", "E2", clock_in="08:10:00 AM")])
+        self.assertTrue(self._punch("E1", "Check-In"))
+        self._restart()
+
+        self.assertEqual(self._punch("E1", "Check-In"), "locked")    # journaled check-in
+        self.assertEqual(self._punch("E2", "Check-In"), "locked")    # row in the CSV
+        self.assertEqual(self._punch("E3", "Check-Out"), "duplicate")
+        self.assertTrue(self._punch("E1", "Check-Out"))              # open row from the journal
+        self._restart()
+        self.assertEqual(self._punch("E1", "Check-Out"), "locked")
+
+        with redirect_stdout(StringIO()):
+            self.ats.compact_day(self.day, refresh_week=False)
+        self._restart()
+        ledger = self.ats._day_ledger(self.day)
+        self.assertEqual(len(ledger), 2)
+        self.assertIsNone(ledger.open_row("E1"))
+        self.assertEqual(ledger.open_row("E2")["clock_in"], "08:10:00 AM")
+        self.assertTrue(self._punch("E2", "Check-Out"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_schema
+----------------------------------
+
+Tests for the typed attendance frame (`ats_schema`).
+"""
+
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_schema import (DAILY_COLUMNS, NO_TIME, clock_seconds, typed_frame, legacy_frame,  # noqa: E402
+                        clock_strings, duration_strings)
+
+
+def _row(**fields):
+    row = dict.fromkeys(DAILY_COLUMNS, "")
+    row.update(fields)
+    return row
+
+
+class Test_clock_parsing(unittest.TestCase):
+
+    def test_12_hour(self):
+        s = pd.Series(["08:30:00 AM", "12:00:00 AM", "12:15:30 PM", "11:59:59 PM", " 05:00:00 pm "])
+        self.assertEqual(clock_seconds(s).tolist(), [30600, 0, 44130, 86399, 61200])
+
+    def test_legacy_24_hour(self):
+        s = pd.Series(["14:05:00", "00:00:01", "08:30:00 AM", "23:59:59"])
+        self.assertEqual(clock_seconds(s).tolist(), [50700, 1, 30600, 86399])
+
+    def test_empty_and_unreadable(self):
+        s = pd.Series(["", None, np.nan, "  ", "25:00:00", "noon"], dtype=object)
+        self.assertEqual(clock_seconds(s).tolist(), [NO_TIME] * 6)
+        self.assertEqual(clock_seconds(s).dtype, np.int32)
+
+    def test_formatting(self):
+        secs = pd.Series([0, 30600, 44130, 86399, NO_TIME])
+        self.assertEqual(clock_strings(secs).tolist(),
+                         ["12:00:00 AM", "08:30:00 AM", "12:15:30 PM", "11:59:59 PM", ""])
+        self.assertEqual(duration_strings(pd.Series([30600.4, 59.6])).tolist(), ["8:30:00", "0:01:00"])
+
+
+class Test_typed_frame(unittest.TestCase):
+
+    ROWS = [
+        _row(id="E1-2025-09-22-1", employee_id="E1", full_name="Ada Obi", attendance_date="2025-09-22",
+             clock_in="08:30:00 AM", clock_out="05:00:00 PM", total_hours="8.50", total_minutes="510.00",
+             duration="8:30:00", is_late="FALSE", is_absent="FALSE", method="face", time_quality="SANE",
+             mono_in_ns="123456789", mono_out_ns="223456789", boot_id="b1", time_corrected="TRUE"),
+        _row(id="E2-2025-09-22-A", employee_id="E2", full_name="Bola Ade", attendance_date="2025-09-22",
+             total_hours="0.00", total_minutes="0.00", is_late="FALSE", is_absent="TRUE"),
+        _row(id="E3-2025-09-22-3", employee_id="E3", full_name="Chi Eze", attendance_date="2025-09-22",
+             clock_in="09:15:00 AM", is_late="TRUE"),   # legacy: no is_absent/time_corrected
+    ]
+
+    def test_types(self):
+        typed = typed_frame(pd.DataFrame(self.ROWS))
+        self.assertEqual(list(typed.columns), DAILY_COLUMNS)
+        self.assertEqual(typed["clock_in"].tolist(), [30600, NO_TIME, 33300])
+        self.assertEqual(typed["employee_id"].dtype, "category")
+        self.assertEqual(typed["mono_out_ns"].tolist(), [223456789, NO_TIME, NO_TIME])
+        self.assertEqual(typed["is_late"].tolist(), [False, False, True])
+        self.assertTrue(pd.isna(typed["is_absent"].iloc[2]))
+        self.assertTrue(np.isnan(typed["total_hours"].iloc[2]))
+
+    def test_legacy_frame_round_trip(self):
+        df = pd.DataFrame(self.ROWS, columns=DAILY_COLUMNS)
+        pd.testing.assert_frame_equal(legacy_frame(typed_frame(df)), df)
+
+    def test_legacy_rows_are_normalized(self):
+        df = pd.DataFrame([_row(clock_in="14:05:00", total_hours="8.5", is_late="true", attendance_date="2025-09-22")],
+                          columns=DAILY_COLUMNS)
+        out = legacy_frame(typed_frame(df)).iloc[0]
+        self.assertEqual((out["clock_in"], out["total_hours"], out["is_late"]), ("02:05:00 PM", "8.50", "TRUE"))
+        self.assertEqual((out["clock_out"], out["is_absent"], out["mono_in_ns"]), ("", "", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_store
+----------------------------------
+
+Tests for the CSV -> SQLite attendance import (`ats_store`).
+"""
+
+
+import os
+import csv
+import sys
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_store import AttendanceStore, import_csv_history  # noqa: E402
+
+COLUMNS = [
+    "id", "employee_id", "full_name", "attendance_date",
+    "clock_in", "clock_out", "total_hours", "total_minutes", "duration",
+    "is_late", "is_absent", "method", "created_at", "updated_at",
+    "time_quality", "mono_in_ns", "mono_out_ns", "boot_id", "time_corrected"
+]
+
+
+def _row(**fields):
+    row = dict.fromkeys(COLUMNS, "")
+    row.update(fields)
+    return row
+
+
+class Test_ats_store(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="ats_store_test_")
+        self.attend = os.path.join(self.dir, "attendance")
+        os.makedirs(self.attend)
+        self.db = os.path.join(self.attend, "attendance.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write_csv(self, day, rows, mtime=None):
+        path = os.path.join(self.attend, f"{day}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=COLUMNS)
+            w.writeheader()
+            w.writerows(rows)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def _import(self, store, force=False):
+        with redirect_stdout(StringIO()) as out:
+            n = import_csv_history(store, self.attend, force=force)
+        return n, out.getvalue()
+
+    def _history(self):
+        day1 = [_row(id="E1-2025-09-22-1", employee_id="E1", full_name="Ada Obi", attendance_date="2025-09-22",
+                     clock_in="08:30:00 AM", clock_out="05:00:00 PM", total_hours="8.50", total_minutes="510.00",
+                     duration="8:30:00", is_late="FALSE", is_absent="FALSE", time_quality="SANE"),
+                _row(employee_id="E2", full_name="Bola Ade", attendance_date="2025-09-22",
+                     clock_in="14:05:00", is_absent="FALSE")]                        # legacy: no id, 24h clock
+        day2 = [_row(id="E1-2025-09-23-A", employee_id="E1", full_name="Ada Obi", attendance_date="2025-09-23",
+                     total_hours="0.00", is_absent="TRUE")]
+        self._write_csv("2025-09-22", day1)
+        self._write_csv("2025-09-23", day2)
+        with open(os.path.join(self.attend, "notes.csv"), "w") as f:   # not a daily file
+            f.write("x\n1\n")
+        return day1, day2
+
+    def test_import_round_trip(self):
+        day1, day2 = self._history()
+        store = AttendanceStore(self.db, COLUMNS)
+        n, _ = self._import(store)
+
+        self.assertEqual(n, 3)
+        self.assertEqual(store.count(), 3)
+        got1 = store.day_rows(date(2025, 9, 22))
+        self.assertEqual(got1[0], day1[0])
+        self.assertEqual(got1[1], dict(day1[1], id="E2-2025-09-22-2"))
+        self.assertEqual(store.day_rows(date(2025, 9, 23)), day2)
+        self.assertEqual(store.range_rows(date(2025, 9, 22), date(2025, 9, 24)), got1 + day2)
+        self.assertEqual(store.range_rows(date(2025, 9, 23), date(2025, 9, 23)), [])
+        self.assertEqual(store.first_date(), date(2025, 9, 22))
+
+    def test_reimport_only_changed_files(self):
+        day1, _ = self._history()
+        store = AttendanceStore(self.db, COLUMNS)
+        self._import(store)
+        self.assertEqual(self._import(store)[0], 0)
+
+        # Day written later by the csv backend: picked up on the next open
+        self._write_csv("2025-09-24", [_row(id="E3-2025-09-24-1", employee_id="E3", attendance_date="2025-09-24",
+                                            clock_in="09:10:00 AM", is_late="TRUE")])
+        closed = dict(day1[0], clock_out="06:00:00 PM")
+        self._write_csv("2025-09-22", [closed, day1[1]], mtime=os.path.getmtime(self.db) + 5)
+        store2 = AttendanceStore(self.db, COLUMNS)
+        self.assertEqual(self._import(store2)[0], 3)
+        self.assertEqual(store2.count(), 4)
+        self.assertEqual(store2.day_rows(date(2025, 9, 22))[0]["clock_out"], "06:00:00 PM")
+        self.assertEqual(store2.day_rows(date(2025, 9, 24))[0]["employee_id"], "E3")
+
+    def test_changed_csv_replaces_its_day(self):
+        day1, day2 = self._history()
+        store = AttendanceStore(self.db, COLUMNS)
+        self._import(store)
+
+        # E2's row deleted and E1's renumbered by hand
+        renumbered = dict(day1[0], id="E1-2025-09-22-9")
+        self._write_csv("2025-09-22", [renumbered], mtime=os.path.getmtime(self.db) + 5)
+        self.assertEqual(self._import(store)[0], 1)
+        self.assertEqual(store.day_rows(date(2025, 9, 22)), [renumbered])
+        self.assertEqual(store.day_rows(date(2025, 9, 23)), day2)
+
+    def test_recorded_export_is_not_read_back(self):
+        day1, _ = self._history()
+        store = AttendanceStore(self.db, COLUMNS)
+        self._import(store)
+
+        # Store is ahead of its (stale) export, which was recorded when written
+        store.upsert([dict(day1[0], clock_out="07:00:00 PM")])
+        path = self._write_csv("2025-09-22", day1)
+        store.mark_csv(path)
+        self.assertEqual(self._import(store)[0], 0)
+        self.assertEqual(store.day_rows(date(2025, 9, 22))[0]["clock_out"], "07:00:00 PM")
+
+        # A header-only file (_ensure_daily_file) never removes rows
+        self._write_csv("2025-09-23", [])
+        self._import(store)
+        self.assertEqual(len(store.day_rows(date(2025, 9, 23))), 1)
+
+    def test_force_reimports_everything(self):
+        self._history()
+        store = AttendanceStore(self.db, COLUMNS)
+        self._import(store)
+        self.assertEqual(self._import(store, force=True)[0], 3)
+        self.assertEqual(store.count(), 3)
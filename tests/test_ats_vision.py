@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_ats_vision
+----------------------------------
+
+Tests for the frame-level helpers in front of the detector (`ats_vision`).
+"""
+
+
+import os
+import sys
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ats_vision import MotionGate, FaceTracker, face_quality  # noqa: E402
+
+
+def _frame(square_at=None, size=40):
+    """240x320 RGB frame, flat grey with a bright square at (top, left)."""
+    rgb = np.full((240, 320, 3), 90, dtype=np.uint8)
+    if square_at is not None:
+        t, l = square_at
+        rgb[t:t + size, l:l + size] = 230
+    return rgb
+
+
+_FACE = np.random.RandomState(7).randint(0, 256, (48, 48, 3)).astype(np.uint8)
+
+
+def _face_frame(top, left, extra=None):
+    """Frame with a textured 48x48 "face" at (top, left), cut off at the frame edge."""
+    rgb = _frame(extra)
+    t0, l0 = max(top, 0), max(left, 0)
+    rgb[t0:top + 48, l0:left + 48] = _FACE[t0 - top:, l0 - left:][:240 - t0, :320 - l0]
+    return rgb
+
+
+class _StubTracker:
+    """Stands in for an OpenCV KCF/MOSSE tracker."""
+
+    def __init__(self, box):
+        self.box = box
+
+    def update(self, gray):
+        return True, self.box
+
+
+class _CountingDetector:
+    def __init__(self, locs=()):
+        self.locs = list(locs)
+        self.calls = 0
+
+    def __call__(self, img):
+        self.calls += 1
+        return list(self.locs)
+
+
+class Test_motion_gate(unittest.TestCase):
+
+    def test_no_motion_reuses_last_locations(self):
+        gate = MotionGate(full_every=100)
+        detect = _CountingDetector([(100, 160, 140, 120)])
+        gate.locate(_frame((100, 120)), detect)
+        self.assertEqual(gate.locate(_frame((100, 120)), detect), [(100, 160, 140, 120)])
+        self.assertEqual(detect.calls, 1)
+        self.assertEqual(gate.saved_calls, 1)
+
+    def test_observed_frames_refresh_the_reference(self):
+        gate = MotionGate(full_every=100)
+        detect = _CountingDetector()
+        gate.locate(_frame((20, 20)), detect)
+        # The square moved across the frame while another component answered
+        for left in (80, 140, 200):
+            gate.observe(_frame((150, left)), [(150, left + 40, 190, left)])
+        locs = gate.locate(_frame((150, 200)), detect)
+
+        self.assertEqual(detect.calls, 1)
+        self.assertEqual(locs, [(150, 240, 190, 200)])
+
+    def test_motion_runs_the_detector(self):
+        gate = MotionGate(full_every=100)
+        detect = _CountingDetector()
+        gate.locate(_frame(), detect)
+        gate.locate(_frame((100, 120)), detect)
+        self.assertEqual(detect.calls, 2)
+
+
+class Test_face_tracker(unittest.TestCase):
+
+    def _tracker(self, **kw):
+        tracker = FaceTracker(redetect_every=5, **kw)
+        detect = _CountingDetector([(100, 168, 148, 120)])
+        tracker.locate(_face_frame(100, 120), detect)
+        return tracker, detect
+
+    def test_still_scene_is_tracked(self):
+        tracker, detect = self._tracker()
+        locs = tracker.locate(_face_frame(102, 123), detect)
+        self.assertEqual(detect.calls, 1)
+        self.assertEqual(locs, [(102, 171, 150, 123)])
+        self.assertGreater(tracker.last_confidence, 0.99)
+
+    def test_motion_elsewhere_runs_the_detector(self):
+        tracker, detect = self._tracker()
+        tracker.locate(_face_frame(100, 120, extra=(20, 250)), detect)   # someone walks in
+        self.assertEqual(detect.calls, 2)
+        self.assertEqual(tracker.stats["intrusions"], 1)
+
+    def test_redetect_interval(self):
+        tracker, detect = self._tracker()
+        for _ in range(6):
+            tracker.locate(_face_frame(100, 120), detect)
+        self.assertEqual(detect.calls, 2)
+        self.assertEqual(tracker.stats["tracked"], 5)
+
+    def test_cv2_box_clipped_at_the_border_still_scores(self):
+        tracker = FaceTracker(redetect_every=5)
+        detect = _CountingDetector([(100, 48, 148, 0)])
+        tracker.locate(_face_frame(100, 0), detect)
+        tracker._cv2_tracker = _StubTracker((-12, 100, 48, 48))   # face partly out of view
+        locs = tracker.locate(_face_frame(100, -12), detect)
+
+        self.assertEqual(detect.calls, 1)
+        self.assertEqual(locs, [(100, 36, 148, 0)])
+        self.assertGreater(tracker.last_confidence, 0.99)
+
+
+
+# The kiosk's QUALITY_* constants (ats_attendance)
+BLUR_REF, SIZE_REF, MAX_YAW, MIN_SCORE = 120.0, 80, 0.35, 0.35
+
+
+def _textured_gray(box, blur_sigma=0, level=128):
+    """240x320 gray frame with a noise texture (contrast +/-60 around level) inside box."""
+    t, r, b, l = box
+    gray = np.full((240, 320), level, dtype=np.uint8)
+    noise = np.random.RandomState(3).randint(-60, 61, (b - t, r - l))
+    gray[t:b, l:r] = np.clip(level + noise, 0, 255).astype(np.uint8)
+    if blur_sigma:
+        gray = cv2.GaussianBlur(gray, (0, 0), blur_sigma)
+    return gray
+
+
+def _points(box, nose_shift=0.0):
+    """dlib 5-point style landmarks for a frontal face, nose moved by nose_shift x the eye distance."""
+    t, r, b, l = box
+    w, h = r - l, b - t
+    eyes = [(l + 0.2 * w, t + 0.4 * h), (l + 0.35 * w, t + 0.4 * h),
+            (l + 0.8 * w, t + 0.4 * h), (l + 0.65 * w, t + 0.4 * h)]
+    inter = 0.45 * w
+    return eyes + [(l + 0.5 * w + nose_shift * inter, t + 0.7 * h)]
+
+
+class Test_face_quality(unittest.TestCase):
+
+    BOX = (70, 210, 170, 110)   # 100 px face
+
+    def _score(self, gray, box, points):
+        return face_quality(gray, box, points, blur_ref=BLUR_REF, size_ref=SIZE_REF, max_yaw=MAX_YAW)
+
+    def test_sharp_frontal_face_passes(self):
+        q = self._score(_textured_gray(self.BOX), self.BOX, _points(self.BOX))
+        self.assertGreater(q["score"], 0.9)
+        self.assertEqual(q["yaw"], 1.0)
+
+    def test_blur_rejects(self):
+        q = self._score(_textured_gray(self.BOX, blur_sigma=3), self.BOX, _points(self.BOX))
+        self.assertLess(q["sharpness"], 0.2)
+        self.assertLess(q["score"], MIN_SCORE)
+
+    def test_small_face_rejects(self):
+        box = (100, 144, 124, 120)   # 24 px
+        q = self._score(_textured_gray(box), box, _points(box))
+        self.assertAlmostEqual(q["size"], 24 / 80.0)
+        self.assertLess(q["score"], MIN_SCORE)
+
+    def test_yaw_rejects(self):
+        gray = _textured_gray(self.BOX)
+        half = self._score(gray, self.BOX, _points(self.BOX, nose_shift=MAX_YAW / 2))
+        turned = self._score(gray, self.BOX, _points(self.BOX, nose_shift=-MAX_YAW))
+        self.assertAlmostEqual(half["yaw"], 0.5)
+        self.assertEqual(turned["yaw"], 0.0)
+        self.assertEqual(turned["score"], 0.0)
+
+    def test_dark_face_rejects(self):
+        q = self._score(_textured_gray(self.BOX, level=5), self.BOX, _points(self.BOX))
+        self.assertLess(q["exposure"], 0.5)
+        self.assertLess(q["score"], MIN_SCORE)
+
+    def test_box_outside_the_frame(self):
+        q = self._score(_textured_gray(self.BOX), (300, 400, 400, 330), _points(self.BOX))
+        self.assertEqual(q["score"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()